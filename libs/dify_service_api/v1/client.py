@@ -12,14 +12,21 @@ class AsyncDifyServiceClient:
 
     api_key: str
     base_url: str
+    http_client: httpx.AsyncClient
 
     def __init__(
         self,
         api_key: str,
         base_url: str = 'https://api.dify.ai/v1',
+        http_client: httpx.AsyncClient | None = None,
     ) -> None:
+        """
+        Args:
+            http_client: 复用连接的 HTTP 客户端，其 base_url 需与 base_url 一致，不传入时自行创建
+        """
         self.api_key = api_key
         self.base_url = base_url
+        self.http_client = http_client or httpx.AsyncClient(base_url=base_url, trust_env=True)
 
     async def chat_messages(
         self,
@@ -35,34 +42,30 @@ class AsyncDifyServiceClient:
         if response_mode != 'streaming':
             raise DifyAPIError('当前仅支持 streaming 模式')
 
-        async with httpx.AsyncClient(
-            base_url=self.base_url,
-            trust_env=True,
+        async with self.http_client.stream(
+            'POST',
+            '/chat-messages',
             timeout=timeout,
-        ) as client:
-            async with client.stream(
-                'POST',
-                '/chat-messages',
-                headers={
-                    'Authorization': f'Bearer {self.api_key}',
-                    'Content-Type': 'application/json',
-                },
-                json={
-                    'inputs': inputs,
-                    'query': query,
-                    'user': user,
-                    'response_mode': response_mode,
-                    'conversation_id': conversation_id,
-                    'files': files,
-                },
-            ) as r:
-                async for chunk in r.aiter_lines():
-                    if r.status_code != 200:
-                        raise DifyAPIError(f'{r.status_code} {chunk}')
-                    if chunk.strip() == '':
-                        continue
-                    if chunk.startswith('data:'):
-                        yield json.loads(chunk[5:])
+            headers={
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json',
+            },
+            json={
+                'inputs': inputs,
+                'query': query,
+                'user': user,
+                'response_mode': response_mode,
+                'conversation_id': conversation_id,
+                'files': files,
+            },
+        ) as r:
+            async for chunk in r.aiter_lines():
+                if r.status_code != 200:
+                    raise DifyAPIError(f'{r.status_code} {chunk}')
+                if chunk.strip() == '':
+                    continue
+                if chunk.startswith('data:'):
+                    yield json.loads(chunk[5:])
 
     async def workflow_run(
         self,
@@ -76,32 +79,28 @@ class AsyncDifyServiceClient:
         if response_mode != 'streaming':
             raise DifyAPIError('当前仅支持 streaming 模式')
 
-        async with httpx.AsyncClient(
-            base_url=self.base_url,
-            trust_env=True,
+        async with self.http_client.stream(
+            'POST',
+            '/workflows/run',
             timeout=timeout,
-        ) as client:
-            async with client.stream(
-                'POST',
-                '/workflows/run',
-                headers={
-                    'Authorization': f'Bearer {self.api_key}',
-                    'Content-Type': 'application/json',
-                },
-                json={
-                    'inputs': inputs,
-                    'user': user,
-                    'response_mode': response_mode,
-                    'files': files,
-                },
-            ) as r:
-                async for chunk in r.aiter_lines():
-                    if r.status_code != 200:
-                        raise DifyAPIError(f'{r.status_code} {chunk}')
-                    if chunk.strip() == '':
-                        continue
-                    if chunk.startswith('data:'):
-                        yield json.loads(chunk[5:])
+            headers={
+                'Authorization': f'Bearer {self.api_key}',
+                'Content-Type': 'application/json',
+            },
+            json={
+                'inputs': inputs,
+                'user': user,
+                'response_mode': response_mode,
+                'files': files,
+            },
+        ) as r:
+            async for chunk in r.aiter_lines():
+                if r.status_code != 200:
+                    raise DifyAPIError(f'{r.status_code} {chunk}')
+                if chunk.strip() == '':
+                    continue
+                if chunk.startswith('data:'):
+                    yield json.loads(chunk[5:])
 
     async def upload_file(
         self,
@@ -110,22 +109,18 @@ class AsyncDifyServiceClient:
         timeout: float = 30.0,
     ) -> str:
         """上传文件"""
-        async with httpx.AsyncClient(
-            base_url=self.base_url,
-            trust_env=True,
+        # multipart/form-data
+        response = await self.http_client.post(
+            '/files/upload',
             timeout=timeout,
-        ) as client:
-            # multipart/form-data
-            response = await client.post(
-                '/files/upload',
-                headers={'Authorization': f'Bearer {self.api_key}'},
-                files={
-                    'file': file,
-                    'user': (None, user),
-                },
-            )
+            headers={'Authorization': f'Bearer {self.api_key}'},
+            files={
+                'file': file,
+                'user': (None, user),
+            },
+        )
 
-            if response.status_code != 201:
-                raise DifyAPIError(f'{response.status_code} {response.text}')
+        if response.status_code != 201:
+            raise DifyAPIError(f'{response.status_code} {response.text}')
 
-            return response.json()
+        return response.json()
@@ -18,6 +18,7 @@ class DingTalkClient:
         robot_code: str,
         markdown_card: bool,
         logger: None,
+        http_client: httpx.AsyncClient | None = None,
     ):
         """初始化 WebSocket 连接并自动启动"""
         self.credential = dingtalk_stream.Credential(client_id, client_secret)
@@ -36,21 +37,23 @@ class DingTalkClient:
         self.access_token_expiry_time = ''
         self.markdown_card = markdown_card
         self.logger = logger
+        # 复用连接的 HTTP 客户端，可由调用方传入共享的客户端
+        self.http_client = http_client or httpx.AsyncClient()
 
     async def get_access_token(self):
         url = 'https://api.dingtalk.com/v1.0/oauth2/accessToken'
         headers = {'Content-Type': 'application/json'}
         data = {'appKey': self.key, 'appSecret': self.secret}
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(url, json=data, headers=headers)
-                if response.status_code == 200:
-                    response_data = response.json()
-                    self.access_token = response_data.get('accessToken')
-                    expires_in = int(response_data.get('expireIn', 7200))
-                    self.access_token_expiry_time = time.time() + expires_in - 60
-            except Exception:
-                await self.logger.error('failed to get access token in dingtalk')
+        client = self.http_client
+        try:
+            response = await client.post(url, json=data, headers=headers)
+            if response.status_code == 200:
+                response_data = response.json()
+                self.access_token = response_data.get('accessToken')
+                expires_in = int(response_data.get('expireIn', 7200))
+                self.access_token_expiry_time = time.time() + expires_in - 60
+        except Exception:
+            await self.logger.error('failed to get access token in dingtalk')
 
     async def is_token_expired(self):
         """检查token是否过期"""
@@ -69,28 +72,28 @@ class DingTalkClient:
         url = 'https://api.dingtalk.com/v1.0/robot/messageFiles/download'
         params = {'downloadCode': download_code, 'robotCode': self.robot_code}
         headers = {'x-acs-dingtalk-access-token': self.access_token}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=params)
-            if response.status_code == 200:
-                result = response.json()
-                download_url = result.get('downloadUrl')
-            else:
-                await self.logger.error(f'failed to get download url: {response.json()}')
+        client = self.http_client
+        response = await client.post(url, headers=headers, json=params)
+        if response.status_code == 200:
+            result = response.json()
+            download_url = result.get('downloadUrl')
+        else:
+            await self.logger.error(f'failed to get download url: {response.json()}')
 
         if download_url:
             return await self.download_url_to_base64(download_url)
 
     async def download_url_to_base64(self, download_url):
-        async with httpx.AsyncClient() as client:
-            response = await client.get(download_url)
-
-            if response.status_code == 200:
-                file_bytes = response.content
-                mime_type = response.headers.get('Content-Type', 'application/octet-stream')
-                base64_str = base64.b64encode(file_bytes).decode('utf-8')
-                return f'data:{mime_type};base64,{base64_str}'
-            else:
-                await self.logger.error(f'failed to get files: {response.json()}')
+        client = self.http_client
+        response = await client.get(download_url)
+
+        if response.status_code == 200:
+            file_bytes = response.content
+            mime_type = response.headers.get('Content-Type', 'application/octet-stream')
+            base64_str = base64.b64encode(file_bytes).decode('utf-8')
+            return f'data:{mime_type};base64,{base64_str}'
+        else:
+            await self.logger.error(f'failed to get files: {response.json()}')
 
     async def get_audio_url(self, download_code: str):
         if not await self.check_access_token():
@@ -98,17 +101,17 @@ class DingTalkClient:
         url = 'https://api.dingtalk.com/v1.0/robot/messageFiles/download'
         params = {'downloadCode': download_code, 'robotCode': self.robot_code}
         headers = {'x-acs-dingtalk-access-token': self.access_token}
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, json=params)
-            if response.status_code == 200:
-                result = response.json()
-                download_url = result.get('downloadUrl')
-                if download_url:
-                    return await self.download_url_to_base64(download_url)
-                else:
-                    await self.logger.error(f'failed to get audio: {response.json()}')
+        client = self.http_client
+        response = await client.post(url, headers=headers, json=params)
+        if response.status_code == 200:
+            result = response.json()
+            download_url = result.get('downloadUrl')
+            if download_url:
+                return await self.download_url_to_base64(download_url)
             else:
-                raise Exception(f'Error: {response.status_code}, {response.text}')
+                await self.logger.error(f'failed to get audio: {response.json()}')
+        else:
+            raise Exception(f'Error: {response.status_code}, {response.text}')
 
     async def update_incoming_message(self, message):
         """异步更新 DingTalkClient 中的 incoming_message"""
@@ -219,10 +222,10 @@ class DingTalkClient:
             'msgParam': json.dumps({'content': content}),
         }
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=data)
-                if response.status_code == 200:
-                    return
+            client = self.http_client
+            response = await client.post(url, headers=headers, json=data)
+            if response.status_code == 200:
+                return
         except Exception:
             await self.logger.error(f'failed to send proactive massage to person: {traceback.format_exc()}')
             raise Exception(f'failed to send proactive massage to person: {traceback.format_exc()}')
@@ -245,10 +248,10 @@ class DingTalkClient:
             'msgParam': json.dumps({'content': content}),
         }
         try:
-            async with httpx.AsyncClient() as client:
-                response = await client.post(url, headers=headers, json=data)
-                if response.status_code == 200:
-                    return
+            client = self.http_client
+            response = await client.post(url, headers=headers, json=data)
+            if response.status_code == 200:
+                return
         except Exception:
             await self.logger.error(f'failed to send proactive massage to group: {traceback.format_exc()}')
             raise Exception(f'failed to send proactive massage to group: {traceback.format_exc()}')
@@ -34,7 +34,9 @@ def handle_validation(body: dict, bot_secret: str):
 
 
 class QQOfficialClient:
-    def __init__(self, secret: str, token: str, app_id: str, logger: None):
+    def __init__(
+        self, secret: str, token: str, app_id: str, logger: None, http_client: httpx.AsyncClient | None = None
+    ):
         self.app = Quart(__name__)
         self.app.add_url_rule(
             '/callback/command',
@@ -50,6 +52,8 @@ class QQOfficialClient:
         self.access_token = ''
         self.access_token_expiry_time = None
         self.logger = logger
+        # 复用连接的 HTTP 客户端，可由调用方传入共享的客户端
+        self.http_client = http_client or httpx.AsyncClient()
 
     async def check_access_token(self):
         """检查access_token是否存在"""
@@ -60,26 +64,26 @@ class QQOfficialClient:
     async def get_access_token(self):
         """获取access_token"""
         url = 'https://bots.qq.com/app/getAppAccessToken'
-        async with httpx.AsyncClient() as client:
-            params = {
-                'appId': self.app_id,
-                'clientSecret': self.secret,
-            }
-            headers = {
-                'content-type': 'application/json',
-            }
-            try:
-                response = await client.post(url, json=params, headers=headers)
-                if response.status_code == 200:
-                    response_data = response.json()
-                access_token = response_data.get('access_token')
-                expires_in = int(response_data.get('expires_in', 7200))
-                self.access_token_expiry_time = time.time() + expires_in - 60
-                if access_token:
-                    self.access_token = access_token
-            except Exception as e:
-                await self.logger.error(f'获取access_token失败: {response_data}')
-                raise Exception(f'获取access_token失败: {e}')
+        client = self.http_client
+        params = {
+            'appId': self.app_id,
+            'clientSecret': self.secret,
+        }
+        headers = {
+            'content-type': 'application/json',
+        }
+        try:
+            response = await client.post(url, json=params, headers=headers)
+            if response.status_code == 200:
+                response_data = response.json()
+            access_token = response_data.get('access_token')
+            expires_in = int(response_data.get('expires_in', 7200))
+            self.access_token_expiry_time = time.time() + expires_in - 60
+            if access_token:
+                self.access_token = access_token
+        except Exception as e:
+            await self.logger.error(f'获取access_token失败: {response_data}')
+            raise Exception(f'获取access_token失败: {e}')
 
     async def handle_callback_request(self):
         """处理回调请求"""
@@ -170,23 +174,23 @@ class QQOfficialClient:
 
 
         url = self.base_url + '/v2/users/' + user_openid + '/messages'
-        async with httpx.AsyncClient() as client:
-            headers = {
-                'Authorization': f'QQBot {self.access_token}',
-                'Content-Type': 'application/json',
-            }
-            data = {
-                'content': content,
-                'msg_type': 0,
-                'msg_id': msg_id,
-            }
-            response = await client.post(url, headers=headers, json=data)
-            response_data = response.json()
-            if response.status_code == 200:
-                return
-            else:
-                await self.logger.error(f'发送私聊消息失败: {response_data}')
-                raise ValueError(response)
+        client = self.http_client
+        headers = {
+            'Authorization': f'QQBot {self.access_token}',
+            'Content-Type': 'application/json',
+        }
+        data = {
+            'content': content,
+            'msg_type': 0,
+            'msg_id': msg_id,
+        }
+        response = await client.post(url, headers=headers, json=data)
+        response_data = response.json()
+        if response.status_code == 200:
+            return
+        else:
+            await self.logger.error(f'发送私聊消息失败: {response_data}')
+            raise ValueError(response)
 
     async def send_group_text_msg(self, group_openid: str, content: str, msg_id: str):
         """发送群聊消息"""
@@ -195,22 +199,22 @@ class QQOfficialClient:
 
 
         url = self.base_url + '/v2/groups/' + group_openid + '/messages'
-        async with httpx.AsyncClient() as client:
-            headers = {
-                'Authorization': f'QQBot {self.access_token}',
-                'Content-Type': 'application/json',
-            }
-            data = {
-                'content': content,
-                'msg_type': 0,
-                'msg_id': msg_id,
-            }
-            response = await client.post(url, headers=headers, json=data)
-            if response.status_code == 200:
-                return
-            else:
-                await self.logger.error(f"发送群聊消息失败:{response.json()}")
-                raise Exception(response.read().decode())
+        client = self.http_client
+        headers = {
+            'Authorization': f'QQBot {self.access_token}',
+            'Content-Type': 'application/json',
+        }
+        data = {
+            'content': content,
+            'msg_type': 0,
+            'msg_id': msg_id,
+        }
+        response = await client.post(url, headers=headers, json=data)
+        if response.status_code == 200:
+            return
+        else:
+            await self.logger.error(f"发送群聊消息失败:{response.json()}")
+            raise Exception(response.read().decode())
 
     async def send_channle_group_text_msg(self, channel_id: str, content: str, msg_id: str):
         """发送频道群聊消息"""
@@ -219,22 +223,22 @@ class QQOfficialClient:
 
 
         url = self.base_url + '/channels/' + channel_id + '/messages'
-        async with httpx.AsyncClient() as client:
-            headers = {
-                'Authorization': f'QQBot {self.access_token}',
-                'Content-Type': 'application/json',
-            }
-            params = {
-                'content': content,
-                'msg_type': 0,
-                'msg_id': msg_id,
-            }
-            response = await client.post(url, headers=headers, json=params)
-            if response.status_code == 200:
-                return True
-            else:
-                await self.logger.error(f'发送频道群聊消息失败: {response.json()}')
-                raise Exception(response)
+        client = self.http_client
+        headers = {
+            'Authorization': f'QQBot {self.access_token}',
+            'Content-Type': 'application/json',
+        }
+        params = {
+            'content': content,
+            'msg_type': 0,
+            'msg_id': msg_id,
+        }
+        response = await client.post(url, headers=headers, json=params)
+        if response.status_code == 200:
+            return True
+        else:
+            await self.logger.error(f'发送频道群聊消息失败: {response.json()}')
+            raise Exception(response)
 
     async def send_channle_private_text_msg(self, guild_id: str, content: str, msg_id: str):
         """发送频道私聊消息"""
@@ -243,22 +247,22 @@ class QQOfficialClient:
         
 
         url = self.base_url + '/dms/' + guild_id + '/messages'
-        async with httpx.AsyncClient() as client:
-            headers = {
-                'Authorization': f'QQBot {self.access_token}',
-                'Content-Type': 'application/json',
-            }
-            params = {
-                'content': content,
-                'msg_type': 0,
-                'msg_id': msg_id,
-            }
-            response = await client.post(url, headers=headers, json=params)
-            if response.status_code == 200:
-                return True
-            else:
-                await self.logger.error(f'发送频道私聊消息失败: {response.json()}')
-                raise Exception(response)
+        client = self.http_client
+        headers = {
+            'Authorization': f'QQBot {self.access_token}',
+            'Content-Type': 'application/json',
+        }
+        params = {
+            'content': content,
+            'msg_type': 0,
+            'msg_id': msg_id,
+        }
+        response = await client.post(url, headers=headers, json=params)
+        if response.status_code == 200:
+            return True
+        else:
+            await self.logger.error(f'发送频道私聊消息失败: {response.json()}')
+            raise Exception(response)
 
     async def is_token_expired(self):
         """检查token是否过期"""
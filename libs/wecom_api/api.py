@@ -21,6 +21,7 @@ class WecomClient:
         EncodingAESKey: str,
         contacts_secret: str,
         logger: None,
+        http_client: httpx.AsyncClient | None = None,
     ):
         self.corpid = corpid
         self.secret = secret
@@ -31,6 +32,8 @@ class WecomClient:
         self.access_token = ''
         self.secret_for_contacts = contacts_secret
         self.logger = logger
+        # 复用连接的 HTTP 客户端，可由调用方传入共享的客户端
+        self.http_client = http_client or httpx.AsyncClient()
         self.app = Quart(__name__)
         self.app.add_url_rule(
             '/callback/command',
@@ -51,35 +54,35 @@ class WecomClient:
 
     async def get_access_token(self, secret):
         url = f'https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={self.corpid}&corpsecret={secret}'
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            data = response.json()
-            if 'access_token' in data:
-                return data['access_token']
-            else:
-                await self.logger.error(f"获取accesstoken失败:{response.json()}")
-                raise Exception(f'未获取access token: {data}')
+        client = self.http_client
+        response = await client.get(url)
+        data = response.json()
+        if 'access_token' in data:
+            return data['access_token']
+        else:
+            await self.logger.error(f"获取accesstoken失败:{response.json()}")
+            raise Exception(f'未获取access token: {data}')
 
     async def get_users(self):
         if not self.check_access_token_for_contacts():
             self.access_token_for_contacts = await self.get_access_token(self.secret_for_contacts)
 
         url = self.base_url + '/user/list_id?access_token=' + self.access_token_for_contacts
-        async with httpx.AsyncClient() as client:
-            params = {
-                'cursor': '',
-                'limit': 10000,
-            }
-            response = await client.post(url, json=params)
-            data = response.json()
-            if data['errcode'] == 0:
-                dept_users = data['dept_user']
-                userid = []
-                for user in dept_users:
-                    userid.append(user['userid'])
-                return userid
-            else:
-                raise Exception('未获取用户')
+        client = self.http_client
+        params = {
+            'cursor': '',
+            'limit': 10000,
+        }
+        response = await client.post(url, json=params)
+        data = response.json()
+        if data['errcode'] == 0:
+            dept_users = data['dept_user']
+            userid = []
+            for user in dept_users:
+                userid.append(user['userid'])
+            return userid
+        else:
+            raise Exception('未获取用户')
 
     async def send_to_all(self, content: str, agent_id: int):
         if not self.check_access_token_for_contacts():
@@ -88,84 +91,84 @@ class WecomClient:
             url = self.base_url + '/message/send?access_token=' + self.access_token_for_contacts
             user_ids = await self.get_users()
             user_ids_string = '|'.join(user_ids)
-            async with httpx.AsyncClient() as client:
-                params = {
-                    'touser': user_ids_string,
-                    'msgtype': 'text',
-                    'agentid': agent_id,
-                    'text': {
-                        'content': content,
-                    },
-                    'safe': 0,
-                    'enable_id_trans': 0,
-                    'enable_duplicate_check': 0,
-                    'duplicate_check_interval': 1800,
-                }
-                response = await client.post(url, json=params)
-                data = response.json()
-                if data['errcode'] != 0:
-                    raise Exception('Failed to send message: ' + str(data))
-
-    async def send_image(self, user_id: str, agent_id: int, media_id: str):
-        if not await self.check_access_token():
-            self.access_token = await self.get_access_token(self.secret)
-        url = self.base_url + '/media/upload?access_token=' + self.access_token
-        async with httpx.AsyncClient() as client:
+            client = self.http_client
             params = {
-                'touser': user_id,
-                'toparty': '',
-                'totag': '',
+                'touser': user_ids_string,
+                'msgtype': 'text',
                 'agentid': agent_id,
-                'msgtype': 'image',
-                'image': {
-                    'media_id': media_id,
+                'text': {
+                    'content': content,
                 },
                 'safe': 0,
                 'enable_id_trans': 0,
                 'enable_duplicate_check': 0,
                 'duplicate_check_interval': 1800,
             }
-            try:
-                response = await client.post(url, json=params)
-                data = response.json()
-            except Exception as e:
-                await self.logger.error(f"发送图片失败:{data}")
-                raise Exception('Failed to send image: ' + str(e))
+            response = await client.post(url, json=params)
+            data = response.json()
+            if data['errcode'] != 0:
+                raise Exception('Failed to send message: ' + str(data))
 
-            # 企业微信错误码40014和42001，代表accesstoken问题
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.send_image(user_id, agent_id, media_id)
+    async def send_image(self, user_id: str, agent_id: int, media_id: str):
+        if not await self.check_access_token():
+            self.access_token = await self.get_access_token(self.secret)
+        url = self.base_url + '/media/upload?access_token=' + self.access_token
+        client = self.http_client
+        params = {
+            'touser': user_id,
+            'toparty': '',
+            'totag': '',
+            'agentid': agent_id,
+            'msgtype': 'image',
+            'image': {
+                'media_id': media_id,
+            },
+            'safe': 0,
+            'enable_id_trans': 0,
+            'enable_duplicate_check': 0,
+            'duplicate_check_interval': 1800,
+        }
+        try:
+            response = await client.post(url, json=params)
+            data = response.json()
+        except Exception as e:
+            await self.logger.error(f"发送图片失败:{data}")
+            raise Exception('Failed to send image: ' + str(e))
 
-            if data['errcode'] != 0:
-                raise Exception('Failed to send image: ' + str(data))
+        # 企业微信错误码40014和42001，代表accesstoken问题
+        if data['errcode'] == 40014 or data['errcode'] == 42001:
+            self.access_token = await self.get_access_token(self.secret)
+            return await self.send_image(user_id, agent_id, media_id)
+
+        if data['errcode'] != 0:
+            raise Exception('Failed to send image: ' + str(data))
 
     async def send_private_msg(self, user_id: str, agent_id: int, content: str):
         if not await self.check_access_token():
             self.access_token = await self.get_access_token(self.secret)
 
         url = self.base_url + '/message/send?access_token=' + self.access_token
-        async with httpx.AsyncClient() as client:
-            params = {
-                'touser': user_id,
-                'msgtype': 'text',
-                'agentid': agent_id,
-                'text': {
-                    'content': content,
-                },
-                'safe': 0,
-                'enable_id_trans': 0,
-                'enable_duplicate_check': 0,
-                'duplicate_check_interval': 1800,
-            }
-            response = await client.post(url, json=params)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.send_private_msg(user_id, agent_id, content)
-            if data['errcode'] != 0:
-                await self.logger.error(f"发送消息失败:{data}")
-                raise Exception('Failed to send message: ' + str(data))
+        client = self.http_client
+        params = {
+            'touser': user_id,
+            'msgtype': 'text',
+            'agentid': agent_id,
+            'text': {
+                'content': content,
+            },
+            'safe': 0,
+            'enable_id_trans': 0,
+            'enable_duplicate_check': 0,
+            'duplicate_check_interval': 1800,
+        }
+        response = await client.post(url, json=params)
+        data = response.json()
+        if data['errcode'] == 40014 or data['errcode'] == 42001:
+            self.access_token = await self.get_access_token(self.secret)
+            return await self.send_private_msg(user_id, agent_id, content)
+        if data['errcode'] != 0:
+            await self.logger.error(f"发送消息失败:{data}")
+            raise Exception('Failed to send message: ' + str(data))
 
     async def handle_callback_request(self):
         """
@@ -318,24 +321,24 @@ class WecomClient:
         )
 
         # 上传文件
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, content=body)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                media_id = await self.upload_to_work(image)
-            if data.get('errcode', 0) != 0:
-                await self.logger.error(f"上传图片失败:{data}")
-                raise Exception('failed to upload file')
+        client = self.http_client
+        response = await client.post(url, headers=headers, content=body)
+        data = response.json()
+        if data['errcode'] == 40014 or data['errcode'] == 42001:
+            self.access_token = await self.get_access_token(self.secret)
+            media_id = await self.upload_to_work(image)
+        if data.get('errcode', 0) != 0:
+            await self.logger.error(f"上传图片失败:{data}")
+            raise Exception('failed to upload file')
 
-            media_id = data.get('media_id')
-            return media_id
+        media_id = data.get('media_id')
+        return media_id
 
     async def download_image_to_bytes(self, url: str) -> bytes:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            return response.content
+        client = self.http_client
+        response = await client.get(url)
+        response.raise_for_status()
+        return response.content
 
     # 进行media_id的获取
     async def get_media_id(self, image: platform_message.Image):
@@ -13,7 +13,15 @@ import aiofiles
 
 
 class WecomCSClient:
-    def __init__(self, corpid: str, secret: str, token: str, EncodingAESKey: str, logger: None):
+    def __init__(
+        self,
+        corpid: str,
+        secret: str,
+        token: str,
+        EncodingAESKey: str,
+        logger: None,
+        http_client: httpx.AsyncClient | None = None,
+    ):
         self.corpid = corpid
         self.secret = secret
         self.access_token_for_contacts = ''
@@ -22,6 +30,8 @@ class WecomCSClient:
         self.base_url = 'https://qyapi.weixin.qq.com/cgi-bin'
         self.access_token = ''
         self.logger = logger
+        # 复用连接的 HTTP 客户端，可由调用方传入共享的客户端
+        self.http_client = http_client or httpx.AsyncClient()
         self.app = Quart(__name__)
         self.app.add_url_rule(
             '/callback/command', 'handle_callback', self.handle_callback_request, methods=['GET', 'POST']
@@ -36,22 +46,22 @@ class WecomCSClient:
 
         url = f'{self.base_url}/media/get?access_token={self.access_token}&media_id={media_id}'
 
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            if response.headers.get('Content-Type', '').startswith('application/json'):
-                data = response.json()
-                if data.get('errcode') in [40014, 42001]:
-                    self.access_token = await self.get_access_token(self.secret)
-                    return await self.get_pic_url(media_id)
-                else:
-                    raise Exception('Failed to get image: ' + str(data))
-
-            # 否则是图片，转成 base64
-            image_bytes = response.content
-            content_type = response.headers.get('Content-Type', '')
-            base64_str = base64.b64encode(image_bytes).decode('utf-8')
-            base64_str = f'data:{content_type};base64,{base64_str}'
-            return base64_str
+        client = self.http_client
+        response = await client.get(url)
+        if response.headers.get('Content-Type', '').startswith('application/json'):
+            data = response.json()
+            if data.get('errcode') in [40014, 42001]:
+                self.access_token = await self.get_access_token(self.secret)
+                return await self.get_pic_url(media_id)
+            else:
+                raise Exception('Failed to get image: ' + str(data))
+
+        # 否则是图片，转成 base64
+        image_bytes = response.content
+        content_type = response.headers.get('Content-Type', '')
+        base64_str = base64.b64encode(image_bytes).decode('utf-8')
+        base64_str = f'data:{content_type};base64,{base64_str}'
+        return base64_str
 
     # access——token操作
     async def check_access_token(self):
@@ -62,13 +72,13 @@ class WecomCSClient:
 
     async def get_access_token(self, secret):
         url = f'https://qyapi.weixin.qq.com/cgi-bin/gettoken?corpid={self.corpid}&corpsecret={secret}'
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            data = response.json()
-            if 'access_token' in data:
-                return data['access_token']
-            else:
-                raise Exception(f'未获取access token: {data}')
+        client = self.http_client
+        response = await client.get(url)
+        data = response.json()
+        if 'access_token' in data:
+            return data['access_token']
+        else:
+            raise Exception(f'未获取access token: {data}')
 
     async def get_detailed_message_list(self, xml_msg: str):
         # 在本方法中解析消息，并且获得消息的具体内容
@@ -87,81 +97,81 @@ class WecomCSClient:
             self.access_token = await self.get_access_token(self.secret)
 
         url = self.base_url + '/kf/sync_msg?access_token=' + self.access_token
-        async with httpx.AsyncClient() as client:
-            params = {
-                'token': token,
-                'voice_format': 0,
-                'open_kfid': open_kfid,
-            }
-            response = await client.post(url, json=params)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.get_detailed_message_list(xml_msg)
-            if data['errcode'] != 0:
-                raise Exception('Failed to get message')
-
-            last_msg_data = data['msg_list'][-1]
-            open_kfid = last_msg_data.get('open_kfid')
-            # 进行获取图片操作
-            if last_msg_data.get('msgtype') == 'image':
-                media_id = last_msg_data.get('image').get('media_id')
-                picurl = await self.get_pic_url(media_id)
-                last_msg_data['picurl'] = picurl
-            # await self.change_service_status(userid=external_userid,openkfid=open_kfid,servicer=servicer)
-            return last_msg_data
+        client = self.http_client
+        params = {
+            'token': token,
+            'voice_format': 0,
+            'open_kfid': open_kfid,
+        }
+        response = await client.post(url, json=params)
+        data = response.json()
+        if data['errcode'] == 40014 or data['errcode'] == 42001:
+            self.access_token = await self.get_access_token(self.secret)
+            return await self.get_detailed_message_list(xml_msg)
+        if data['errcode'] != 0:
+            raise Exception('Failed to get message')
+
+        last_msg_data = data['msg_list'][-1]
+        open_kfid = last_msg_data.get('open_kfid')
+        # 进行获取图片操作
+        if last_msg_data.get('msgtype') == 'image':
+            media_id = last_msg_data.get('image').get('media_id')
+            picurl = await self.get_pic_url(media_id)
+            last_msg_data['picurl'] = picurl
+        # await self.change_service_status(userid=external_userid,openkfid=open_kfid,servicer=servicer)
+        return last_msg_data
 
     async def change_service_status(self, userid: str, openkfid: str, servicer: str):
         if not await self.check_access_token():
             self.access_token = await self.get_access_token(self.secret)
         url = self.base_url + '/kf/service_state/get?access_token=' + self.access_token
-        async with httpx.AsyncClient() as client:
-            params = {
-                'open_kfid': openkfid,
-                'external_userid': userid,
-                'service_state': 1,
-                'servicer_userid': servicer,
-            }
-            response = await client.post(url, json=params)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.change_service_status(userid, openkfid)
-            if data['errcode'] != 0:
-                raise Exception('Failed to change service status: ' + str(data))
+        client = self.http_client
+        params = {
+            'open_kfid': openkfid,
+            'external_userid': userid,
+            'service_state': 1,
+            'servicer_userid': servicer,
+        }
+        response = await client.post(url, json=params)
+        data = response.json()
+        if data['errcode'] == 40014 or data['errcode'] == 42001:
+            self.access_token = await self.get_access_token(self.secret)
+            return await self.change_service_status(userid, openkfid)
+        if data['errcode'] != 0:
+            raise Exception('Failed to change service status: ' + str(data))
 
     async def send_image(self, user_id: str, agent_id: int, media_id: str):
         if not await self.check_access_token():
             self.access_token = await self.get_access_token(self.secret)
         url = self.base_url + '/media/upload?access_token=' + self.access_token
-        async with httpx.AsyncClient() as client:
-            params = {
-                'touser': user_id,
-                'toparty': '',
-                'totag': '',
-                'agentid': agent_id,
-                'msgtype': 'image',
-                'image': {
-                    'media_id': media_id,
-                },
-                'safe': 0,
-                'enable_id_trans': 0,
-                'enable_duplicate_check': 0,
-                'duplicate_check_interval': 1800,
-            }
-            try:
-                response = await client.post(url, json=params)
-                data = response.json()
-            except Exception as e:
-                raise Exception('Failed to send image: ' + str(e))
+        client = self.http_client
+        params = {
+            'touser': user_id,
+            'toparty': '',
+            'totag': '',
+            'agentid': agent_id,
+            'msgtype': 'image',
+            'image': {
+                'media_id': media_id,
+            },
+            'safe': 0,
+            'enable_id_trans': 0,
+            'enable_duplicate_check': 0,
+            'duplicate_check_interval': 1800,
+        }
+        try:
+            response = await client.post(url, json=params)
+            data = response.json()
+        except Exception as e:
+            raise Exception('Failed to send image: ' + str(e))
 
-            # 企业微信错误码40014和42001，代表accesstoken问题
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.send_image(user_id, agent_id, media_id)
+        # 企业微信错误码40014和42001，代表accesstoken问题
+        if data['errcode'] == 40014 or data['errcode'] == 42001:
+            self.access_token = await self.get_access_token(self.secret)
+            return await self.send_image(user_id, agent_id, media_id)
 
-            if data['errcode'] != 0:
-                raise Exception('Failed to send image: ' + str(data))
+        if data['errcode'] != 0:
+            raise Exception('Failed to send image: ' + str(data))
 
     async def send_text_msg(self, open_kfid: str, external_userid: str, msgid: str, content: str):
         if not await self.check_access_token():
@@ -179,17 +189,17 @@ class WecomCSClient:
             },
         }
 
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, json=payload)
+        client = self.http_client
+        response = await client.post(url, json=payload)
 
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                return await self.send_text_msg(open_kfid, external_userid, msgid, content)
-            if data['errcode'] != 0:
-                await self.logger.error(f"发送消息失败：{data}")
-                raise Exception('Failed to send message')
-            return data
+        data = response.json()
+        if data['errcode'] == 40014 or data['errcode'] == 42001:
+            self.access_token = await self.get_access_token(self.secret)
+            return await self.send_text_msg(open_kfid, external_userid, msgid, content)
+        if data['errcode'] != 0:
+            await self.logger.error(f"发送消息失败：{data}")
+            raise Exception('Failed to send message')
+        return data
 
     async def handle_callback_request(self):
         """
@@ -324,23 +334,23 @@ class WecomCSClient:
         )
 
         # 上传文件
-        async with httpx.AsyncClient() as client:
-            response = await client.post(url, headers=headers, content=body)
-            data = response.json()
-            if data['errcode'] == 40014 or data['errcode'] == 42001:
-                self.access_token = await self.get_access_token(self.secret)
-                media_id = await self.upload_to_work(image)
-            if data.get('errcode', 0) != 0:
-                raise Exception('failed to upload file')
+        client = self.http_client
+        response = await client.post(url, headers=headers, content=body)
+        data = response.json()
+        if data['errcode'] == 40014 or data['errcode'] == 42001:
+            self.access_token = await self.get_access_token(self.secret)
+            media_id = await self.upload_to_work(image)
+        if data.get('errcode', 0) != 0:
+            raise Exception('failed to upload file')
 
-            media_id = data.get('media_id')
-            return media_id
+        media_id = data.get('media_id')
+        return media_id
 
     async def download_image_to_bytes(self, url: str) -> bytes:
-        async with httpx.AsyncClient() as client:
-            response = await client.get(url)
-            response.raise_for_status()
-            return response.content
+        client = self.http_client
+        response = await client.get(url)
+        response.raise_for_status()
+        return response.content
 
     # 进行media_id的获取
     async def get_media_id(self, image: platform_message.Image):
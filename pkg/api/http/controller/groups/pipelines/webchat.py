@@ -1,6 +1,7 @@
 import quart
 
 from ... import group
+from ......pipeline import broker
 
 
 @group.group_class('webchat', '/api/v1/pipelines/<pipeline_uuid>/chat')
@@ -33,6 +34,8 @@ class WebChatDebugRouterGroup(group.RouterGroup):
                     }
                 )
 
+            except broker.QueryDroppedError as e:
+                return self.http_status(503, -1, str(e))
             except Exception as e:
                 return self.http_status(500, -1, f'Internal server error: {str(e)}')
 
@@ -7,13 +7,65 @@ class StatsRouterGroup(group.RouterGroup):
         @self.route('/basic', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
         async def _() -> str:
             conv_count = 0
-            for session in self.ap.sess_mgr.session_list:
+            for session in self.ap.sess_mgr.sessions.values():
                 conv_count += len(session.conversations if session.conversations is not None else [])
 
             return self.success(
                 data={
-                    'active_session_count': len(self.ap.sess_mgr.session_list),
+                    'active_session_count': len(self.ap.sess_mgr.sessions),
                     'conversation_count': conv_count,
+                    'evicted_session_count': self.ap.sess_mgr.evicted_session_count,
+                    'evicted_conversation_count': self.ap.sess_mgr.evicted_conversation_count,
+                    'compacted_conversation_count': self.ap.sess_mgr.compacted_count,
                     'query_count': self.ap.query_pool.query_id_counter,
                 }
             )
+
+        @self.route('/queues', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
+        async def _() -> str:
+            return self.success(data=await self.ap.query_pool.get_stats())
+
+        @self.route('/pipelines', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
+        async def _() -> str:
+            return self.success(
+                data={
+                    'pipelines': [
+                        {
+                            'uuid': pipeline.pipeline_entity.uuid,
+                            'name': pipeline.pipeline_entity.name,
+                            **pipeline.get_latency_stats(),
+                        }
+                        for pipeline in self.ap.pipeline_mgr.pipelines
+                    ]
+                }
+            )
+
+        @self.route('/models', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
+        async def _() -> str:
+            return self.success(
+                data={
+                    'models': [
+                        {
+                            'uuid': model.model_entity.uuid,
+                            'name': model.model_entity.name,
+                            'ttft': model.ttft.to_dict(),
+                            'coalesced_count': model.inflight.shared_count,
+                            'usage': model.usage.to_dict(),
+                            'api_keys': model.token_mgr.get_stats(),
+                            'rate_limit': model.rate_limiter.get_stats(),
+                            'concurrency': model.concurrency.get_stats(),
+                            'circuit_breaker': model.breaker.get_stats(),
+                            'retry': model.retry_policy.get_stats(),
+                        }
+                        for model in self.ap.model_mgr.llm_models
+                    ]
+                }
+            )
+
+        @self.route('/llm-cache', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
+        async def _() -> str:
+            return self.success(data=await self.ap.llm_cache.get_stats())
+
+        @self.route('/tool-cache', methods=['GET'], auth_type=group.AuthType.USER_TOKEN)
+        async def _() -> str:
+            return self.success(data=self.ap.tool_mgr.result_cache.get_stats())
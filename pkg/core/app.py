@@ -9,13 +9,15 @@ import os
 from ..platform import botmgr as im_mgr
 from ..provider.session import sessionmgr as llm_session_mgr
 from ..provider.modelmgr import modelmgr as llm_model_mgr
+from ..provider.modelmgr import cache as llm_cache
 from ..provider.tools import toolmgr as llm_tool_mgr
 from ..config import manager as config_mgr
 from ..command import cmdmgr
 from ..plugin import manager as plugin_mgr
-from ..pipeline import pool
+from ..pipeline import broker
 from ..pipeline import controller, pipelinemgr
 from ..utils import version as version_mgr, proxy as proxy_mgr, announce as announce_mgr
+from ..utils import workerpool, httpclient
 from ..persistence import mgr as persistencemgr
 from ..api.http.controller import main as http_controller
 from ..api.http.service import user as user_service
@@ -47,6 +49,8 @@ class Application:
 
     model_mgr: llm_model_mgr.ModelManager = None
 
+    llm_cache: llm_cache.ResponseCache = None
+
     # TODO move to pipeline
     tool_mgr: llm_tool_mgr.ToolManager = None
 
@@ -77,7 +81,7 @@ class Application:
 
     plugin_mgr: plugin_mgr.PluginManager = None
 
-    query_pool: pool.QueryPool = None
+    query_pool: broker.QueryBroker = None
 
     ctrl: controller.Controller = None
 
@@ -89,6 +93,10 @@ class Application:
 
     proxy_mgr: proxy_mgr.ProxyManager = None
 
+    worker_pool: workerpool.WorkerPoolManager = None
+
+    http_client_mgr: httpclient.HTTPClientManager = None
+
     logger: logging.Logger = None
 
     persistence_mgr: persistencemgr.PersistenceManager = None
@@ -156,6 +164,10 @@ class Application:
         except Exception as e:
             self.logger.error(f'Application runtime fatal exception: {e}')
             self.logger.debug(f'Traceback: {traceback.format_exc()}')
+        finally:
+            await self.llm_cache.close()
+            await self.http_client_mgr.close()
+            await self.worker_pool.shutdown()
 
     async def print_web_access_info(self):
         """Print access webui tips"""
@@ -192,6 +204,7 @@ class Application:
             case core_entities.LifecycleControlScope.PLATFORM.value:
                 self.logger.info('Hot reload scope=' + scope)
                 await self.platform_mgr.shutdown()
+                await self.http_client_mgr.release_scope(core_entities.LifecycleControlScope.PLATFORM)
 
                 self.platform_mgr = im_mgr.PlatformManager(self)
 
@@ -225,6 +238,7 @@ class Application:
                 self.logger.info('Hot reload scope=' + scope)
 
                 await self.tool_mgr.shutdown()
+                await self.http_client_mgr.release_scope(core_entities.LifecycleControlScope.PROVIDER)
 
                 llm_model_mgr_inst = llm_model_mgr.ModelManager(self)
                 await llm_model_mgr_inst.initialize()
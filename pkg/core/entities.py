@@ -4,6 +4,7 @@ import enum
 import typing
 import datetime
 import asyncio
+import time
 
 import pydantic.v1 as pydantic
 
@@ -94,10 +95,19 @@ class Query(pydantic.BaseModel):
     resp_message_chain: typing.Optional[list[platform_message.MessageChain]] = None
     """回复消息链，从resp_messages包装而得"""
 
+    stage_timings: list[tuple[str, float]] = []
+    """(阶段名, 耗时秒数) 列表，按执行顺序记录每次阶段处理（生成器阶段为每次产出结果）的耗时"""
+
+    deadline: typing.Optional[float] = None
+    """处理截止时间（time.monotonic() 时钟），由 Pipeline 在运行开始时根据流水线配置设置，None 表示不限制"""
+
     # ======= 内部保留 =======
     current_stage: typing.Optional['pkg.pipeline.pipelinemgr.StageInstContainer'] = None
     """当前所处阶段"""
 
+    reply_stream: typing.Optional['pkg.pipeline.stream.ReplyStream'] = None
+    """流式回复，开启流式回复时由对话处理器设置"""
+
     class Config:
         arbitrary_types_allowed = True
 
@@ -121,6 +131,19 @@ class Query(pydantic.BaseModel):
             return {}
         return self.variables
 
+    def get_remaining_time(self) -> float | None:
+        """距处理截止时间的剩余秒数，已超时返回 0，未设置截止时间返回 None"""
+        if self.deadline is None:
+            return None
+        return max(self.deadline - time.monotonic(), 0.0)
+
+    def get_timeout(self, timeout: float) -> float:
+        """取给定超时时间与剩余时间中的较小值，供发起网络请求时使用"""
+        remaining = self.get_remaining_time()
+        if remaining is None:
+            return timeout
+        return min(timeout, remaining)
+
 
 class Conversation(pydantic.BaseModel):
     """对话，包含于 Session 中，一个 Session 可以有多个历史 Conversation，但只有一个当前使用的 Conversation"""
@@ -172,5 +195,8 @@ class Session(pydantic.BaseModel):
     semaphore: typing.Optional[asyncio.Semaphore] = None
     """当前会话的信号量，用于限制并发"""
 
+    lock: asyncio.Lock = pydantic.Field(default_factory=asyncio.Lock)
+    """修改当前会话的对话记录时持有，避免请求写入回复与后台压缩替换消息交错"""
+
     class Config:
         arbitrary_types_allowed = True
@@ -2,12 +2,13 @@ from __future__ import annotations
 
 
 from .. import stage, app
-from ...utils import version, proxy, announce
-from ...pipeline import pool, controller, pipelinemgr
+from ...utils import version, proxy, announce, workerpool, httpclient
+from ...pipeline import pool, broker, brokers, controller, pipelinemgr
 from ...plugin import manager as plugin_mgr
 from ...command import cmdmgr
 from ...provider.session import sessionmgr as llm_session_mgr
 from ...provider.modelmgr import modelmgr as llm_model_mgr
+from ...provider.modelmgr import cache as llm_cache
 from ...provider.tools import toolmgr as llm_tool_mgr
 from ...platform import botmgr as im_mgr
 from ...persistence import mgr as persistencemgr
@@ -18,7 +19,7 @@ from ...api.http.service import pipeline as pipeline_service
 from ...api.http.service import bot as bot_service
 from ...discover import engine as discover_engine
 from ...storage import mgr as storagemgr
-from ...utils import logcache
+from ...utils import logcache, importutil
 from .. import taskmgr
 
 
@@ -38,6 +39,14 @@ class BuildAppStage(stage.BootingStage):
         await proxy_mgr.initialize()
         ap.proxy_mgr = proxy_mgr
 
+        http_client_mgr = httpclient.HTTPClientManager(ap)
+        await http_client_mgr.initialize()
+        ap.http_client_mgr = http_client_mgr
+
+        worker_pool = workerpool.WorkerPoolManager(ap)
+        await worker_pool.initialize()
+        ap.worker_pool = worker_pool
+
         ver_mgr = version.VersionManager(ap)
         await ver_mgr.initialize()
         ap.ver_mgr = ver_mgr
@@ -46,7 +55,19 @@ class BuildAppStage(stage.BootingStage):
         ann_mgr = announce.AnnouncementManager(ap)
         ap.ann_mgr = ann_mgr
 
-        ap.query_pool = pool.QueryPool()
+        importutil.import_modules_in_pkg(brokers)
+
+        broker_name = ap.instance_config.data.get('broker', {}).get('type', pool.QueryPool.name)
+
+        for broker_cls in broker.preregistered_brokers:
+            if broker_cls.name == broker_name:
+                break
+        else:
+            raise ValueError(f'未知的请求代理类型: {broker_name}')
+
+        query_pool = broker_cls(ap)
+        await query_pool.initialize()
+        ap.query_pool = query_pool
 
         log_cache = logcache.LogCache()
         ap.log_cache = log_cache
@@ -72,6 +93,10 @@ class BuildAppStage(stage.BootingStage):
         await llm_model_mgr_inst.initialize()
         ap.model_mgr = llm_model_mgr_inst
 
+        llm_cache_inst = llm_cache.ResponseCache(ap)
+        await llm_cache_inst.initialize()
+        ap.llm_cache = llm_cache_inst
+
         llm_session_mgr_inst = llm_session_mgr.SessionManager(ap)
         await llm_session_mgr_inst.initialize()
         ap.sess_mgr = llm_session_mgr_inst
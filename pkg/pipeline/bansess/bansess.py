@@ -14,6 +14,20 @@ class BanSessionCheckStage(stage.PipelineStage):
     async def initialize(self, pipeline_config: dict):
         pass
 
+    def is_noop(
+        self,
+        stage_inst_name: str,
+        pipeline_config: dict,
+        launcher_type: core_entities.LauncherTypes,
+    ) -> bool:
+        mode = pipeline_config['trigger']['access-control']['mode']
+        sess_list = pipeline_config['trigger']['access-control'][mode]
+
+        # 黑名单为空，或白名单放行该类型的所有会话
+        if mode == 'whitelist':
+            return f'{launcher_type.value}_*' in sess_list
+        return not sess_list
+
     async def process(self, query: core_entities.Query, stage_inst_name: str) -> entities.StageProcessResult:
         found = False
 
@@ -0,0 +1,89 @@
+from __future__ import annotations
+
+import abc
+import typing
+
+from ..core import app, entities
+from ..platform import adapter as msadapter
+from ..platform.types import message as platform_message
+from ..platform.types import events as platform_events
+
+
+preregistered_brokers: list[typing.Type[QueryBroker]] = []
+
+
+def broker_class(name: str):
+    def decorator(cls: typing.Type[QueryBroker]) -> typing.Type[QueryBroker]:
+        cls.name = name
+        preregistered_brokers.append(cls)
+        return cls
+
+    return decorator
+
+
+class QueryDroppedError(Exception):
+    """请求被拒绝、丢弃或因排队超时而过期，不会得到回复"""
+
+
+def get_session_key(query: entities.Query) -> str:
+    """获取请求所属会话的唯一标识，格式与其他模块中使用的 {launcher_type}_{launcher_id} 一致"""
+    return f'{query.launcher_type.value}_{query.launcher_id}'
+
+
+class QueryBroker(metaclass=abc.ABCMeta):
+    """请求代理抽象类
+
+    消息平台收到的请求经由代理排队，控制器从代理取出可以处理的请求。
+    代理负责保证同一会话的并发不超过上限。
+    """
+
+    name: str = None
+
+    ap: app.Application
+
+    query_id_counter: int = 0
+    """请求ID计数，也用于统计本节点收到的请求数"""
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        self.query_id_counter = 0
+
+    async def initialize(self):
+        pass
+
+    @abc.abstractmethod
+    async def add_query(
+        self,
+        bot_uuid: str,
+        launcher_type: entities.LauncherTypes,
+        launcher_id: typing.Union[int, str],
+        sender_id: typing.Union[int, str],
+        message_event: platform_events.MessageEvent,
+        message_chain: platform_message.MessageChain,
+        adapter: msadapter.MessagePlatformAdapter,
+        pipeline_uuid: typing.Optional[str] = None,
+    ) -> entities.Query | None:
+        """添加请求
+
+        Returns:
+            entities.Query | None: 添加的请求，若被拒绝则返回 None
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def next_query(self) -> entities.Query:
+        """等待并取出下一个可以处理的请求，同时占用其会话的并发额度"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def release_query(self, query: entities.Query):
+        """请求处理完毕，归还其会话的并发额度"""
+        raise NotImplementedError
+
+    def is_session_busy(self, session_key: str) -> bool:
+        """会话在本节点是否有正在处理或等待处理的请求"""
+        return False
+
+    async def get_stats(self) -> dict:
+        """排队统计"""
+        return {'broker': self.name}
@@ -0,0 +1,500 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import json
+import os
+import socket
+import typing
+import uuid
+
+from .. import broker
+from ...core import app, entities
+from ...platform import adapter as msadapter
+from ...platform.types import message as platform_message
+from ...platform.types import events as platform_events
+from ...utils import resp
+
+
+BLOCK_TIMEOUT = 5
+"""等待就绪会话的单次阻塞时长上限（秒），超时后重新等待"""
+
+RECONNECT_INTERVAL = 1
+"""连接出错后重试的间隔（秒）"""
+
+ENQUEUE_SCRIPT = """
+redis.call('RPUSH', KEYS[1], ARGV[1])
+redis.call('RPUSH', KEYS[2], ARGV[2])
+return 1
+"""
+"""将请求放入会话队列并通知就绪，两步在同一脚本中执行，避免只写入其中之一"""
+
+RELEASE_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+"""仅在租约仍由本节点持有时释放"""
+
+RENEW_LEASE_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+return 0
+"""
+"""仅在租约仍由本节点持有时续期"""
+
+
+@broker.broker_class('redis')
+class RedisBroker(broker.QueryBroker):
+    """基于 Redis 协议的网络请求代理，使多个 LangBot 节点共同处理同一机器人的请求
+
+    每个会话的待处理请求保存在 Redis 列表中，会话有新请求时其名称被放入全局就绪列表，各节点阻塞地从中领取。
+    领取会话的节点需先取得该会话的租约，同一时间只有持有租约的节点处理该会话，
+    其他节点领取到该会话时会将其转交到租约持有节点的私有就绪列表。租约只在处理期间持有并定期续期，
+    节点失效后租约在 lease-ttl 秒内过期，其他节点即可接管该会话。
+    会话处理完毕后记录 affinity-ttl 秒的会话亲和，亲和节点仍存活时会话转交给它处理，
+    使会话记录（保存在各节点内存中）尽量留在同一节点上；亲和节点失效时不再等待。
+    各节点定期检查失效节点，将其私有就绪列表中的会话交还全局就绪列表。
+
+    请求以 JSON 序列化后存入 Redis，取出时只重建消息事件与消息链模型，不执行任意反序列化。
+    WebChat 请求及无法序列化的请求（消息事件中带有无法序列化的平台原始对象等）只在收到它们的节点上处理。
+    排队上限、合并与公平调度仅由内存请求池支持。
+    """
+
+    node_id: str
+    """本节点标识"""
+
+    prefix: str
+    """键名前缀"""
+
+    lease_ttl: int
+    """会话租约有效期（毫秒），处理中的会话会定期续期"""
+
+    block_timeout: float
+    """等待就绪会话的单次阻塞时长（秒）
+
+    不超过租约有效期的一半：节点失效而连接未断开时，Redis 中残留的阻塞等待可能取走通知，
+    使其在节点被判定失效（存活标记过期）前结束，之后交还的会话不会再被失效节点取走。
+    """
+
+    affinity_ttl: int
+    """会话处理完毕后会话亲和的保留时长（毫秒），为 0 时不保留"""
+
+    session_concurrency: int
+    """单个会话的并发上限"""
+
+    conn: resp.RESPConnection
+    """命令连接"""
+
+    blocking_conn: resp.RESPConnection
+    """阻塞等待就绪会话使用的连接"""
+
+    session_running: dict[str, int]
+    """会话名 -> 该会话在本节点正在处理的请求数"""
+
+    running_sessions: dict[int, str]
+    """请求ID -> 本节点正在处理的请求所属的会话名"""
+
+    local_queries: dict[int, entities.Query]
+    """请求ID -> 只在本节点处理且仍在排队的请求"""
+
+    local_pending: collections.Counter[str]
+    """会话标识 -> 该会话只在本节点处理且仍在排队的请求数"""
+
+    dispatched_count: int
+    """本节点已调度的请求数"""
+
+    forwarded_count: int
+    """转交给租约持有节点的会话通知数"""
+
+    def __init__(self, ap: app.Application):
+        super().__init__(ap)
+        self.node_id = ''
+        self.prefix = 'langbot'
+        self.lease_ttl = 30000
+        self.block_timeout = BLOCK_TIMEOUT
+        self.affinity_ttl = 600000
+        self.session_concurrency = 1
+        self.session_running = {}
+        self.running_sessions = {}
+        self.local_queries = {}
+        self.local_pending = collections.Counter()
+        self.dispatched_count = 0
+        self.forwarded_count = 0
+
+    async def initialize(self):
+        self.session_concurrency = max(1, self.ap.instance_config.data['concurrency']['session'])
+
+        broker_cfg = self.ap.instance_config.data.get('broker', {})
+        redis_cfg = broker_cfg.get('redis', {})
+
+        self.node_id = broker_cfg.get('node-id', '') or f'{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:8]}'
+        self.prefix = redis_cfg.get('prefix', 'langbot')
+        self.lease_ttl = int(redis_cfg.get('lease-ttl', 30) * 1000)
+        self.block_timeout = min(BLOCK_TIMEOUT, self.lease_ttl / 1000 / 2)
+        self.affinity_ttl = int(redis_cfg.get('affinity-ttl', 600) * 1000)
+
+        conn_args = {
+            'host': redis_cfg.get('host', '127.0.0.1'),
+            'port': redis_cfg.get('port', 6379),
+            'password': redis_cfg.get('password', ''),
+            'db': redis_cfg.get('db', 0),
+        }
+        self.conn = resp.RESPConnection(**conn_args)
+        self.blocking_conn = resp.RESPConnection(**conn_args)
+
+        await self.conn.execute('PING')
+        await self._heartbeat()
+
+        self.ap.task_mgr.create_task(
+            self._renew_leases(),
+            kind='broker',
+            name='broker-lease-renewal',
+        )
+
+        self.ap.logger.info(f'Query broker connected to {conn_args["host"]}:{conn_args["port"]} as node {self.node_id}')
+
+    def _key(self, *parts: str) -> str:
+        return ':'.join([self.prefix, *parts])
+
+    def _is_local(self, bot_uuid: str) -> bool:
+        """WebChat 的回复通过本节点内存中的等待者返回，只能在本节点处理"""
+        return bot_uuid == self.ap.platform_mgr.webchat_proxy_bot.bot_entity.uuid
+
+    async def add_query(
+        self,
+        bot_uuid: str,
+        launcher_type: entities.LauncherTypes,
+        launcher_id: typing.Union[int, str],
+        sender_id: typing.Union[int, str],
+        message_event: platform_events.MessageEvent,
+        message_chain: platform_message.MessageChain,
+        adapter: msadapter.MessagePlatformAdapter,
+        pipeline_uuid: typing.Optional[str] = None,
+    ) -> entities.Query | None:
+        try:
+            query_id = await self.conn.execute('INCR', self._key('query_id'))
+        except (OSError, resp.RESPError) as e:
+            self.ap.logger.error(f'Query broker failed to add query from {launcher_type.value}_{launcher_id}: {e}')
+            return None
+
+        query = entities.Query(
+            bot_uuid=bot_uuid,
+            query_id=query_id,
+            launcher_type=launcher_type,
+            launcher_id=launcher_id,
+            sender_id=sender_id,
+            message_event=message_event,
+            message_chain=message_chain,
+            resp_messages=[],
+            resp_message_chain=[],
+            adapter=adapter,
+            pipeline_uuid=pipeline_uuid,
+        )
+        self.query_id_counter += 1
+
+        payload = None if self._is_local(bot_uuid) else self._dump_query(query)
+
+        session_key = broker.get_session_key(query)
+        local = payload is None
+
+        if local:
+            # 只在本节点处理，Redis 中仅记录请求ID，会话名带上节点标识以免与其他节点的同名会话共用租约
+            self.local_queries[query.query_id] = query
+            self.local_pending[session_key] += 1
+
+            session = f'{self.node_id}/{session_key}'
+            payload = json.dumps({'local_query_id': query.query_id})
+            ready_key = self._key('ready', self.node_id)
+        else:
+            session = session_key
+            ready_key = self._key('ready')
+
+        try:
+            await self.conn.execute('EVAL', ENQUEUE_SCRIPT, 2, self._key('q', session), ready_key, payload, session)
+        except (OSError, resp.RESPError) as e:
+            if local:
+                del self.local_queries[query.query_id]
+                self._decrease_local_pending(session_key)
+
+            self.ap.logger.error(f'Query broker failed to enqueue query {query.query_id}: {e}')
+            return None
+
+        return query
+
+    def _decrease_local_pending(self, session_key: str):
+        self.local_pending[session_key] -= 1
+        if self.local_pending[session_key] <= 0:
+            del self.local_pending[session_key]
+
+    def _dump_query(self, query: entities.Query) -> str | None:
+        """序列化请求，消息事件不是内置事件类型或无法序列化为 JSON 时返回 None"""
+        if type(query.message_event) is not getattr(platform_events, query.message_event.type, None):
+            return None
+
+        try:
+            return json.dumps(
+                {
+                    'query_id': query.query_id,
+                    'bot_uuid': query.bot_uuid,
+                    'launcher_type': query.launcher_type.value,
+                    'launcher_id': query.launcher_id,
+                    'sender_id': query.sender_id,
+                    'message_event': json.loads(query.message_event.json()),
+                    'message_chain': json.loads(query.message_chain.json()),
+                    'pipeline_uuid': query.pipeline_uuid,
+                },
+                ensure_ascii=False,
+            )
+        except (TypeError, ValueError):
+            return None
+
+    async def _load_query(self, payload: bytes) -> entities.Query | None:
+        """反序列化请求并关联本节点上对应机器人的适配器，机器人不存在或请求无效时返回 None"""
+        data = json.loads(payload)
+
+        if 'local_query_id' in data:
+            query = self.local_queries.pop(data['local_query_id'], None)
+            if query is None:
+                self.ap.logger.warning(f'Local query {data["local_query_id"]} not found on this node, dropped')
+                return None
+
+            self._decrease_local_pending(broker.get_session_key(query))
+
+            return query
+
+        bot = await self.ap.platform_mgr.get_bot_by_uuid(data['bot_uuid'])
+        if bot is None:
+            self.ap.logger.warning(f'Bot {data["bot_uuid"]} not found on this node, dropped query {data["query_id"]}')
+            return None
+
+        # 只接受内置的消息事件类型
+        event_cls = getattr(platform_events, data['message_event'].get('type', ''), None)
+        if not (isinstance(event_cls, type) and issubclass(event_cls, platform_events.MessageEvent)):
+            self.ap.logger.warning(f'Invalid message event in query {data["query_id"]}, dropped')
+            return None
+
+        return entities.Query(
+            bot_uuid=data['bot_uuid'],
+            query_id=data['query_id'],
+            launcher_type=entities.LauncherTypes(data['launcher_type']),
+            launcher_id=data['launcher_id'],
+            sender_id=data['sender_id'],
+            message_event=event_cls.parse_obj(data['message_event']),
+            message_chain=platform_message.MessageChain.parse_obj(data['message_chain']),
+            resp_messages=[],
+            resp_message_chain=[],
+            adapter=bot.adapter,
+            pipeline_uuid=data['pipeline_uuid'],
+        )
+
+    async def next_query(self) -> entities.Query:
+        while True:
+            try:
+                reply = await self.blocking_conn.execute(
+                    'BLPOP', self._key('ready', self.node_id), self._key('ready'), self.block_timeout
+                )
+                if reply is None:
+                    continue
+
+                query = await self._dispatch(resp.to_str(reply[1]))
+                if query is not None:
+                    return query
+            except (OSError, resp.RESPError) as e:
+                self.ap.logger.error(f'Query broker error: {e}')
+                await asyncio.sleep(RECONNECT_INTERVAL)
+
+    async def _dispatch(self, session: str) -> entities.Query | None:
+        """尝试从会话中取出一个请求，会话由其他节点持有或亲和于其他存活节点时转交给该节点"""
+        running = self.session_running.get(session, 0)
+        if running >= self.session_concurrency:
+            # 本节点已达到该会话的并发上限，归还额度时会重新检查
+            return None
+
+        owner = await self._acquire_lease(session)
+        if owner != self.node_id:
+            if await self._is_node_alive(owner):
+                await self._forward(session, owner)
+            else:
+                # 租约持有节点已失效，租约过期后由本节点接管
+                delay = max(await self.conn.execute('PTTL', self._key('lease', session)), 0) / 1000
+                self.ap.task_mgr.create_task(
+                    self._notify_later(session, delay),
+                    kind='broker',
+                    name=f'broker-takeover-{session}',
+                )
+            return None
+
+        if running == 0:
+            affinity_node = await self.conn.execute('GET', self._key('affinity', session))
+            affinity_node = resp.to_str(affinity_node) if affinity_node is not None else self.node_id
+
+            if affinity_node != self.node_id and await self._is_node_alive(affinity_node):
+                await self._release_lease(session)
+                await self._forward(session, affinity_node)
+                return None
+
+        query = await self._pop_query(session)
+        if query is None:
+            if running == 0:
+                await self._release_lease(session)
+            return None
+
+        if running == 0:
+            # 记录本节点持有的会话，本节点失效时由其他节点重新通知
+            await self.conn.execute('SADD', self._key('held', self.node_id), session)
+
+        self.session_running[session] = running + 1
+        self.running_sessions[query.query_id] = session
+        self.dispatched_count += 1
+
+        await self._set_affinity(session)
+
+        if running + 1 < self.session_concurrency:
+            # 仍有余量，继续处理该会话的后续请求
+            await self._notify_if_pending(session)
+
+        return query
+
+    async def _pop_query(self, session: str) -> entities.Query | None:
+        """取出会话的下一个请求，会话队列为空或请求无法处理时返回 None"""
+        payload = await self.conn.execute('LPOP', self._key('q', session))
+        if payload is None:
+            # 重复的通知，请求已被取走
+            return None
+
+        try:
+            query = await self._load_query(payload)
+        except Exception as e:
+            self.ap.logger.warning(f'Invalid query payload in session {session}, dropped: {e}')
+            query = None
+
+        if query is None:
+            await self._notify_if_pending(session)
+
+        return query
+
+    async def _forward(self, session: str, node_id: str):
+        """将会话通知转交到指定节点的私有就绪列表"""
+        await self.conn.execute('RPUSH', self._key('ready', node_id), session)
+        self.forwarded_count += 1
+
+    async def _acquire_lease(self, session: str) -> str:
+        """获取会话租约，返回租约持有节点的标识"""
+        lease_key = self._key('lease', session)
+
+        while True:
+            if await self.conn.execute('SET', lease_key, self.node_id, 'NX', 'PX', self.lease_ttl) is not None:
+                return self.node_id
+
+            owner = await self.conn.execute('GET', lease_key)
+            if owner is None:
+                # 租约恰好过期，重新获取
+                continue
+
+            owner = resp.to_str(owner)
+            if owner == self.node_id:
+                await self.conn.execute('PEXPIRE', lease_key, self.lease_ttl)
+            return owner
+
+    async def _release_lease(self, session: str):
+        await self.conn.execute('EVAL', RELEASE_LEASE_SCRIPT, 1, self._key('lease', session), self.node_id)
+
+    async def _set_affinity(self, session: str):
+        if self.affinity_ttl > 0:
+            await self.conn.execute('SET', self._key('affinity', session), self.node_id, 'PX', self.affinity_ttl)
+
+    async def _is_node_alive(self, node_id: str) -> bool:
+        return await self.conn.execute('EXISTS', self._key('node', node_id)) > 0
+
+    async def _notify_later(self, session: str, delay: float):
+        await asyncio.sleep(delay)
+        await self.conn.execute('RPUSH', self._key('ready', self.node_id), session)
+
+    async def _notify_if_pending(self, session: str):
+        """会话仍有待处理请求时，通知本节点继续处理"""
+        if await self.conn.execute('LLEN', self._key('q', session)) > 0:
+            await self.conn.execute('RPUSH', self._key('ready', self.node_id), session)
+
+    async def release_query(self, query: entities.Query):
+        session = self.running_sessions.pop(query.query_id)
+
+        running = self.session_running[session] - 1
+        if running > 0:
+            self.session_running[session] = running
+        else:
+            del self.session_running[session]
+
+            # 租约只在处理期间持有，之后由会话亲和使后续请求仍由本节点处理
+            await self._set_affinity(session)
+            await self._release_lease(session)
+            await self.conn.execute('SREM', self._key('held', self.node_id), session)
+
+        await self._notify_if_pending(session)
+
+    async def _heartbeat(self):
+        """标记本节点存活，存活标记与租约同时过期"""
+        await self.conn.execute('SET', self._key('node', self.node_id), 1, 'PX', self.lease_ttl)
+        await self.conn.execute('SADD', self._key('nodes'), self.node_id)
+
+    async def _recover_dead_nodes(self):
+        """重新通知失效节点持有的会话及其私有就绪列表中的会话，只在该节点处理的会话随节点一同失效"""
+        for node_id in await self.conn.execute('SMEMBERS', self._key('nodes')):
+            node_id = resp.to_str(node_id)
+            if node_id == self.node_id or await self._is_node_alive(node_id):
+                continue
+
+            sessions = {
+                resp.to_str(session) for session in await self.conn.execute('SMEMBERS', self._key('held', node_id))
+            }
+
+            ready_key = self._key('ready', node_id)
+            while (session := await self.conn.execute('LPOP', ready_key)) is not None:
+                sessions.add(resp.to_str(session))
+
+            for session in sessions:
+                if not session.startswith(f'{node_id}/'):
+                    await self.conn.execute('RPUSH', self._key('ready'), session)
+
+            await self.conn.execute('DEL', self._key('held', node_id))
+            await self.conn.execute('SREM', self._key('nodes'), node_id)
+            self.ap.logger.info(f'Query broker node {node_id} is gone, recovered {len(sessions)} sessions')
+
+    async def _renew_leases(self):
+        """定期发送心跳、为正在处理的会话续期租约，并接管失效节点的会话"""
+        while True:
+            await asyncio.sleep(self.lease_ttl / 1000 / 3)
+
+            try:
+                await self._heartbeat()
+
+                for session in list(self.session_running):
+                    renewed = await self.conn.execute(
+                        'EVAL', RENEW_LEASE_SCRIPT, 1, self._key('lease', session), self.node_id, self.lease_ttl
+                    )
+                    if not renewed:
+                        self.ap.logger.warning(f'Lease of session {session} was lost')
+
+                await self._recover_dead_nodes()
+            except (OSError, resp.RESPError) as e:
+                self.ap.logger.warning(f'Failed to renew leases: {e}')
+
+    def is_session_busy(self, session_key: str) -> bool:
+        return (
+            session_key in self.session_running
+            or f'{self.node_id}/{session_key}' in self.session_running
+            or session_key in self.local_pending
+        )
+
+    async def get_stats(self) -> dict:
+        return {
+            'broker': self.name,
+            'node_id': self.node_id,
+            'running_count': len(self.running_sessions),
+            'local_pending_count': len(self.local_queries),
+            'ready_count': await self.conn.execute('LLEN', self._key('ready')),
+            'dispatched_count': self.dispatched_count,
+            'forwarded_count': self.forwarded_count,
+        }
@@ -123,6 +123,23 @@ class ContentFilterStage(stage.PipelineStage):
 
             return entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
 
+    def is_noop(
+        self,
+        stage_inst_name: str,
+        pipeline_config: dict,
+        launcher_type: core_entities.LauncherTypes,
+    ) -> bool:
+        # 过滤范围不包含此阶段时不做任何处理
+        # 其他情况即使没有启用的过滤规则，阶段仍会规范化消息内容，不能跳过
+        scope = pipeline_config['safety']['content-filter']['scope']
+
+        if stage_inst_name == 'PreContentFilterStage':
+            return scope == 'output-msg'
+        elif stage_inst_name == 'PostContentFilterStage':
+            return scope == 'income-msg'
+
+        return False
+
     async def process(self, query: core_entities.Query, stage_inst_name: str) -> entities.StageProcessResult:
         """处理"""
         if stage_inst_name == 'PreContentFilterStage':
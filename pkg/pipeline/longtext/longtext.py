@@ -78,6 +78,8 @@ class LongTextProcessStage(stage.PipelineStage):
 
         if contains_non_plain:
             self.ap.logger.debug('Message contains non-Plain components, skip long message processing.')
+        elif query.reply_stream is not None and query.reply_stream.active:
+            self.ap.logger.debug('Message has been partially sent by streaming reply, skip long message processing.')
         elif (
             len(str(query.resp_message_chain[-1]))
             > query.pipeline_config['output']['long-text-processing']['threshold']
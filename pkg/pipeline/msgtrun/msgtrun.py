@@ -20,7 +20,7 @@ class ConversationMessageTruncator(stage.PipelineStage):
     trun: truncator.Truncator
 
     async def initialize(self, pipeline_config: dict):
-        use_method = 'round'
+        use_method = pipeline_config['ai']['local-agent'].get('truncate-method', 'round')
 
         for trun in truncator.preregistered_truncators:
             if trun.name == use_method:
@@ -29,6 +29,8 @@ class ConversationMessageTruncator(stage.PipelineStage):
         else:
             raise ValueError(f'Unknown truncator: {use_method}')
 
+        await self.trun.initialize()
+
     async def process(self, query: core_entities.Query, stage_inst_name: str) -> entities.StageProcessResult:
         """Process"""
         query = await self.trun.truncate(query)
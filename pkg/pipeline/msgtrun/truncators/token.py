@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+from .. import truncator
+from ....core import entities as core_entities
+from ....provider.modelmgr import ratelimit
+from ....utils import tokenizer
+
+
+@truncator.truncator_class('token')
+class TokenTruncator(truncator.Truncator):
+    """Keep the newest messages whose total token count fits the context token limit."""
+
+    tokenizer: tokenizer.Tokenizer
+
+    async def initialize(self):
+        self.tokenizer = await tokenizer.load_tokenizer(self.ap)
+
+    async def truncate(self, query: core_entities.Query) -> core_entities.Query:
+        """Truncate"""
+        max_tokens = query.pipeline_config['ai']['local-agent'].get('max-tokens', 0)
+
+        model = query.use_llm_model
+        if model is not None and model.context_window > 0:
+            # 配置了上下文窗口的模型按其窗口截断，并为回复预留最大输出 token 数
+            max_tokens = model.context_window - ratelimit.get_max_output_tokens(model.model_entity.extra_args)
+
+        if max_tokens <= 0:
+            return query
+
+        # 提示词和本次的用户消息总是保留
+        budget = max_tokens - self.tokenizer.count_message(query.user_message)
+        for msg in query.prompt.messages:
+            budget -= self.tokenizer.count_message(msg)
+
+        # Traverse from back to front
+        start = len(query.messages)
+        for i in range(len(query.messages) - 1, -1, -1):
+            budget -= self.tokenizer.count_message(query.messages[i])
+            if budget < 0:
+                break
+            start = i
+
+        # 不以模型回复或工具结果开头，避免工具结果缺少对应的工具调用
+        while start < len(query.messages) and query.messages[start].role in ('assistant', 'tool'):
+            start += 1
+
+        query.messages = query.messages[start:]
+
+        return query
@@ -1,5 +1,7 @@
 from __future__ import annotations
 
+import asyncio
+import time
 import typing
 import traceback
 
@@ -11,7 +13,7 @@ from ..entity.persistence import pipeline as persistence_pipeline
 from . import stage
 from ..platform.types import message as platform_message, events as platform_events
 from ..plugin import events
-from ..utils import importutil
+from ..utils import importutil, histogram
 
 from . import (
     resprule,
@@ -65,18 +67,42 @@ class RuntimePipeline:
     stage_containers: list[StageInstContainer]
     """阶段实例容器"""
 
+    execution_plans: dict[entities.LauncherTypes, list[StageInstContainer]]
+    """会话类型 -> 执行计划，即去掉对该类型会话必然不产生作用的阶段后的阶段列表"""
+
+    deadline_exceeded_counts: dict[str, int]
+    """阶段名 -> 在该阶段超过处理时限的请求数"""
+
+    stage_latencies: dict[str, histogram.LatencyHistogram]
+    """阶段名 -> 该阶段每次处理（生成器阶段为每次产出结果）的耗时分布"""
+
+    query_latency: histogram.LatencyHistogram
+    """请求经过整个流水线的耗时分布"""
+
     def __init__(
         self,
         ap: app.Application,
         pipeline_entity: persistence_pipeline.LegacyPipeline,
         stage_containers: list[StageInstContainer],
+        execution_plans: dict[entities.LauncherTypes, list[StageInstContainer]] | None = None,
     ):
         self.ap = ap
         self.pipeline_entity = pipeline_entity
         self.stage_containers = stage_containers
+        self.execution_plans = execution_plans or {
+            launcher_type: stage_containers for launcher_type in entities.LauncherTypes
+        }
+        self.deadline_exceeded_counts = {}
+        self.stage_latencies = {}
+        self.query_latency = histogram.LatencyHistogram()
 
     async def run(self, query: entities.Query):
         query.pipeline_config = self.pipeline_entity.config
+
+        deadline = query.pipeline_config['safety'].get('deadline', {}).get('timeout', 0)
+        if deadline > 0:
+            query.deadline = time.monotonic() + deadline
+
         await self.process_query(query)
 
     async def _check_output(self, query: entities.Query, result: pipeline_entities.StageProcessResult):
@@ -133,44 +159,118 @@ class RuntimePipeline:
         """
         i = stage_index
 
-        while i < len(self.stage_containers):
-            stage_container = self.stage_containers[i]
+        stage_containers = self.execution_plans[query.launcher_type]
+
+        while i < len(stage_containers):
+            if query.get_remaining_time() == 0:
+                # 已超过处理时限，不再执行后续阶段
+                raise asyncio.TimeoutError()
+
+            stage_container = stage_containers[i]
 
             query.current_stage = stage_container  # 标记到 Query 对象里
 
+            started_at = time.monotonic()
+
             result = stage_container.inst.process(query, stage_container.inst_name)
 
             if isinstance(result, typing.Coroutine):
                 result = await result
 
             if isinstance(result, pipeline_entities.StageProcessResult):  # 直接返回结果
-                self.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} res {result}')
+                self._record_stage_latency(query, stage_container.inst_name, time.monotonic() - started_at)
+
+                self.ap.logger.debug('Stage %s processed query %s res %s', stage_container.inst_name, query, result)
                 await self._check_output(query, result)
 
                 if result.result_type == pipeline_entities.ResultType.INTERRUPT:
-                    self.ap.logger.debug(f'Stage {stage_container.inst_name} interrupted query {query}')
+                    self.ap.logger.debug('Stage %s interrupted query %s', stage_container.inst_name, query)
                     break
                 elif result.result_type == pipeline_entities.ResultType.CONTINUE:
                     query = result.new_query
             elif isinstance(result, typing.AsyncGenerator):  # 生成器
-                self.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} gen')
+                self.ap.logger.debug('Stage %s processed query %s gen', stage_container.inst_name, query)
 
                 async for sub_result in result:
-                    self.ap.logger.debug(f'Stage {stage_container.inst_name} processed query {query} res {sub_result}')
+                    # 只计入生成器产出此结果所用的时间，不含后续阶段的处理时间
+                    self._record_stage_latency(query, stage_container.inst_name, time.monotonic() - started_at)
+
+                    self.ap.logger.debug(
+                        'Stage %s processed query %s res %s', stage_container.inst_name, query, sub_result
+                    )
                     await self._check_output(query, sub_result)
 
                     if sub_result.result_type == pipeline_entities.ResultType.INTERRUPT:
-                        self.ap.logger.debug(f'Stage {stage_container.inst_name} interrupted query {query}')
+                        self.ap.logger.debug('Stage %s interrupted query %s', stage_container.inst_name, query)
                         break
                     elif sub_result.result_type == pipeline_entities.ResultType.CONTINUE:
                         query = sub_result.new_query
                         await self._execute_from_stage(i + 1, query)
+
+                    query.current_stage = stage_container
+                    started_at = time.monotonic()
                 break
 
             i += 1
 
+    def _record_stage_latency(self, query: entities.Query, inst_name: str, elapsed: float):
+        stage_latency = self.stage_latencies.get(inst_name)
+        if stage_latency is None:
+            stage_latency = histogram.LatencyHistogram()
+            self.stage_latencies[inst_name] = stage_latency
+        stage_latency.record(elapsed)
+
+        query.stage_timings.append((inst_name, elapsed))
+
+    def get_latency_stats(self) -> dict:
+        """各阶段及整个流水线的耗时分布"""
+        return {
+            'query': self.query_latency.to_dict(),
+            'stages': {
+                container.inst_name: {
+                    **self.stage_latencies.get(container.inst_name, histogram.LatencyHistogram()).to_dict(),
+                    'deadline_exceeded': self.deadline_exceeded_counts.get(container.inst_name, 0),
+                }
+                for container in self.stage_containers
+            },
+        }
+
+    async def _execute_with_deadline(self, query: entities.Query):
+        """执行所有阶段，超过处理时限时取消执行并记录超时的阶段"""
+        cancelled = False
+
+        try:
+            await asyncio.wait_for(self._execute_from_stage(0, query), query.get_remaining_time())
+        except asyncio.TimeoutError:
+            if query.get_remaining_time() != 0:
+                raise
+            cancelled = True
+
+        if query.get_remaining_time() != 0:
+            return
+
+        # 超时可能发生在阶段内（如请求器按剩余时间设置的超时，由该阶段自行处理），也可能是执行被取消
+        inst_name = query.current_stage.inst_name if query.current_stage else 'unknown'
+        self.deadline_exceeded_counts[inst_name] = self.deadline_exceeded_counts.get(inst_name, 0) + 1
+
+        self.ap.logger.warning(f'Query {query.query_id} exceeded its deadline at stage {inst_name}')
+
+        if cancelled:
+            hide_exception_info = query.pipeline_config['output']['misc']['hide-exception']
+
+            await self._check_output(
+                query,
+                pipeline_entities.StageProcessResult(
+                    result_type=pipeline_entities.ResultType.INTERRUPT,
+                    new_query=query,
+                    user_notice='请求超时' if hide_exception_info else f'请求超时，已在 {inst_name} 阶段取消处理',
+                ),
+            )
+
     async def process_query(self, query: entities.Query):
         """处理请求"""
+        started_at = time.monotonic()
+
         try:
             # ======== 触发 MessageReceived 事件 ========
             event_type = (
@@ -192,15 +292,17 @@ class RuntimePipeline:
             if event_ctx.is_prevented_default():
                 return
 
-            self.ap.logger.debug(f'Processing query {query}')
+            # 以参数形式传入，未开启调试日志时不会格式化整个请求对象
+            self.ap.logger.debug('Processing query %s', query)
 
-            await self._execute_from_stage(0, query)
+            await self._execute_with_deadline(query)
         except Exception as e:
             inst_name = query.current_stage.inst_name if query.current_stage else 'unknown'
             self.ap.logger.error(f'处理请求时出错 query_id={query.query_id} stage={inst_name} : {e}')
             self.ap.logger.error(f'Traceback: {traceback.format_exc()}')
         finally:
-            self.ap.logger.debug(f'Query {query} processed')
+            self.query_latency.record(time.monotonic() - started_at)
+            self.ap.logger.debug('Query %s processed', query)
 
 
 class PipelineManager:
@@ -253,9 +355,37 @@ class PipelineManager:
         for stage_container in stage_containers:
             await stage_container.inst.initialize(pipeline_entity.config)
 
-        runtime_pipeline = RuntimePipeline(self.ap, pipeline_entity, stage_containers)
+        execution_plans = self.compile_execution_plans(pipeline_entity, stage_containers)
+
+        runtime_pipeline = RuntimePipeline(self.ap, pipeline_entity, stage_containers, execution_plans)
         self.pipelines.append(runtime_pipeline)
 
+    def compile_execution_plans(
+        self,
+        pipeline_entity: persistence_pipeline.LegacyPipeline,
+        stage_containers: list[StageInstContainer],
+    ) -> dict[entities.LauncherTypes, list[StageInstContainer]]:
+        """按会话类型编译执行计划，跳过根据流水线配置可以确定不产生作用的阶段"""
+        execution_plans: dict[entities.LauncherTypes, list[StageInstContainer]] = {}
+
+        for launcher_type in entities.LauncherTypes:
+            plan = []
+
+            for stage_container in stage_containers:
+                if stage_container.inst.is_noop(stage_container.inst_name, pipeline_entity.config, launcher_type):
+                    continue
+                plan.append(stage_container)
+
+            execution_plans[launcher_type] = plan
+
+            skipped = [c.inst_name for c in stage_containers if c not in plan]
+            if skipped:
+                self.ap.logger.debug(
+                    f'Pipeline {pipeline_entity.uuid} skips stages for {launcher_type.value} queries: {skipped}'
+                )
+
+        return execution_plans
+
     async def get_pipeline_by_uuid(self, uuid: str) -> RuntimePipeline | None:
         for pipeline in self.pipelines:
             if pipeline.pipeline_entity.uuid == uuid:
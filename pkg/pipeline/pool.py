@@ -1,30 +1,230 @@
 from __future__ import annotations
 
 import asyncio
+import collections
+import enum
+import time
 import typing
 
-from ..core import entities
+from ..core import app, entities
 from ..platform import adapter as msadapter
 from ..platform.types import message as platform_message
 from ..platform.types import events as platform_events
+from . import broker
+from .broker import get_session_key
 
 
-class QueryPool:
-    """请求池，请求获得调度进入pipeline之前，保存在这里"""
+COALESCE_MAX_WINDOWS = 5
+"""合并窗口最多被连续消息延长到的倍数，避免持续发送消息的用户一直得不到回复"""
 
-    query_id_counter: int = 0
 
-    pool_lock: asyncio.Lock
+class QueueStats:
+    """单个机器人的排队统计"""
 
-    queries: list[entities.Query]
+    pending: int
+    """当前排队中的请求数"""
 
-    condition: asyncio.Condition
+    dispatched: int
+    """已调度的请求数"""
+
+    total_wait: float
+    """已调度请求的排队总时长（秒）"""
+
+    max_wait: float
+    """已调度请求的最长排队时长（秒）"""
+
+    shed: int
+    """因队列已满被丢弃的请求数"""
+
+    expired: int
+    """因排队超时被丢弃的请求数"""
 
     def __init__(self):
-        self.query_id_counter = 0
+        self.pending = 0
+        self.dispatched = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.shed = 0
+        self.expired = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'pending': self.pending,
+            'dispatched': self.dispatched,
+            'avg_wait': self.total_wait / self.dispatched if self.dispatched else 0.0,
+            'max_wait': self.max_wait,
+            'shed': self.shed,
+            'expired': self.expired,
+        }
+
+
+class ShedPolicy(enum.Enum):
+    """队列已满时的处理策略"""
+
+    DROP_OLDEST = 'drop-oldest'
+    """丢弃同一范围内最早入队的请求"""
+
+    DROP_NEWEST = 'drop-newest'
+    """丢弃新到达的请求"""
+
+    BUSY_NOTICE = 'busy-notice'
+    """丢弃新到达的请求，并直接通过适配器回复繁忙提示"""
+
+
+class SchedulingFlow:
+    """调度流，公平调度模式下每个 (bot_uuid, pipeline_uuid) 是一个流，FIFO 模式下所有请求共用一个流"""
+
+    weight: float
+    """权重，每轮获得的调度额度"""
+
+    deficit: float
+    """当前剩余的调度额度（Deficit Round Robin）"""
+
+    ready_sessions: collections.OrderedDict[str, None]
+    """此流中有待处理请求且未达到并发上限的会话，按就绪先后排序"""
+
+    def __init__(self, weight: float):
+        self.weight = weight
+        self.deficit = 0.0
+        self.ready_sessions = collections.OrderedDict()
+
+
+@broker.broker_class('memory')
+class QueryPool(broker.QueryBroker):
+    """请求池，请求获得调度进入pipeline之前，保存在这里
+
+    默认的请求代理，仅在本进程内排队。
+    每个会话维护一个 FIFO 队列，有待处理请求且未达到会话并发上限的会话进入其所属调度流的就绪集合。
+    调度流之间使用 Deficit Round Robin 按权重轮流调度，取请求和归还并发额度都是 O(1) 的。
+    """
+
+    pool_lock: asyncio.Lock
+
+    condition: asyncio.Condition
+
+    session_concurrency: int
+    """单个会话的并发上限"""
+
+    scheduler: str
+    """调度模式，fifo 或 fair"""
+
+    bot_weights: dict[str, float]
+    """公平调度模式下各机器人的权重"""
+
+    pipeline_weights: dict[str, float]
+    """公平调度模式下各流水线的权重"""
+
+    session_queues: dict[str, collections.deque[entities.Query]]
+    """会话标识 -> 该会话待处理的请求队列"""
+
+    session_running: dict[str, int]
+    """会话标识 -> 该会话正在处理的请求数"""
+
+    flows: dict[tuple[str, str], SchedulingFlow]
+    """调度流标识 -> 调度流"""
+
+    active_flows: collections.OrderedDict[tuple[str, str], None]
+    """有就绪会话的调度流，按轮转顺序排序"""
+
+    max_queue_size: int
+    """请求池最多容纳的请求数，0 表示不限制"""
+
+    max_queue_size_per_bot: int
+    """单个机器人最多排队的请求数，0 表示不限制"""
+
+    max_queue_size_per_session: int
+    """单个会话最多排队的请求数，0 表示不限制"""
+
+    shed_policy: ShedPolicy
+    """队列已满时的处理策略"""
+
+    busy_notice: str
+    """busy-notice 策略下回复给用户的提示"""
+
+    max_queue_age: float
+    """请求最长排队时间（秒），超过后在调度时直接丢弃，0 表示不限制"""
+
+    coalesce_window: float
+    """合并窗口（秒），同一会话中同一发送者在窗口内连续发送的消息会合并为一个请求，0 表示不合并"""
+
+    coalescing_queries: dict[str, entities.Query]
+    """会话标识 -> 该会话中仍在等待合并后续消息的请求，合并窗口结束前不会被调度"""
+
+    coalescing_timers: dict[str, asyncio.TimerHandle]
+    """会话标识 -> 合并窗口结束的定时器"""
+
+    coalescing_end_tasks: set[asyncio.Task]
+    """定时器触发后获取锁以结束合并窗口的任务，持有引用直到其完成"""
+
+    pending_queries: dict[int, entities.Query]
+    """请求ID -> 排队中的请求，按入队先后排序"""
+
+    enqueue_times: dict[int, float]
+    """请求ID -> 入队时间"""
+
+    bot_pending_queries: dict[str, dict[int, entities.Query]]
+    """机器人UUID -> 该机器人排队中的请求，按入队先后排序"""
+
+    queue_stats: dict[str, QueueStats]
+    """机器人UUID -> 排队统计"""
+
+    def __init__(self, ap: app.Application):
+        super().__init__(ap)
         self.pool_lock = asyncio.Lock()
-        self.queries = []
         self.condition = asyncio.Condition(self.pool_lock)
+        self.session_concurrency = 1
+        self.scheduler = 'fifo'
+        self.bot_weights = {}
+        self.pipeline_weights = {}
+        self.session_queues = {}
+        self.session_running = {}
+        self.flows = {}
+        self.active_flows = collections.OrderedDict()
+        self.max_queue_size = 0
+        self.max_queue_size_per_bot = 0
+        self.max_queue_size_per_session = 0
+        self.shed_policy = ShedPolicy.DROP_NEWEST
+        self.busy_notice = ''
+        self.max_queue_age = 0
+        self.coalesce_window = 0
+        self.coalescing_queries = {}
+        self.coalescing_timers = {}
+        self.coalescing_end_tasks = set()
+        self.pending_queries = {}
+        self.enqueue_times = {}
+        self.bot_pending_queries = {}
+        self.queue_stats = {}
+
+    async def initialize(self):
+        concurrency_cfg = self.ap.instance_config.data['concurrency']
+
+        self.session_concurrency = max(1, concurrency_cfg['session'])
+        self.scheduler = concurrency_cfg.get('scheduler', 'fifo')
+
+        weights_cfg = concurrency_cfg.get('weights', {})
+        self.bot_weights = weights_cfg.get('bots', {}) or {}
+        self.pipeline_weights = weights_cfg.get('pipelines', {}) or {}
+
+        queue_cfg = concurrency_cfg.get('queue', {})
+        self.max_queue_size = queue_cfg.get('max-size', 0)
+        self.max_queue_size_per_bot = queue_cfg.get('max-size-per-bot', 0)
+        self.max_queue_size_per_session = queue_cfg.get('max-size-per-session', 0)
+        self.shed_policy = ShedPolicy(queue_cfg.get('shed-policy', ShedPolicy.DROP_NEWEST.value))
+        self.busy_notice = queue_cfg.get('busy-notice', '')
+        self.max_queue_age = queue_cfg.get('max-age', 0)
+
+        coalesce_cfg = concurrency_cfg.get('coalesce', {})
+        self.coalesce_window = coalesce_cfg.get('window-ms', 0) / 1000
+
+    @property
+    def queries(self) -> list[entities.Query]:
+        """所有待处理的请求（仅用于查看，按会话分组）"""
+        return [query for queue in self.session_queues.values() for query in queue]
+
+    @property
+    def pending_count(self) -> int:
+        """待处理的请求数"""
+        return len(self.pending_queries)
 
     async def add_query(
         self,
@@ -36,7 +236,8 @@ class QueryPool:
         message_chain: platform_message.MessageChain,
         adapter: msadapter.MessagePlatformAdapter,
         pipeline_uuid: typing.Optional[str] = None,
-    ) -> entities.Query:
+    ) -> entities.Query | None:
+        """添加请求，若因队列已满被拒绝则返回 None，若被合并到同一发送者的上一个请求中则返回该请求"""
         async with self.condition:
             query = entities.Query(
                 bot_uuid=bot_uuid,
@@ -51,9 +252,351 @@ class QueryPool:
                 adapter=adapter,
                 pipeline_uuid=pipeline_uuid,
             )
-            self.queries.append(query)
+
+            coalesced_query = self._coalesce(query)
+            if coalesced_query is not None:
+                return coalesced_query
+
             self.query_id_counter += 1
-            self.condition.notify_all()
+
+            admitted = self._admit(query)
+            if admitted:
+                self._enqueue(query)
+
+                if self.coalesce_window > 0 and adapter.query_coalescible:
+                    self._start_coalescing(query)
+
+        if admitted:
+            return query
+
+        if self.shed_policy == ShedPolicy.BUSY_NOTICE and self.busy_notice:
+            try:
+                await adapter.reply_message(
+                    message_source=message_event,
+                    message=platform_message.MessageChain([platform_message.Plain(self.busy_notice)]),
+                    quote_origin=True,
+                )
+            except Exception as e:
+                self.ap.logger.warning(f'Failed to send busy notice for query {query.query_id}: {e}')
+
+        return None
+
+    def _admit(self, query: entities.Query) -> bool:
+        """检查队列上限，按策略腾出空间或拒绝请求，调用方需持有锁"""
+        session_queue = self.session_queues.get(get_session_key(query))
+        bot_queries = self.bot_pending_queries.get(query.bot_uuid or '')
+
+        # 从小范围到大范围依次检查，drop-oldest 时丢弃该范围内最早入队的请求
+        scopes = [
+            ('session', self.max_queue_size_per_session, session_queue),
+            ('bot', self.max_queue_size_per_bot, bot_queries),
+            ('global', self.max_queue_size, self.pending_queries),
+        ]
+
+        for scope, limit, queued in scopes:
+            if limit <= 0 or not queued or len(queued) < limit:
+                continue
+
+            if self.shed_policy != ShedPolicy.DROP_OLDEST:
+                self._get_queue_stats(query).shed += 1
+                self.ap.logger.info(f'Query pool {scope} queue is full, dropped new query {query.query_id}')
+                return False
+
+            while queued and len(queued) >= limit:
+                oldest = queued[0] if isinstance(queued, collections.deque) else next(iter(queued.values()))
+                self._discard(oldest)
+                self._get_queue_stats(oldest).shed += 1
+                oldest.adapter.on_query_dropped(oldest.message_event)
+                self.ap.logger.info(f'Query pool {scope} queue is full, dropped oldest query {oldest.query_id}')
+
+        return True
+
+    def _coalesce(self, new_query: entities.Query) -> entities.Query | None:
+        """尝试将新请求的消息合并到同一会话中同一发送者仍在合并窗口内的请求，成功则返回该请求，调用方需持有锁"""
+        if self.coalesce_window <= 0 or not new_query.adapter.query_coalescible:
+            return None
+
+        session_key = get_session_key(new_query)
+
+        query = self.coalescing_queries.get(session_key)
+        if query is None:
+            return None
+
+        if (
+            query.sender_id != new_query.sender_id
+            or query.bot_uuid != new_query.bot_uuid
+            or query.pipeline_uuid != new_query.pipeline_uuid
+        ):
+            self._stop_coalescing(session_key)
+            return None
+
+        components = [
+            component for component in new_query.message_chain if not isinstance(component, platform_message.Source)
+        ]
+        query.message_chain.extend([platform_message.Plain('\n'), *components])
+
+        # 每合并一条消息窗口重新计时，但从首条消息起最多等待 COALESCE_MAX_WINDOWS 个窗口
+        self.coalescing_timers.pop(session_key).cancel()
+        waited = time.monotonic() - self.enqueue_times[query.query_id]
+        delay = min(self.coalesce_window, self.coalesce_window * COALESCE_MAX_WINDOWS - waited)
+        self._schedule_coalescing_end(session_key, max(delay, 0))
+
+        return query
+
+    def _start_coalescing(self, query: entities.Query):
+        """开始等待合并后续消息，调用方需持有锁"""
+        session_key = get_session_key(query)
+
+        if session_key in self.coalescing_queries:
+            self._stop_coalescing(session_key)
+
+        self.coalescing_queries[session_key] = query
+        self._schedule_coalescing_end(session_key, self.coalesce_window)
+
+    def _schedule_coalescing_end(self, session_key: str, delay: float):
+        """在 delay 秒后结束会话的合并窗口，调用方需持有锁"""
+        loop = asyncio.get_running_loop()
+
+        async def end_coalescing(timer: asyncio.TimerHandle):
+            async with self.condition:
+                # 等待锁期间窗口可能已被延长或重新开始，此时由新的定时器结束窗口
+                if self.coalescing_timers.get(session_key) is not timer:
+                    return
+
+                del self.coalescing_timers[session_key]
+                self._stop_coalescing(session_key)
+
+        def on_timeout():
+            task = loop.create_task(end_coalescing(timer))
+            self.coalescing_end_tasks.add(task)
+            task.add_done_callback(self.coalescing_end_tasks.discard)
+
+        timer = loop.call_later(delay, on_timeout)
+        self.coalescing_timers[session_key] = timer
+
+    def _stop_coalescing(self, session_key: str):
+        """结束会话的合并窗口，使其请求可以被调度，调用方需持有锁"""
+        self.coalescing_queries.pop(session_key, None)
+
+        timer = self.coalescing_timers.pop(session_key, None)
+        if timer is not None:
+            timer.cancel()
+
+        self._mark_ready(session_key)
+
+    def _is_coalescing(self, session_key: str, query: entities.Query) -> bool:
+        return self.coalescing_queries.get(session_key) is query
+
+    def get_queue_stats(self) -> dict[str, dict]:
+        """各机器人的排队统计"""
+        return {bot_uuid: stats.to_dict() for bot_uuid, stats in self.queue_stats.items()}
+
+    def _get_flow_key(self, query: entities.Query) -> tuple[str, str]:
+        if self.scheduler != 'fair':
+            return ('', '')
+        return (query.bot_uuid or '', query.pipeline_uuid or '')
+
+    def _get_flow(self, flow_key: tuple[str, str]) -> SchedulingFlow:
+        flow = self.flows.get(flow_key)
+        if flow is None:
+            bot_uuid, pipeline_uuid = flow_key
+            weight = float(self.bot_weights.get(bot_uuid, 1)) * float(self.pipeline_weights.get(pipeline_uuid, 1))
+            flow = SchedulingFlow(weight=max(weight, 0.01))
+            self.flows[flow_key] = flow
+        return flow
+
+    def _get_queue_stats(self, query: entities.Query) -> QueueStats:
+        bot_uuid = query.bot_uuid or ''
+        stats = self.queue_stats.get(bot_uuid)
+        if stats is None:
+            stats = QueueStats()
+            self.queue_stats[bot_uuid] = stats
+        return stats
+
+    def _enqueue(self, query: entities.Query):
+        """将请求放入所属会话的队列，调用方需持有锁"""
+        session_key = get_session_key(query)
+
+        queue = self.session_queues.get(session_key)
+        if queue is None:
+            queue = collections.deque()
+            self.session_queues[session_key] = queue
+        queue.append(query)
+
+        self.pending_queries[query.query_id] = query
+        self.enqueue_times[query.query_id] = time.monotonic()
+        self.bot_pending_queries.setdefault(query.bot_uuid or '', {})[query.query_id] = query
+        self._get_queue_stats(query).pending += 1
+
+        self._mark_ready(session_key)
+
+    def _forget(self, query: entities.Query) -> float:
+        """清除已出队请求的记录，返回其排队时长，调用方需持有锁"""
+        del self.pending_queries[query.query_id]
+        wait = time.monotonic() - self.enqueue_times.pop(query.query_id)
+
+        bot_uuid = query.bot_uuid or ''
+        bot_queries = self.bot_pending_queries[bot_uuid]
+        del bot_queries[query.query_id]
+        if not bot_queries:
+            del self.bot_pending_queries[bot_uuid]
+
+        self._get_queue_stats(query).pending -= 1
+
+        session_key = get_session_key(query)
+        if self._is_coalescing(session_key, query):
+            self.coalescing_queries.pop(session_key)
+            self.coalescing_timers.pop(session_key).cancel()
+
+        return wait
+
+    def _discard(self, query: entities.Query):
+        """将仍在排队的请求移出请求池，调用方需持有锁
+
+        会话就绪集合中的记录不立即清除，调度时会跳过已失效的记录。
+        """
+        session_key = get_session_key(query)
+
+        queue = self.session_queues[session_key]
+        queue.remove(query)
+        if not queue:
+            del self.session_queues[session_key]
+
+        self._forget(query)
+
+    def _mark_ready(self, session_key: str):
+        """若会话有待处理请求且仍有并发余量，将其加入所属调度流的就绪集合并唤醒一个等待者，调用方需持有锁"""
+        queue = self.session_queues.get(session_key)
+        if not queue:
+            return
+
+        if self.session_running.get(session_key, 0) >= self.session_concurrency:
+            return
+
+        if self._is_coalescing(session_key, queue[0]):
+            return
+
+        flow_key = self._get_flow_key(queue[0])
+        flow = self._get_flow(flow_key)
+
+        if session_key in flow.ready_sessions:
+            return
+
+        flow.ready_sessions[session_key] = None
+
+        if flow_key not in self.active_flows:
+            self.active_flows[flow_key] = None
+
+        self.condition.notify()
+
+    def _select_flow(self) -> SchedulingFlow | None:
+        """按 Deficit Round Robin 选出下一个可调度的流，调用方需持有锁"""
+        while self.active_flows:
+            flow_key = next(iter(self.active_flows))
+            flow = self.flows[flow_key]
+
+            if not flow.ready_sessions:
+                del self.active_flows[flow_key]
+                flow.deficit = 0.0
+                continue
+
+            if flow.deficit >= 1:
+                flow.deficit -= 1
+                if flow.deficit < 1:
+                    # 本轮额度用完，轮到下一个流
+                    self.active_flows.move_to_end(flow_key)
+                return flow
+
+            flow.deficit += flow.weight
+            if flow.deficit < 1:
+                self.active_flows.move_to_end(flow_key)
+
+        return None
+
+    def acquire_next(self) -> entities.Query | None:
+        """取出下一个可以处理的请求并占用其会话的并发额度，没有则返回 None，调用方需持有锁"""
+        while True:
+            flow = self._select_flow()
+            if flow is None:
+                return None
+
+            session_key, _ = flow.ready_sessions.popitem(last=False)
+
+            queue = self.session_queues.get(session_key)
+            if (
+                not queue
+                or self.session_running.get(session_key, 0) >= self.session_concurrency
+                or self._is_coalescing(session_key, queue[0])
+            ):
+                # 已失效的就绪记录（请求已被丢弃、会话已满或仍在合并窗口内），退还额度
+                flow.deficit += 1
+                continue
+
+            query = queue.popleft()
+            if not queue:
+                del self.session_queues[session_key]
+
+            wait = self._forget(query)
+            stats = self._get_queue_stats(query)
+
+            if self.max_queue_age > 0 and wait > self.max_queue_age:
+                stats.expired += 1
+                self.ap.logger.info(f'Query {query.query_id} waited {wait:.1f}s in query pool, dropped as expired')
+                query.adapter.on_query_dropped(query.message_event)
+                flow.deficit += 1
+                self._mark_ready(session_key)
+                continue
+
+            running = self.session_running.get(session_key, 0) + 1
+            self.session_running[session_key] = running
+
+            if running < self.session_concurrency:
+                # 仍有余量，排到就绪集合末尾，与其他会话轮流调度
+                self._mark_ready(session_key)
+
+            stats.dispatched += 1
+            stats.total_wait += wait
+            stats.max_wait = max(stats.max_wait, wait)
+
+            return query
+
+    async def next_query(self) -> entities.Query:
+        async with self.condition:
+            query = self.acquire_next()
+
+            while query is None:
+                await self.condition.wait()
+                query = self.acquire_next()
+
+            return query
+
+    async def release_query(self, query: entities.Query):
+        async with self.condition:
+            # 归还会话并发额度，若该会话还有待处理请求会唤醒消费者
+            self.release(query)
+
+    def is_session_busy(self, session_key: str) -> bool:
+        return session_key in self.session_running or session_key in self.session_queues
+
+    async def get_stats(self) -> dict:
+        return {
+            'broker': self.name,
+            'scheduler': self.scheduler,
+            'pending_count': self.pending_count,
+            'bots': self.get_queue_stats(),
+        }
+
+    def release(self, query: entities.Query):
+        """归还请求所占用的会话并发额度，调用方需持有锁"""
+        session_key = get_session_key(query)
+
+        running = self.session_running.get(session_key, 0) - 1
+        if running > 0:
+            self.session_running[session_key] = running
+        else:
+            self.session_running.pop(session_key, None)
+
+        self._mark_ready(session_key)
 
     async def __aenter__(self):
         await self.pool_lock.acquire()
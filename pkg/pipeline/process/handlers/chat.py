@@ -5,9 +5,10 @@ import traceback
 
 
 from .. import handler
-from ... import entities
+from ... import entities, stream
 from ....core import entities as core_entities
 from ....provider import runner as runner_module
+from ....provider import entities as llm_entities
 from ....plugin import events
 
 from ....platform.types import message as platform_message
@@ -67,7 +68,16 @@ class ChatMessageHandler(handler.MessageHandler):
                 else:
                     raise ValueError(f'Request runner not found: {query.pipeline_config["ai"]["runner"]["runner"]}')
 
+                streaming_cfg = query.pipeline_config['output'].get('streaming', {})
+                if streaming_cfg.get('enable', False):
+                    query.reply_stream = stream.ReplyStream(self.ap, query, streaming_cfg.get('interval', 1.0))
+
                 async for result in runner.run(query):
+                    if isinstance(result, llm_entities.MessageChunk):
+                        if query.reply_stream is not None:
+                            await query.reply_stream.feed(result.content)
+                        continue
+
                     query.resp_messages.append(result)
 
                     self.ap.logger.info(f'Response({query.query_id}): {self.cut_str(result.readable_str())}')
@@ -77,8 +87,15 @@ class ChatMessageHandler(handler.MessageHandler):
 
                     yield entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
 
-                query.session.using_conversation.messages.append(query.user_message)
-                query.session.using_conversation.messages.extend(query.resp_messages)
+                    if query.reply_stream is not None:
+                        # 此消息未被发送（如被插件阻止）时，后续消息仍重新开始
+                        query.reply_stream.reset()
+
+                async with query.session.lock:
+                    query.session.using_conversation.messages.append(query.user_message)
+                    query.session.using_conversation.messages.extend(query.resp_messages)
+
+                self.ap.sess_mgr.schedule_compaction(query, query.session.using_conversation)
             except Exception as e:
                 self.ap.logger.error(f'Request failed({query.query_id}): {type(e).__name__} {str(e)}')
 
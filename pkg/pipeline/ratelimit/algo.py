@@ -22,6 +22,9 @@ class ReteLimitAlgo(metaclass=abc.ABCMeta):
 
     name: str = None
 
+    requires_release: bool = True
+    """是否需要在处理结束后调用 release_access，为 False 时流水线会跳过 ReleaseRateLimitOccupancy 阶段"""
+
     ap: app.Application
 
     def __init__(self, ap: app.Application):
@@ -20,6 +20,8 @@ class SessionContainer:
 
 @algo.algo_class('fixwin')
 class FixedWindowAlgo(algo.ReteLimitAlgo):
+    requires_release = False
+
     containers_lock: asyncio.Lock
     """访问记录容器锁"""
 
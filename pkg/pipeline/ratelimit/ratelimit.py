@@ -37,6 +37,14 @@ class RateLimit(stage.PipelineStage):
         self.algo = algo_class(self.ap)
         await self.algo.initialize()
 
+    def is_noop(
+        self,
+        stage_inst_name: str,
+        pipeline_config: dict,
+        launcher_type: core_entities.LauncherTypes,
+    ) -> bool:
+        return stage_inst_name == 'ReleaseRateLimitOccupancy' and not self.algo.requires_release
+
     async def process(
         self,
         query: core_entities.Query,
@@ -18,6 +18,10 @@ class SendResponseBackStage(stage.PipelineStage):
     async def process(self, query: core_entities.Query, stage_inst_name: str) -> entities.StageProcessResult:
         """处理"""
 
+        if query.reply_stream is not None and await query.reply_stream.finish(query.resp_message_chain[-1]):
+            # 已通过流式回复发送
+            return entities.StageProcessResult(result_type=entities.ResultType.CONTINUE, new_query=query)
+
         random_range = (
             query.pipeline_config['output']['force-delay']['min'],
             query.pipeline_config['output']['force-delay']['max'],
@@ -41,3 +41,16 @@ class PipelineStage(metaclass=abc.ABCMeta):
     ]:
         """处理"""
         raise NotImplementedError
+
+    def is_noop(
+        self,
+        stage_inst_name: str,
+        pipeline_config: dict,
+        launcher_type: core_entities.LauncherTypes,
+    ) -> bool:
+        """根据流水线配置判断此阶段对指定类型会话的请求是否必然不产生任何作用
+
+        流水线加载时据此编译执行计划并跳过这些阶段。
+        仅当可以确定阶段不会改写请求、不会中断流水线、也没有其他副作用时才返回 True。
+        """
+        return False
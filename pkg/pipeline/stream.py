@@ -0,0 +1,166 @@
+from __future__ import annotations
+
+import re
+import time
+import typing
+
+from ..core import app, entities
+from ..platform.types import message as platform_message
+from ..platform.types import events as platform_events
+
+
+SENTENCE_END = re.compile(r'[。！？!?\n]|[.;；](?=\s)')
+"""句子或段落的结束位置，无法修改消息的平台按此切分逐条发送"""
+
+
+class ReplyStream:
+    """流式回复
+
+    接收模型输出的增量文本并逐步展示给用户：
+    支持修改消息的平台先回复一条消息，之后按间隔将其修改为已生成的全部内容；
+    其他平台按间隔将已完整的句子或段落作为单独的消息发送。
+    每条模型消息经流水线包装后，由回复阶段调用 finish 以最终内容收尾。
+    """
+
+    ap: app.Application
+
+    query: entities.Query
+
+    interval: float
+    """两次更新之间的最短间隔（秒）"""
+
+    text: str
+    """当前消息已生成的文本"""
+
+    shown_text: str
+    """已展示给用户的文本，无法修改消息的平台中为已发送的部分"""
+
+    sent_message: typing.Any
+    """可修改的已发送消息"""
+
+    updated_at: float
+    """上次更新的时间"""
+
+    failed: bool
+    """更新出错后不再更新，由回复阶段按普通消息发送"""
+
+    def __init__(self, ap: app.Application, query: entities.Query, interval: float):
+        self.ap = ap
+        self.query = query
+        self.interval = interval
+        self.failed = False
+        self.reset()
+
+    @property
+    def editable(self) -> bool:
+        return self.query.adapter.message_editable
+
+    @property
+    def active(self) -> bool:
+        """当前消息是否已有内容展示给用户"""
+        return not self.failed and self.shown_text != ''
+
+    def reset(self):
+        """开始新的一条消息"""
+        self.text = ''
+        self.shown_text = ''
+        self.sent_message = None
+        self.updated_at = 0.0
+
+    def _make_chain(self, text: str, first: bool) -> platform_message.MessageChain:
+        chain = platform_message.MessageChain([platform_message.Plain(text)])
+
+        if (
+            first
+            and self.query.pipeline_config['output']['misc']['at-sender']
+            and isinstance(self.query.message_event, platform_events.GroupMessage)
+        ):
+            chain.insert(0, platform_message.At(self.query.message_event.sender.id))
+
+        return chain
+
+    async def _reply(self, text: str) -> typing.Any:
+        quote_origin = self.query.pipeline_config['output']['misc']['quote-origin']
+
+        if self.editable:
+            return await self.query.adapter.reply_message_editable(
+                message_source=self.query.message_event,
+                message=self._make_chain(text, first=True),
+                quote_origin=quote_origin,
+            )
+
+        await self.query.adapter.reply_message(
+            message_source=self.query.message_event,
+            message=self._make_chain(text, first=self.shown_text == ''),
+            quote_origin=quote_origin and self.shown_text == '',
+        )
+
+    async def _show(self, text: str):
+        """展示全部文本，或发送新完成的句子"""
+        if self.editable:
+            if self.sent_message is None:
+                self.sent_message = await self._reply(text)
+            elif text != self.shown_text:
+                await self.query.adapter.edit_message(
+                    self.query.message_event,
+                    self.sent_message,
+                    self._make_chain(text, first=True),
+                )
+        else:
+            await self._reply(text[len(self.shown_text) :].strip())
+
+        self.shown_text = text
+
+    async def feed(self, content: str):
+        """追加模型输出的增量文本，距上次更新超过间隔时更新展示的内容"""
+        self.text += content
+
+        if self.failed or time.monotonic() - self.updated_at < self.interval:
+            return
+
+        if self.editable:
+            text = self.text
+        else:
+            # 只发送已完整的句子
+            ends = [m.end() for m in SENTENCE_END.finditer(self.text, len(self.shown_text))]
+            text = self.text[: ends[-1]] if ends else self.shown_text
+
+        if not text[len(self.shown_text) :].strip():
+            return
+
+        try:
+            await self._show(text)
+        except Exception as e:
+            self.ap.logger.warning(f'Failed to update streaming reply of query {self.query.query_id}: {e}')
+            self.failed = True
+
+        self.updated_at = time.monotonic()
+
+    async def finish(self, message_chain: platform_message.MessageChain) -> bool:
+        """以流水线包装后的最终消息链结束当前消息
+
+        Returns:
+            bool: 是否已由流式回复展示，为 False 时需将消息链按普通消息发送
+        """
+        try:
+            if not self.active or not all(isinstance(c, platform_message.Plain) for c in message_chain):
+                return False
+
+            text = str(message_chain)
+
+            if self.editable:
+                if text != self.shown_text:
+                    await self._show(text)
+                await self.query.adapter.finish_editable_message(self.query.message_event, self.sent_message)
+            elif not text.startswith(self.shown_text):
+                # 最终内容被插件等修改，已发送的句子无法撤回，完整发送一次
+                return False
+            elif text[len(self.shown_text) :].strip():
+                await self._show(text)
+
+            return True
+        except Exception as e:
+            self.ap.logger.warning(f'Failed to finish streaming reply of query {self.query.query_id}: {e}')
+            return False
+        finally:
+            self.reset()
@@ -61,6 +61,64 @@ class MessagePlatformAdapter(metaclass=abc.ABCMeta):
         """
         raise NotImplementedError
 
+    message_editable: bool = False
+    """是否支持修改已发送的消息，支持的适配器需实现 reply_message_editable 和 edit_message，流式回复时会逐步更新同一条消息"""
+
+    query_coalescible: bool = True
+    """是否允许请求池将同一发送者在合并窗口内的连续消息合并为一个请求，合并后只会回复首条消息，需要逐条回复的适配器应设为 False"""
+
+    async def reply_message_editable(
+        self,
+        message_source: platform_events.MessageEvent,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+    ) -> typing.Any:
+        """回复一条之后可以修改的消息
+
+        Args:
+            message_source (platform.types.MessageEvent): 消息源事件
+            message (platform.types.MessageChain): 消息链
+            quote_origin (bool, optional): 是否引用原消息. Defaults to False.
+
+        Returns:
+            typing.Any: 发送的消息，传给 edit_message 用于修改该消息
+        """
+        raise NotImplementedError
+
+    async def edit_message(
+        self,
+        message_source: platform_events.MessageEvent,
+        sent_message: typing.Any,
+        message: platform_message.MessageChain,
+    ):
+        """修改 reply_message_editable 发送的消息
+
+        Args:
+            message_source (platform.types.MessageEvent): 消息源事件
+            sent_message (typing.Any): reply_message_editable 的返回值
+            message (platform.types.MessageChain): 新的消息链
+        """
+        raise NotImplementedError
+
+    async def finish_editable_message(self, message_source: platform_events.MessageEvent, sent_message: typing.Any):
+        """reply_message_editable 发送的消息已更新为最终内容，之后不会再修改
+
+        Args:
+            message_source (platform.types.MessageEvent): 消息源事件
+            sent_message (typing.Any): reply_message_editable 的返回值
+        """
+        pass
+
+    def on_query_dropped(self, message_source: platform_events.MessageEvent):
+        """消息对应的请求被请求代理拒绝、丢弃或因排队超时而过期，之后不会再有回复
+
+        需要等待回复的适配器可在此结束等待。
+
+        Args:
+            message_source (platform.types.MessageEvent): 消息源事件
+        """
+        pass
+
     async def is_muted(self, group_id: int) -> bool:
         """获取账号是否在指定群被禁言"""
         raise NotImplementedError
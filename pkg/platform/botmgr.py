@@ -71,7 +71,7 @@ class RuntimeBot:
                 message_session_id=f'person_{event.sender.id}',
             )
 
-            await self.ap.query_pool.add_query(
+            return await self.ap.query_pool.add_query(
                 bot_uuid=self.bot_entity.uuid,
                 launcher_type=core_entities.LauncherTypes.PERSON,
                 launcher_id=event.sender.id,
@@ -96,7 +96,7 @@ class RuntimeBot:
                 message_session_id=f'group_{event.group.id}',
             )
 
-            await self.ap.query_pool.add_query(
+            return await self.ap.query_pool.add_query(
                 bot_uuid=self.bot_entity.uuid,
                 launcher_type=core_entities.LauncherTypes.GROUP,
                 launcher_id=event.group.id,
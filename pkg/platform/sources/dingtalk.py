@@ -5,6 +5,7 @@ from pkg.platform.types import message as platform_message
 from pkg.platform.adapter import MessagePlatformAdapter
 from .. import adapter
 from ...core import app
+from ...core import entities as core_entities
 from ..types import events as platform_events
 from ..types import entities as platform_entities
 from libs.dingtalk_api.api import DingTalkClient
@@ -123,6 +124,7 @@ class DingTalkAdapter(adapter.MessagePlatformAdapter):
             robot_code=config['robot_code'],
             markdown_card=config['markdown_card'],
             logger=self.logger,
+            http_client=self.ap.http_client_mgr.get_client(scope=core_entities.LifecycleControlScope.PLATFORM),
         )
 
     async def reply_message(
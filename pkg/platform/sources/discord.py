@@ -1048,6 +1048,39 @@ class DiscordAdapter(adapter.MessagePlatformAdapter):
 
         await message_source.source_platform_object.channel.send(**args)
 
+    message_editable: bool = True
+
+    async def reply_message_editable(
+        self,
+        message_source: platform_events.MessageEvent,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+    ) -> discord.Message:
+        msg_to_send, _ = await self.message_converter.yiri2target(message)
+        assert isinstance(message_source.source_platform_object, discord.Message)
+
+        args = {
+            'content': msg_to_send,
+        }
+
+        if quote_origin:
+            args['reference'] = message_source.source_platform_object
+
+        if message.has(platform_message.At):
+            args['mention_author'] = True
+
+        return await message_source.source_platform_object.channel.send(**args)
+
+    async def edit_message(
+        self,
+        message_source: platform_events.MessageEvent,
+        sent_message: discord.Message,
+        message: platform_message.MessageChain,
+    ):
+        msg_to_send, _ = await self.message_converter.yiri2target(message)
+
+        await sent_message.edit(content=msg_to_send)
+
     async def is_muted(self, group_id: int) -> bool:
         return False
 
@@ -447,6 +447,68 @@ class LarkAdapter(adapter.MessagePlatformAdapter):
                 f'client.im.v1.message.reply failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}, resp: \n{json.dumps(json.loads(response.raw.content), indent=4, ensure_ascii=False)}'
             )
 
+    # 只有卡片消息可以修改，可修改的回复以仅含一段 markdown 文本的卡片发送
+    message_editable: bool = True
+
+    def _make_card(self, message: platform_message.MessageChain) -> str:
+        text = ''.join(component.text for component in message if isinstance(component, platform_message.Plain))
+
+        return json.dumps(
+            {
+                'config': {'update_multi': True},
+                'elements': [{'tag': 'markdown', 'content': text}],
+            }
+        )
+
+    async def reply_message_editable(
+        self,
+        message_source: platform_events.MessageEvent,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+    ) -> str:
+        request: ReplyMessageRequest = (
+            ReplyMessageRequest.builder()
+            .message_id(message_source.message_chain.message_id)
+            .request_body(
+                ReplyMessageRequestBody.builder()
+                .content(self._make_card(message))
+                .msg_type('interactive')
+                .reply_in_thread(False)
+                .uuid(str(uuid.uuid4()))
+                .build()
+            )
+            .build()
+        )
+
+        response: ReplyMessageResponse = await self.api_client.im.v1.message.areply(request)
+
+        if not response.success():
+            raise Exception(
+                f'client.im.v1.message.reply failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}'
+            )
+
+        return response.data.message_id
+
+    async def edit_message(
+        self,
+        message_source: platform_events.MessageEvent,
+        sent_message: str,
+        message: platform_message.MessageChain,
+    ):
+        request: PatchMessageRequest = (
+            PatchMessageRequest.builder()
+            .message_id(sent_message)
+            .request_body(PatchMessageRequestBody.builder().content(self._make_card(message)).build())
+            .build()
+        )
+
+        response: PatchMessageResponse = await self.api_client.im.v1.message.apatch(request)
+
+        if not response.success():
+            raise Exception(
+                f'client.im.v1.message.patch failed, code: {response.code}, msg: {response.msg}, log_id: {response.get_log_id()}'
+            )
+
     async def is_muted(self, group_id: int) -> bool:
         return False
 
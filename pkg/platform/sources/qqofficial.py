@@ -9,6 +9,7 @@ from pkg.platform.adapter import MessagePlatformAdapter
 from pkg.platform.types import events as platform_events, message as platform_message
 from .. import adapter
 from ...core import app
+from ...core import entities as core_entities
 from ..types import entities as platform_entities
 from ...command.errors import ParamNotEnoughError
 from libs.qq_official_api.api import QQOfficialClient
@@ -157,7 +158,8 @@ class QQOfficialAdapter(adapter.MessagePlatformAdapter):
             app_id=config['appid'],
             secret=config['secret'],
             token=config['token'],
-            logger=self.logger
+            logger=self.logger,
+            http_client=self.ap.http_client_mgr.get_client(scope=core_entities.LifecycleControlScope.PLATFORM),
         )
 
     async def reply_message(
@@ -200,6 +200,46 @@ class TelegramAdapter(adapter.MessagePlatformAdapter):
 
         await self.bot.send_message(**args)
 
+    message_editable: bool = True
+
+    async def _make_text_args(self, message: platform_message.MessageChain) -> dict:
+        """将消息链中的文字合并为一条文本消息的参数"""
+        components = await TelegramMessageConverter.yiri2target(message, self.bot)
+        text = ''.join(component['text'] for component in components if component['type'] == 'text')
+
+        if self.config['markdown_card'] is True:
+            return {'text': telegramify_markdown.markdownify(content=text), 'parse_mode': 'MarkdownV2'}
+        return {'text': text}
+
+    async def reply_message_editable(
+        self,
+        message_source: platform_events.MessageEvent,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+    ) -> telegram.Message:
+        assert isinstance(message_source.source_platform_object, Update)
+
+        args = {
+            'chat_id': message_source.source_platform_object.effective_chat.id,
+            **await self._make_text_args(message),
+        }
+        if quote_origin:
+            args['reply_to_message_id'] = message_source.source_platform_object.message.id
+
+        return await self.bot.send_message(**args)
+
+    async def edit_message(
+        self,
+        message_source: platform_events.MessageEvent,
+        sent_message: telegram.Message,
+        message: platform_message.MessageChain,
+    ):
+        await self.bot.edit_message_text(
+            chat_id=sent_message.chat_id,
+            message_id=sent_message.message_id,
+            **await self._make_text_args(message),
+        )
+
     async def is_muted(self, group_id: int) -> bool:
         return False
 
@@ -8,6 +8,7 @@ from pydantic import BaseModel
 from .. import adapter as msadapter
 from ..types import events as platform_events, message as platform_message, entities as platform_entities
 from ...core import app
+from ...pipeline import broker
 from ..logger import EventLogger
 
 logger = logging.getLogger(__name__)
@@ -19,6 +20,8 @@ class WebChatMessage(BaseModel):
     content: str
     message_chain: list[dict]
     timestamp: str
+    stage_timings: list[dict] = []
+    """流水线各阶段在回复前的耗时，仅调试回复消息中包含"""
 
 
 class WebChatSession:
@@ -101,12 +104,62 @@ class WebChatAdapter(msadapter.MessagePlatformAdapter):
         )
 
         # notify waiter
+        waiter = self._get_resp_waiter(message_source)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(message_data)
+
+        return message_data.model_dump()
+
+    def _get_resp_waiter(
+        self, message_source: platform_events.MessageEvent
+    ) -> typing.Optional[asyncio.Future[WebChatMessage]]:
         if isinstance(message_source, platform_events.FriendMessage):
-            self.webchat_person_session.resp_waiters[message_source.message_chain.message_id].set_result(message_data)
+            use_session = self.webchat_person_session
         elif isinstance(message_source, platform_events.GroupMessage):
-            self.webchat_group_session.resp_waiters[message_source.message_chain.message_id].set_result(message_data)
+            use_session = self.webchat_group_session
+        else:
+            return None
 
-        return message_data.model_dump()
+        return use_session.resp_waiters.get(message_source.message_chain.message_id)
+
+    def on_query_dropped(self, message_source: platform_events.MessageEvent):
+        waiter = self._get_resp_waiter(message_source)
+        if waiter is not None and not waiter.done():
+            waiter.set_exception(broker.QueryDroppedError('query was dropped by the query pool'))
+
+    # 每条调试消息都有各自等待回复的请求，不能合并
+    query_coalescible: bool = False
+
+    # 调试页面不会逐步获取回复，流式回复完成后才将最终内容返回给等待者
+    message_editable: bool = True
+
+    async def reply_message_editable(
+        self,
+        message_source: platform_events.MessageEvent,
+        message: platform_message.MessageChain,
+        quote_origin: bool = False,
+    ) -> WebChatMessage:
+        return WebChatMessage(
+            id=-1,
+            role='assistant',
+            content=str(message),
+            message_chain=[component.__dict__ for component in message],
+            timestamp=datetime.now().isoformat(),
+        )
+
+    async def edit_message(
+        self,
+        message_source: platform_events.MessageEvent,
+        sent_message: WebChatMessage,
+        message: platform_message.MessageChain,
+    ):
+        sent_message.content = str(message)
+        sent_message.message_chain = [component.__dict__ for component in message]
+
+    async def finish_editable_message(self, message_source: platform_events.MessageEvent, sent_message: WebChatMessage):
+        waiter = self._get_resp_waiter(message_source)
+        if waiter is not None and not waiter.done():
+            waiter.set_result(sent_message)
 
     def register_listener(
         self,
@@ -185,18 +238,33 @@ class WebChatAdapter(msadapter.MessagePlatformAdapter):
 
         self.ap.platform_mgr.webchat_proxy_bot.bot_entity.use_pipeline_uuid = pipeline_uuid
 
-        if event.__class__ in self.listeners:
-            await self.listeners[event.__class__](event, self)
-
-        # set waiter
+        # 先设置等待者，请求池在入队时就可能回复（繁忙提示）或丢弃请求
         waiter = asyncio.Future[WebChatMessage]()
         use_session.resp_waiters[message_id] = waiter
         waiter.add_done_callback(lambda future: use_session.resp_waiters.pop(message_id))
 
+        query = None
+
+        try:
+            if event.__class__ in self.listeners:
+                query = await self.listeners[event.__class__](event, self)
+        except BaseException:
+            waiter.cancel()
+            raise
+
+        if query is None and not waiter.done():
+            # 被拒绝且没有收到繁忙提示
+            self.on_query_dropped(event)
+
         resp_message = await waiter
 
         resp_message.id = len(use_session.get_message_list(pipeline_uuid)) + 1
 
+        if query is not None:
+            resp_message.stage_timings = [
+                {'stage': inst_name, 'elapsed': elapsed} for inst_name, elapsed in query.stage_timings
+            ]
+
         use_session.get_message_list(pipeline_uuid).append(resp_message)
 
         return resp_message.model_dump()
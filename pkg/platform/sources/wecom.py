@@ -11,6 +11,7 @@ from pkg.platform.types import events as platform_events, message as platform_me
 from libs.wecom_api.wecomevent import WecomEvent
 from .. import adapter
 from ...core import app
+from ...core import entities as core_entities
 from ..types import entities as platform_entities
 from ...command.errors import ParamNotEnoughError
 from ...utils import image
@@ -157,7 +158,8 @@ class WecomAdapter(adapter.MessagePlatformAdapter):
             token=config['token'],
             EncodingAESKey=config['EncodingAESKey'],
             contacts_secret=config['contacts_secret'],
-            logger=self.logger
+            logger=self.logger,
+            http_client=self.ap.http_client_mgr.get_client(scope=core_entities.LifecycleControlScope.PLATFORM),
         )
 
     async def reply_message(
@@ -10,6 +10,7 @@ from pkg.platform.adapter import MessagePlatformAdapter
 from pkg.platform.types import events as platform_events, message as platform_message
 from libs.wecom_customer_service_api.wecomcsevent import WecomCSEvent
 from pkg.core import app
+from pkg.core import entities as core_entities
 from .. import adapter
 from ..types import entities as platform_entities
 from ...command.errors import ParamNotEnoughError
@@ -145,7 +146,8 @@ class WecomCSAdapter(adapter.MessagePlatformAdapter):
             secret=config['secret'],
             token=config['token'],
             EncodingAESKey=config['EncodingAESKey'],
-            logger=self.logger
+            logger=self.logger,
+            http_client=self.ap.http_client_mgr.get_client(scope=core_entities.LifecycleControlScope.PLATFORM),
         )
 
     async def reply_message(
@@ -50,9 +50,15 @@ def handler(
 
 def llm_func(
     name: str = None,
+    cache_ttl: float = 0,
+    cache_shared: bool = False,
 ) -> typing.Callable:
     """注册内容函数
 
+    结果仅取决于参数且没有副作用的函数（如查询汇率）可设置 cache_ttl（秒），
+    有效期内相同参数的调用直接返回缓存的结果，不再执行函数。
+    缓存默认按会话和发送者区分，结果与调用者无关时可设置 cache_shared=True 在所有会话间共享。
+
     使用示例：
 
     class MyPlugin(BasePlugin):
@@ -134,8 +134,16 @@ class PluginLoader(loader.PluginLoader):
     def llm_func(
         self,
         name: str = None,
+        cache_ttl: float = 0,
+        cache_shared: bool = False,
     ) -> typing.Callable:
-        """注册内容函数"""
+        """注册内容函数
+
+        Args:
+            name (str): 函数名，默认使用方法名
+            cache_ttl (float): 结果缓存有效期（秒），为 0 时不缓存
+            cache_shared (bool): 缓存的结果是否在所有会话和用户间共享，默认按会话和发送者分别缓存
+        """
         self.ap.logger.debug(f'注册内容函数 {name}')
 
         def wrapper(func: typing.Callable) -> typing.Callable:
@@ -153,6 +161,8 @@ class PluginLoader(loader.PluginLoader):
                 description=function_schema['description'],
                 parameters=function_schema['parameters'],
                 func=func,
+                cache_ttl=cache_ttl,
+                cache_shared=cache_shared,
             )
 
             self._current_container.tools.append(llm_function)
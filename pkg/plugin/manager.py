@@ -24,6 +24,9 @@ class PluginManager:
 
     plugin_containers: list[context.RuntimeContainer]
 
+    tools_version: int
+    """插件版本号，插件加载、启停或调整优先级后递增，工具管理器据此重建工具索引"""
+
     def plugins(
         self,
         enabled: bool = None,
@@ -60,6 +63,7 @@ class PluginManager:
         self.installer = github.GitHubRepoInstaller(ap)
         self.api_host = context.APIHost(ap)
         self.plugin_containers = []
+        self.tools_version = 0
 
     async def initialize(self):
         for loader in self.loaders:
@@ -82,6 +86,7 @@ class PluginManager:
         self.plugin_containers.sort(key=lambda x: x.priority, reverse=False)
 
         self.ap.logger.debug(f'优先级排序后的插件列表 {self.plugin_containers}')
+        self.tools_version += 1
 
     async def load_plugin_settings(self, plugin_containers: list[context.RuntimeContainer]):
         for plugin_container in plugin_containers:
@@ -132,6 +137,7 @@ class PluginManager:
         plugin.plugin_inst.host = self.api_host
         await plugin.plugin_inst.initialize()
         plugin.status = context.RuntimeContainerStatus.INITIALIZED
+        self.tools_version += 1
 
     async def initialize_plugins(self):
         for plugin in self.plugins():
@@ -154,6 +160,7 @@ class PluginManager:
         await plugin.plugin_inst.destroy()
         plugin.plugin_inst = None
         plugin.status = context.RuntimeContainerStatus.MOUNTED
+        self.tools_version += 1
 
     async def destroy_plugins(self):
         for plugin in self.plugins():
@@ -276,6 +283,7 @@ class PluginManager:
                         await self.destroy_plugin(plugin)
 
                     plugin.enabled = new_status
+                    self.tools_version += 1
 
                     await self.dump_plugin_container_setting(plugin)
 
@@ -296,6 +304,7 @@ class PluginManager:
                     break
 
         self.plugin_containers.sort(key=lambda x: x.priority, reverse=False)
+        self.tools_version += 1
 
         for plugin in self.plugin_containers:
             await self.dump_plugin_container_setting(plugin)
@@ -78,6 +78,9 @@ class Message(pydantic.BaseModel):
 
     tool_call_id: typing.Optional[str] = None
 
+    _token_counts: dict[str, int] = pydantic.PrivateAttr(default_factory=dict)
+    """分词器名称 -> 此消息的 token 数，消息加入会话后内容不再修改，计算一次即可"""
+
     def readable_str(self) -> str:
         if self.content is not None:
             return str(self.role) + ': ' + str(self.get_content_platform_message_chain())
@@ -125,6 +128,13 @@ class Message(pydantic.BaseModel):
             return platform_message.MessageChain(mc)
 
 
+class MessageChunk(pydantic.BaseModel):
+    """流式响应中的一段增量文本"""
+
+    content: str
+    """本段新增的文本"""
+
+
 class Prompt(pydantic.BaseModel):
     """供AI使用的Prompt"""
 
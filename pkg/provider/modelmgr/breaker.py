@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+import time
+import typing
+
+
+class CircuitBreaker:
+    """模型的熔断器
+
+    连续失败达到 failure-threshold 次后断开，cool-off 秒内跳过此模型；
+    之后放行一次试探调用，成功则恢复，失败则再次断开。
+    """
+
+    failure_threshold: int
+    """断开前允许的连续失败次数，为 0 时不熔断"""
+
+    cool_off: float
+    """断开后跳过此模型的时长（秒）"""
+
+    consecutive_failures: int
+
+    opened_until: float
+    """断开至此时间戳，为 0 时未断开"""
+
+    probe_started_at: float
+    """试探调用的开始时间，试探调用未返回时不再放行其他调用"""
+
+    open_count: int
+    """断开的次数"""
+
+    def __init__(self, config: dict[str, typing.Any]):
+        self.failure_threshold = config.get('failure-threshold', 5)
+        self.cool_off = config.get('cool-off', 60)
+        self.consecutive_failures = 0
+        self.opened_until = 0
+        self.probe_started_at = 0
+        self.open_count = 0
+
+    def allow(self) -> bool:
+        """是否可以调用此模型，断开期满后的试探调用也由此放行"""
+        if not self.opened_until:
+            return True
+
+        now = time.time()
+        if now < self.opened_until:
+            return False
+
+        # 试探调用被取消时不会有结果，超过 cool_off 后允许再次试探
+        if self.probe_started_at and now - self.probe_started_at < self.cool_off:
+            return False
+
+        self.probe_started_at = now
+        return True
+
+    def record_success(self):
+        self.consecutive_failures = 0
+        self.opened_until = 0
+        self.probe_started_at = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        self.probe_started_at = 0
+
+        if self.failure_threshold and (self.opened_until or self.consecutive_failures >= self.failure_threshold):
+            self.opened_until = time.time() + self.cool_off
+            self.open_count += 1
+
+    def get_stats(self) -> dict:
+        now = time.time()
+
+        if not self.opened_until:
+            state = 'closed'
+        elif now < self.opened_until:
+            state = 'open'
+        else:
+            state = 'half-open'
+
+        return {
+            'state': state,
+            'consecutive_failures': self.consecutive_failures,
+            'open_count': self.open_count,
+        }
@@ -0,0 +1,268 @@
+from __future__ import annotations
+
+import abc
+import collections
+import os
+import time
+import typing
+
+import aiosqlite
+
+from ...core import app
+from .. import entities as llm_entities
+
+
+preregistered_cache_backends: list[typing.Type[ResponseCacheBackend]] = []
+
+
+def cache_backend_class(name: str):
+    def decorator(cls: typing.Type[ResponseCacheBackend]) -> typing.Type[ResponseCacheBackend]:
+        cls.name = name
+        preregistered_cache_backends.append(cls)
+        return cls
+
+    return decorator
+
+
+class ResponseCacheBackend(metaclass=abc.ABCMeta):
+    """模型回复缓存的存储后端
+
+    条目数超过上限时淘汰最久未使用的条目，过期的条目视为不存在。
+    """
+
+    name: str = None
+
+    max_entries: int
+    """最大条目数，为 0 时不限制"""
+
+    def __init__(self, config: dict[str, typing.Any]):
+        self.max_entries = config.get('max-entries', 1000)
+
+    async def initialize(self):
+        pass
+
+    @abc.abstractmethod
+    async def get(self, key: str) -> str | None:
+        """获取未过期的缓存值"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def set(self, key: str, value: str, expires_at: float | None):
+        """写入缓存值
+
+        Args:
+            expires_at (float | None): 过期时间戳，为 None 时不过期
+        """
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def size(self) -> int:
+        """当前条目数"""
+        raise NotImplementedError
+
+    @abc.abstractmethod
+    async def clear(self):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+
+@cache_backend_class('memory')
+class MemoryCacheBackend(ResponseCacheBackend):
+    """进程内存中的缓存，重启后清空"""
+
+    entries: collections.OrderedDict[str, tuple[str, float | None]]
+    """key -> (缓存值, 过期时间)，按最近使用的顺序排列"""
+
+    def __init__(self, config: dict[str, typing.Any]):
+        super().__init__(config)
+        self.entries = collections.OrderedDict()
+
+    async def get(self, key: str) -> str | None:
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+
+        value, expires_at = entry
+        if expires_at is not None and expires_at <= time.time():
+            del self.entries[key]
+            return None
+
+        self.entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: str, expires_at: float | None):
+        self.entries[key] = (value, expires_at)
+        self.entries.move_to_end(key)
+
+        while self.max_entries and len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    async def size(self) -> int:
+        return len(self.entries)
+
+    async def clear(self):
+        self.entries.clear()
+
+
+@cache_backend_class('sqlite')
+class SQLiteCacheBackend(ResponseCacheBackend):
+    """SQLite 文件中的缓存，重启后保留"""
+
+    path: str
+
+    conn: aiosqlite.Connection | None
+
+    def __init__(self, config: dict[str, typing.Any]):
+        super().__init__(config)
+        self.path = config.get('sqlite-path', 'data/llm_cache.db')
+        self.conn = None
+
+    async def initialize(self):
+        if os.path.dirname(self.path):
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+
+        self.conn = await aiosqlite.connect(self.path)
+        await self.conn.execute(
+            'CREATE TABLE IF NOT EXISTS llm_response_cache '
+            '(key TEXT PRIMARY KEY, value TEXT NOT NULL, expires_at REAL, accessed_at REAL NOT NULL)'
+        )
+        await self.conn.execute(
+            'CREATE INDEX IF NOT EXISTS llm_response_cache_accessed_at ON llm_response_cache (accessed_at)'
+        )
+        await self.conn.execute('DELETE FROM llm_response_cache WHERE expires_at <= ?', (time.time(),))
+        await self.conn.commit()
+
+    async def get(self, key: str) -> str | None:
+        now = time.time()
+
+        async with self.conn.execute(
+            'SELECT value, expires_at FROM llm_response_cache WHERE key = ?',
+            (key,),
+        ) as cursor:
+            row = await cursor.fetchone()
+
+        if row is None:
+            return None
+
+        value, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            await self.conn.execute('DELETE FROM llm_response_cache WHERE key = ?', (key,))
+            await self.conn.commit()
+            return None
+
+        await self.conn.execute('UPDATE llm_response_cache SET accessed_at = ? WHERE key = ?', (now, key))
+        await self.conn.commit()
+        return value
+
+    async def set(self, key: str, value: str, expires_at: float | None):
+        now = time.time()
+
+        await self.conn.execute(
+            'INSERT OR REPLACE INTO llm_response_cache (key, value, expires_at, accessed_at) VALUES (?, ?, ?, ?)',
+            (key, value, expires_at, now),
+        )
+        await self.conn.execute('DELETE FROM llm_response_cache WHERE expires_at <= ?', (now,))
+
+        if self.max_entries:
+            await self.conn.execute(
+                'DELETE FROM llm_response_cache WHERE key IN '
+                '(SELECT key FROM llm_response_cache ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+                (self.max_entries,),
+            )
+
+        await self.conn.commit()
+
+    async def size(self) -> int:
+        async with self.conn.execute('SELECT COUNT(*) FROM llm_response_cache') as cursor:
+            row = await cursor.fetchone()
+        return row[0]
+
+    async def clear(self):
+        await self.conn.execute('DELETE FROM llm_response_cache')
+        await self.conn.commit()
+
+    async def close(self):
+        if self.conn is not None:
+            await self.conn.close()
+            self.conn = None
+
+
+class ResponseCache:
+    """模型回复缓存
+
+    对完全相同的请求（模型、请求消息、工具和额外参数均相同）直接返回此前的回复，不再调用模型。
+    包含工具调用的回复不缓存。是否使用由流水线配置决定。
+    """
+
+    ap: app.Application
+
+    backend: ResponseCacheBackend
+
+    ttl: float
+    """缓存有效期（秒），为 0 时不过期"""
+
+    hit_count: int
+
+    miss_count: int
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        self.ttl = 0
+        self.hit_count = 0
+        self.miss_count = 0
+
+    async def initialize(self):
+        cache_cfg = self.ap.instance_config.data.get('llm-cache', {})
+
+        backend_name = cache_cfg.get('backend', MemoryCacheBackend.name)
+
+        for backend_cls in preregistered_cache_backends:
+            if backend_cls.name == backend_name:
+                break
+        else:
+            raise ValueError(f'未知的模型回复缓存后端: {backend_name}')
+
+        self.backend = backend_cls(cache_cfg)
+        await self.backend.initialize()
+
+        self.ttl = cache_cfg.get('ttl', 3600)
+
+    async def get(self, key: str) -> llm_entities.Message | None:
+        """获取缓存的回复，缓存出错时视为未命中"""
+        try:
+            value = await self.backend.get(key)
+        except Exception as e:
+            self.ap.logger.warning(f'Failed to read LLM response cache: {e}')
+            value = None
+
+        if value is None:
+            self.miss_count += 1
+            return None
+
+        self.hit_count += 1
+        return llm_entities.Message.parse_raw(value)
+
+    async def set(self, key: str, message: llm_entities.Message):
+        """缓存回复，包含工具调用的回复不缓存"""
+        if message.tool_calls:
+            return
+
+        expires_at = time.time() + self.ttl if self.ttl > 0 else None
+
+        try:
+            await self.backend.set(key, message.json(exclude_none=True), expires_at)
+        except Exception as e:
+            self.ap.logger.warning(f'Failed to write LLM response cache: {e}')
+
+    async def get_stats(self) -> dict:
+        return {
+            'backend': self.backend.name,
+            'size': await self.backend.size(),
+            'hit_count': self.hit_count,
+            'miss_count': self.miss_count,
+        }
+
+    async def close(self):
+        await self.backend.close()
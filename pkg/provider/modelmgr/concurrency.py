@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import contextlib
+import time
+import typing
+
+
+class Slot:
+    """一次请求占用的并发名额"""
+
+    started_at: float
+
+    saturated: bool
+    """取得名额时并发数是否已达上限，只有上限被用满时成功的请求才会提高上限"""
+
+    overloaded: bool
+    """请求是否因超时、5xx 或 429 失败"""
+
+    first_token_at: float | None
+    """流式调用收到首段回复文本的时间"""
+
+    output_tokens: int | None
+    """提供商返回的输出 token 数，未返回用量时为 None"""
+
+    def __init__(self, started_at: float, saturated: bool):
+        self.started_at = started_at
+        self.saturated = saturated
+        self.overloaded = False
+        self.first_token_at = None
+        self.output_tokens = None
+
+    def get_latency_sample(self, now: float) -> tuple[str, float] | None:
+        """用于检测延迟突增的指标：流式调用取首 token 延迟，否则取每个输出 token 的平均耗时
+
+        总耗时随回复长度变化，不能反映端点是否过载；两者都无法取得时返回 None
+        """
+        if self.first_token_at is not None:
+            return 'ttft', self.first_token_at - self.started_at
+        if self.output_tokens:
+            return 'per_token', (now - self.started_at) / self.output_tokens
+        return None
+
+
+class AdaptiveConcurrencyLimiter:
+    """模型端点的自适应并发上限（AIMD）
+
+    请求成功且延迟正常时上限每轮增加 1（每次成功增加 1/上限），
+    请求超时、返回 5xx 或 429、延迟超过平均值的若干倍时上限乘以 decrease-factor。
+    延迟按首 token 延迟（流式调用）或每个输出 token 的耗时（非流式调用）分别统计，不使用随回复长度变化的总耗时。
+    同一批并发请求的多次失败只降低一次上限。超出上限的请求按先后顺序排队。
+    """
+
+    enabled: bool
+
+    limit: float
+    """当前的并发上限"""
+
+    min_limit: int
+
+    max_limit: int
+
+    decrease_factor: float
+
+    latency_spike_ratio: float
+    """延迟超过平均值的此倍数时视为过载，为 0 时不检测"""
+
+    in_flight: int
+
+    waiters: collections.deque[asyncio.Future]
+
+    latency_avg: dict[str, float]
+    """成功请求各项延迟指标的指数加权平均值（秒），键为 ttft 或 per_token"""
+
+    latency_samples: dict[str, int]
+
+    decrease_count: int
+
+    last_decrease_at: float
+    """上次降低上限的时间，在此之前开始的请求失败不再降低上限"""
+
+    def __init__(self, config: dict[str, typing.Any]):
+        self.enabled = config.get('enable', False)
+        self.min_limit = max(1, config.get('min-limit', 1))
+        self.max_limit = max(self.min_limit, config.get('max-limit', 100))
+        self.limit = float(min(max(config.get('initial-limit', 20), self.min_limit), self.max_limit))
+        self.decrease_factor = config.get('decrease-factor', 0.5)
+        self.latency_spike_ratio = config.get('latency-spike-ratio', 3)
+        self.in_flight = 0
+        self.waiters = collections.deque()
+        self.latency_avg = {}
+        self.latency_samples = {}
+        self.decrease_count = 0
+        self.last_decrease_at = 0
+
+    def _wake(self):
+        while self.waiters and self.in_flight < int(self.limit):
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    async def _acquire(self):
+        if not self.waiters and self.in_flight < int(self.limit):
+            self.in_flight += 1
+            return
+
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+
+        try:
+            await waiter
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                # 已取得名额后被取消，归还名额
+                self.in_flight -= 1
+                self._wake()
+            else:
+                self.waiters.remove(waiter)
+            raise
+
+    def _release(self, slot: Slot):
+        now = time.monotonic()
+        overloaded = slot.overloaded
+        sample = slot.get_latency_sample(now)
+
+        if not overloaded and sample is not None:
+            kind, latency = sample
+            avg = self.latency_avg.get(kind)
+            samples = self.latency_samples.get(kind, 0)
+
+            if self.latency_spike_ratio and samples >= 10 and latency > avg * self.latency_spike_ratio:
+                overloaded = True
+
+            self.latency_avg[kind] = latency if avg is None else avg * 0.9 + latency * 0.1
+            self.latency_samples[kind] = samples + 1
+
+        if overloaded:
+            if slot.started_at >= self.last_decrease_at:
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self.last_decrease_at = now
+                self.decrease_count += 1
+        elif slot.saturated:
+            self.limit = min(self.max_limit, self.limit + 1 / self.limit)
+
+        self.in_flight -= 1
+        self._wake()
+
+    @contextlib.asynccontextmanager
+    async def slot(self, timeout: float | None = None) -> typing.AsyncIterator[Slot]:
+        """等待并占用一个并发名额，请求结束后根据结果调整上限
+
+        Args:
+            timeout (float | None): 排队等待的超时时间（秒），超时时抛出 asyncio.TimeoutError
+        """
+        if not self.enabled:
+            yield Slot(time.monotonic(), False)
+            return
+
+        await asyncio.wait_for(self._acquire(), timeout)
+
+        slot = Slot(time.monotonic(), self.in_flight >= int(self.limit))
+        try:
+            yield slot
+        finally:
+            self._release(slot)
+
+    def get_stats(self) -> dict:
+        return {
+            'enable': self.enabled,
+            'limit': int(self.limit),
+            'in_flight': self.in_flight,
+            'queued': sum(1 for waiter in self.waiters if not waiter.done()),
+            'ttft_avg': self.latency_avg.get('ttft'),
+            'per_token_latency_avg': self.latency_avg.get('per_token'),
+            'decrease_count': self.decrease_count,
+        }
@@ -6,7 +6,7 @@ import traceback
 from . import entities, requester
 from ...core import app
 from ...discover import engine
-from . import token
+from . import token, ratelimit, concurrency, breaker, retry
 from ...entity.persistence import model as persistence_model
 from ...entity.errors import provider as provider_errors
 
@@ -90,13 +90,64 @@ class ModelManager:
 
         await requester_inst.initialize()
 
+        key_pool_cfg = self.ap.instance_config.data.get('api-key-pool', {})
+
+        # 按模型 uuid 或模型名配置的 RPM/TPM 上限，未配置的模型使用 default
+        rate_limits = self.ap.instance_config.data.get('model-rate-limit', {})
+        rate_limit_cfg = (
+            rate_limits.get('models', {}).get(model_info.uuid)
+            or rate_limits.get('models', {}).get(model_info.name)
+            or rate_limits.get('default', {})
+        )
+
+        # 按模型 uuid 或模型名配置的上下文窗口，用于按 token 截断前文
+        context_windows = self.ap.instance_config.data.get('model-context-window', {})
+        context_window = (
+            context_windows.get('models', {}).get(model_info.uuid)
+            or context_windows.get('models', {}).get(model_info.name)
+            or context_windows.get('default', 0)
+        )
+
+        # 按模型 uuid 或模型名配置的重试策略，未配置的项使用 default
+        retry_cfgs = self.ap.instance_config.data.get('model-retry', {})
+        retry_cfg = {
+            **retry_cfgs.get('default', {}),
+            **(
+                retry_cfgs.get('models', {}).get(model_info.uuid)
+                or retry_cfgs.get('models', {}).get(model_info.name)
+                or {}
+            ),
+        }
+
+        # 自适应并发上限默认关闭，按模型 uuid 或模型名单独开启，未配置的项使用 default
+        concurrency_cfgs = self.ap.instance_config.data.get('model-concurrency', {})
+        concurrency_cfg = {
+            **concurrency_cfgs.get('default', {}),
+            **(
+                concurrency_cfgs.get('models', {}).get(model_info.uuid)
+                or concurrency_cfgs.get('models', {}).get(model_info.name)
+                or {}
+            ),
+        }
+
         runtime_llm_model = requester.RuntimeLLMModel(
             model_entity=model_info,
             token_mgr=token.TokenManager(
                 name=model_info.uuid,
                 tokens=model_info.api_keys,
+                strategy=key_pool_cfg.get('strategy', 'least-loaded'),
+                cooldown=key_pool_cfg.get('cooldown', 60),
+                quota_cooldown=key_pool_cfg.get('quota-cooldown', 600),
             ),
             requester=requester_inst,
+            rate_limiter=ratelimit.RateLimiter(
+                rpm=rate_limit_cfg.get('rpm', 0),
+                tpm=rate_limit_cfg.get('tpm', 0),
+            ),
+            concurrency_limiter=concurrency.AdaptiveConcurrencyLimiter(concurrency_cfg),
+            circuit_breaker=breaker.CircuitBreaker(self.ap.instance_config.data.get('model-circuit-breaker', {})),
+            retry_policy=retry.RetryPolicy(retry_cfg),
+            context_window=context_window,
         )
 
         return runtime_llm_model
@@ -0,0 +1,178 @@
+from __future__ import annotations
+
+import asyncio
+import collections
+import heapq
+import itertools
+import json
+import time
+import typing
+
+from .. import entities as llm_entities
+from ..tools import entities as tools_entities
+from ...utils import tokenizer as tokenizer_util
+
+
+WINDOW = 60
+"""统计请求数和 token 数的滑动窗口长度（秒）"""
+
+PRIORITY_INTERACTIVE = 0
+"""用户请求"""
+
+PRIORITY_BACKGROUND = 10
+"""对话压缩等后台任务，有用户请求排队时让出额度"""
+
+
+def estimate_tokens(
+    tokenizer: tokenizer_util.Tokenizer,
+    messages: list[llm_entities.Message],
+    funcs: list[tools_entities.LLMFunction] | None = None,
+    extra_args: dict[str, typing.Any] = {},
+) -> int:
+    """估计一次调用计入提供商 TPM 的 token 数：请求消息、工具定义及最大输出 token 数"""
+    tokens = sum(tokenizer.count_message(message) for message in messages)
+
+    for func in funcs or []:
+        tokens += tokenizer.count(func.name + func.description + json.dumps(func.parameters, ensure_ascii=False))
+
+    # 提供商按请求中的最大输出 token 数预扣额度
+    tokens += get_max_output_tokens(extra_args)
+
+    return tokens
+
+
+def get_max_output_tokens(extra_args: dict[str, typing.Any]) -> int:
+    """模型参数中设置的最大输出 token 数，未设置时为 0"""
+    max_output_tokens = extra_args.get('max_tokens') or extra_args.get('max_completion_tokens') or 0
+    return max_output_tokens if isinstance(max_output_tokens, int) else 0
+
+
+class RateLimiter:
+    """模型调用的 RPM/TPM 限制
+
+    在最近一分钟内的请求数或 token 数达到上限时，调用按优先级排队等待额度，而不是请求后被提供商以 429 拒绝。
+    优先级相同时先到先得，排在队首的调用得到额度前，后面的调用即使所需 token 更少也不会越过它。
+    """
+
+    rpm: int
+    """每分钟请求数上限，为 0 时不限制"""
+
+    tpm: int
+    """每分钟 token 数上限，为 0 时不限制"""
+
+    records: collections.deque[tuple[float, int]]
+    """窗口内已放行的调用 (时间, token 数)"""
+
+    window_tokens: int
+    """窗口内已放行的 token 数"""
+
+    queue: list[tuple[int, int, asyncio.Future, int]]
+    """等待额度的调用 (优先级, 序号, future, token 数)，按优先级和序号排列的堆"""
+
+    waited_count: int
+    """排队等待过的调用次数"""
+
+    def __init__(self, rpm: int = 0, tpm: int = 0):
+        self.rpm = rpm
+        self.tpm = tpm
+        self.records = collections.deque()
+        self.window_tokens = 0
+        self.queue = []
+        self.waited_count = 0
+        self._counter = itertools.count()
+        self._timer: asyncio.TimerHandle | None = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rpm > 0 or self.tpm > 0
+
+    def _expire(self, now: float):
+        while self.records and self.records[0][0] <= now - WINDOW:
+            _, tokens = self.records.popleft()
+            self.window_tokens -= tokens
+
+    def _fits(self, tokens: int) -> bool:
+        if self.rpm and len(self.records) >= self.rpm:
+            return False
+
+        # 单次所需超过上限时，只要窗口为空就放行，避免永远等待
+        if self.tpm and self.records and self.window_tokens + tokens > self.tpm:
+            return False
+
+        return True
+
+    def _grant(self, tokens: int, now: float):
+        self.records.append((now, tokens))
+        self.window_tokens += tokens
+
+    def _dispatch(self):
+        """按顺序放行队首能得到额度的调用，队首无法放行时在最早的记录过期后再次检查"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        now = time.time()
+        self._expire(now)
+
+        while self.queue:
+            _, _, future, tokens = self.queue[0]
+
+            if future.done():
+                # 已取消
+                heapq.heappop(self.queue)
+                continue
+
+            if not self._fits(tokens):
+                break
+
+            heapq.heappop(self.queue)
+            self._grant(tokens, now)
+            future.set_result(None)
+
+        if self.queue and self.records:
+            delay = self.records[0][0] + WINDOW - now
+            self._timer = asyncio.get_running_loop().call_later(max(delay, 0), self._dispatch)
+
+    async def acquire(self, tokens: int, priority: int = PRIORITY_INTERACTIVE):
+        """等待一次调用的额度
+
+        Args:
+            tokens (int): 此次调用预计的 token 数
+            priority (int): 优先级，数值越小越优先
+        """
+        if not self.enabled:
+            return
+
+        now = time.time()
+        self._expire(now)
+
+        if not self.queue and self._fits(tokens):
+            self._grant(tokens, now)
+            return
+
+        self.waited_count += 1
+
+        future = asyncio.get_running_loop().create_future()
+        heapq.heappush(self.queue, (priority, next(self._counter), future, tokens))
+
+        # 优先级更高的调用可能排到队首，立即检查一次
+        self._dispatch()
+
+        try:
+            await future
+        finally:
+            if future.cancelled():
+                # 队首被取消时后面的调用可能已经可以放行
+                self._dispatch()
+
+    def get_stats(self) -> dict:
+        self._expire(time.time())
+
+        return {
+            'rpm': self.rpm,
+            'tpm': self.tpm,
+            'window_requests': len(self.records),
+            'window_tokens': self.window_tokens,
+            'queued': sum(1 for _, _, future, _ in self.queue if not future.done()),
+            'waited_count': self.waited_count,
+        }
@@ -1,14 +1,151 @@
 from __future__ import annotations
 
 import abc
+import asyncio
+import contextlib
+import contextvars
+import hashlib
+import json
+import time
 import typing
 
+import httpx
+
 from ...core import app
 from ...core import entities as core_entities
 from .. import entities as llm_entities
 from ..tools import entities as tools_entities
 from ...entity.persistence import model as persistence_model
-from . import token
+from . import token, ratelimit, concurrency, breaker, retry
+from ...utils import histogram, singleflight
+
+
+_delta_sink: contextvars.ContextVar[typing.Callable[[str], None] | None] = contextvars.ContextVar(
+    'llm_delta_sink', default=None
+)
+"""当前流式调用接收增量文本的回调，由 invoke_llm_stream 在执行调用的任务中设置"""
+
+_api_key: contextvars.ContextVar[str | None] = contextvars.ContextVar('llm_api_key', default=None)
+"""当前调用使用的 api key，由 LLMAPIRequester.request_slot 设置"""
+
+_slot: contextvars.ContextVar[concurrency.Slot | None] = contextvars.ContextVar('llm_slot', default=None)
+"""当前调用占用的并发名额，由 LLMAPIRequester.request_slot 设置，用于记录首 token 时间和输出 token 数"""
+
+T = typing.TypeVar('T')
+
+
+def make_request_key(
+    model: RuntimeLLMModel,
+    messages: list[llm_entities.Message],
+    funcs: list[tools_entities.LLMFunction] | None,
+    extra_args: dict[str, typing.Any],
+) -> str:
+    """根据请求内容生成唯一标识，内容相同的请求标识相同，用于缓存和合并请求"""
+    normalized_messages = []
+    for message in messages:
+        normalized = message.dict(exclude_none=True)
+        if isinstance(normalized.get('content'), str):
+            normalized['content'] = normalized['content'].strip()
+        normalized_messages.append(normalized)
+
+    request = {
+        'model': model.model_entity.uuid,
+        'messages': normalized_messages,
+        'funcs': [
+            {'name': func.name, 'description': func.description, 'parameters': func.parameters}
+            for func in sorted(funcs or [], key=lambda f: f.name)
+        ],
+        'extra_args': extra_args,
+    }
+
+    serialized = json.dumps(request, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(serialized.encode('utf-8')).hexdigest()
+
+
+def _is_timeout(e: Exception) -> bool:
+    # openai 和 anthropic 的 APITimeoutError 不是 httpx 异常的子类
+    return isinstance(e, (TimeoutError, httpx.TimeoutException)) or type(e).__name__ == 'APITimeoutError'
+
+
+def _is_retryable(e: Exception) -> bool:
+    """请求超时、连接失败或返回可重试的状态码"""
+    # openai 和 anthropic 的 APIConnectionError 同样不是 httpx 异常的子类
+    if _is_timeout(e) or isinstance(e, httpx.TransportError) or type(e).__name__ == 'APIConnectionError':
+        return True
+
+    status_code = getattr(e, 'status_code', None)
+    if not isinstance(status_code, int):
+        return False
+
+    # key 无效或额度不足时只在 key 池中还有其他可用的 key 时重试，见 request_with_retry
+    return (
+        status_code in retry.RETRYABLE_STATUS_CODES
+        or status_code in token.QUOTA_ERROR_STATUS_CODES
+        or status_code >= 500
+    )
+
+
+def is_provider_error(e: BaseException) -> bool:
+    """错误是否来自模型提供商：接口返回的错误、连接失败或接口请求超时
+
+    到达处理截止时间、等待并发名额超时等本地超时不算。请求器会将原始错误包装为 RequesterError，因此沿异常链查找。
+    """
+    while e is not None:
+        if isinstance(e, (TimeoutError, asyncio.TimeoutError)):
+            return False
+
+        if getattr(e, 'status_code', None) is not None or _is_retryable(e):
+            return True
+
+        e = e.__cause__ or e.__context__
+
+    return False
+
+
+class TokenUsage:
+    """模型调用的 token 用量统计，数量均为提供商返回的值，未返回用量的调用不计入"""
+
+    request_count: int
+    """返回了用量的调用次数"""
+
+    input_tokens: int
+    """输入 token 数，包含命中和写入提示词缓存的部分"""
+
+    output_tokens: int
+
+    cached_tokens: int
+    """命中提示词缓存的输入 token 数"""
+
+    cache_write_tokens: int
+    """写入提示词缓存的输入 token 数，仅 Anthropic 等需要显式写入缓存的提供商返回"""
+
+    def __init__(self):
+        self.request_count = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cached_tokens = 0
+        self.cache_write_tokens = 0
+
+    def record(self, input_tokens: int, output_tokens: int, cached_tokens: int = 0, cache_write_tokens: int = 0):
+        slot = _slot.get()
+        if slot is not None:
+            slot.output_tokens = output_tokens
+
+        self.request_count += 1
+        self.input_tokens += input_tokens
+        self.output_tokens += output_tokens
+        self.cached_tokens += cached_tokens
+        self.cache_write_tokens += cache_write_tokens
+
+    def to_dict(self) -> dict:
+        return {
+            'request_count': self.request_count,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cached_tokens': self.cached_tokens,
+            'cache_write_tokens': self.cache_write_tokens,
+            'cache_hit_rate': self.cached_tokens / self.input_tokens if self.input_tokens else 0.0,
+        }
 
 
 class RuntimeLLMModel:
@@ -23,15 +160,52 @@ class RuntimeLLMModel:
     requester: LLMAPIRequester
     """请求器实例"""
 
+    ttft: histogram.LatencyHistogram
+    """从发起调用到收到首段回复文本的耗时分布，非流式调用即为整个调用的耗时"""
+
+    inflight: singleflight.SingleFlight
+    """执行中的调用，相同请求的并发调用共用一次调用"""
+
+    usage: TokenUsage
+    """token 用量"""
+
+    rate_limiter: ratelimit.RateLimiter
+    """调用前等待 RPM/TPM 额度"""
+
+    concurrency: concurrency.AdaptiveConcurrencyLimiter
+    """模型端点的自适应并发上限"""
+
+    breaker: breaker.CircuitBreaker
+    """连续失败后暂时跳过此模型，改用流水线配置的备用模型"""
+
+    retry_policy: retry.RetryPolicy
+    """请求失败时的重试策略"""
+
+    context_window: int
+    """模型的上下文窗口（token），0 表示未配置"""
+
     def __init__(
         self,
         model_entity: persistence_model.LLMModel,
         token_mgr: token.TokenManager,
         requester: LLMAPIRequester,
+        rate_limiter: ratelimit.RateLimiter | None = None,
+        concurrency_limiter: concurrency.AdaptiveConcurrencyLimiter | None = None,
+        circuit_breaker: breaker.CircuitBreaker | None = None,
+        retry_policy: retry.RetryPolicy | None = None,
+        context_window: int = 0,
     ):
         self.model_entity = model_entity
         self.token_mgr = token_mgr
         self.requester = requester
+        self.rate_limiter = rate_limiter or ratelimit.RateLimiter()
+        self.concurrency = concurrency_limiter or concurrency.AdaptiveConcurrencyLimiter({'enable': False})
+        self.breaker = circuit_breaker or breaker.CircuitBreaker({'failure-threshold': 0})
+        self.retry_policy = retry_policy or retry.RetryPolicy({'max-attempts': 1})
+        self.context_window = context_window
+        self.ttft = histogram.LatencyHistogram()
+        self.inflight = singleflight.SingleFlight()
+        self.usage = TokenUsage()
 
 
 class LLMAPIRequester(metaclass=abc.ABCMeta):
@@ -53,6 +227,125 @@ class LLMAPIRequester(metaclass=abc.ABCMeta):
     async def initialize(self):
         pass
 
+    def get_remaining_time(self, query: core_entities.Query | None) -> float | None:
+        """请求距处理截止时间的剩余秒数，用作此次调用的超时时间，未设置截止时间时返回 None"""
+        if query is None:
+            return None
+        return query.get_remaining_time()
+
+    def is_streaming(self) -> bool:
+        """当前调用是否为流式调用，支持流式输出的请求器据此决定是否以流式请求接口"""
+        return _delta_sink.get() is not None
+
+    @contextlib.asynccontextmanager
+    async def request_slot(
+        self,
+        query: core_entities.Query | None,
+        model: RuntimeLLMModel,
+    ) -> typing.AsyncIterator[str]:
+        """包裹一次接口请求：等待模型端点的并发名额，并从 api key 池中取出一个 key，期间可通过 get_api_key 获取
+
+        请求超时、返回 5xx 或 429 时降低并发上限；接口返回错误时记录到所用的 key 上，被限流或额度不足的 key 会暂停使用一段时间。
+        """
+        async with model.concurrency.slot(self.get_remaining_time(query)) as slot:
+            with model.token_mgr.acquire() as api_key:
+                reset_token = _api_key.set(api_key)
+                reset_slot = _slot.set(slot)
+                try:
+                    yield api_key
+                except Exception as e:
+                    # openai、anthropic 和 ollama 的接口错误均带有 status_code
+                    status_code = getattr(e, 'status_code', None)
+                    if status_code is not None:
+                        response = getattr(e, 'response', None)
+                        model.token_mgr.report_error(
+                            api_key,
+                            status_code,
+                            retry_after=token.parse_retry_after(getattr(response, 'headers', None)),
+                            error_code=getattr(e, 'code', None),
+                        )
+
+                    if _is_timeout(e) or (status_code is not None and (status_code == 429 or status_code >= 500)):
+                        slot.overloaded = True
+                    raise
+                finally:
+                    _api_key.reset(reset_token)
+                    _slot.reset(reset_slot)
+
+    async def request_with_retry(
+        self,
+        query: core_entities.Query | None,
+        model: RuntimeLLMModel,
+        request: typing.Callable[[], typing.Awaitable[T]],
+    ) -> T:
+        """在 request_slot 中发送请求，失败时按模型的重试策略重试，超过处理截止时间时抛出 asyncio.TimeoutError
+
+        被限流或额度不足时，所用的 key 已暂停使用，重试会换用其他 key；所有 key 都暂停使用时需等待最早恢复的 key。
+        流式调用已产出回复文本后不再重试。
+        """
+        policy = model.retry_policy
+        policy.record_call()
+
+        emitted = False
+        sink = _delta_sink.get()
+        if sink is not None:
+
+            def tracking_sink(content: str):
+                nonlocal emitted
+                emitted = True
+                sink(content)
+
+            _delta_sink.set(tracking_sink)
+
+        attempt = 0
+
+        try:
+            while True:
+                attempt += 1
+                try:
+                    async with self.request_slot(query, model):
+                        return await asyncio.wait_for(request(), self.get_remaining_time(query))
+                except Exception as e:
+                    if emitted or not _is_retryable(e):
+                        raise
+
+                    status_code = getattr(e, 'status_code', None)
+                    retry_after = token.parse_retry_after(getattr(getattr(e, 'response', None), 'headers', None))
+
+                    if status_code == 429 or status_code in token.QUOTA_ERROR_STATUS_CODES:
+                        if model.token_mgr.get_cooldown_remaining() == 0:
+                            # 还有其他可用的 key，换用其他 key 重试
+                            retry_after = None
+                        elif status_code != 429 or getattr(e, 'code', None) in token.QUOTA_ERROR_CODES:
+                            # 没有其他可用的 key 时，key 无效或额度不足短时间内不会恢复
+                            raise
+
+                    delay = policy.get_retry_delay(attempt, retry_after, self.get_remaining_time(query))
+                    if delay is None:
+                        raise
+
+                    self.ap.logger.warning(
+                        f'Request to model {model.model_entity.name} failed ({type(e).__name__}: {e}), '
+                        f'retrying in {delay:.2f}s (attempt {attempt + 1}/{policy.max_attempts})'
+                    )
+                    await asyncio.sleep(delay)
+        finally:
+            if sink is not None:
+                _delta_sink.set(sink)
+
+    def get_api_key(self) -> str:
+        """当前调用使用的 api key"""
+        return _api_key.get() or ''
+
+    def emit_delta(self, content: str):
+        """流式调用中产出一段增量文本，非流式调用时忽略"""
+        sink = _delta_sink.get()
+        if sink is not None and content:
+            slot = _slot.get()
+            if slot is not None and slot.first_token_at is None:
+                slot.first_token_at = time.monotonic()
+            sink(content)
+
     @abc.abstractmethod
     async def invoke_llm(
         self,
@@ -74,3 +367,37 @@ class LLMAPIRequester(metaclass=abc.ABCMeta):
             llm_entities.Message: 返回消息对象
         """
         pass
+
+    async def invoke_llm_stream(
+        self,
+        query: core_entities.Query,
+        model: RuntimeLLMModel,
+        messages: typing.List[llm_entities.Message],
+        funcs: typing.List[tools_entities.LLMFunction] = None,
+        extra_args: dict[str, typing.Any] = {},
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+        """流式调用API
+
+        依次产出增量文本（MessageChunk），最后产出与 invoke_llm 相同的完整消息对象。
+        请求器在 invoke_llm 中通过 emit_delta 产出增量文本，未实现流式输出的请求器只产出完整消息。
+        """
+        chunks: asyncio.Queue[llm_entities.MessageChunk | None] = asyncio.Queue()
+
+        async def invoke() -> llm_entities.Message:
+            # 在单独的任务中设置，只影响此次调用
+            _delta_sink.set(lambda content: chunks.put_nowait(llm_entities.MessageChunk(content=content)))
+            try:
+                return await self.invoke_llm(query, model, messages, funcs, extra_args)
+            finally:
+                chunks.put_nowait(None)
+
+        task = asyncio.create_task(invoke())
+
+        try:
+            while (chunk := await chunks.get()) is not None:
+                yield chunk
+
+            yield await task
+        finally:
+            if not task.done():
+                task.cancel()
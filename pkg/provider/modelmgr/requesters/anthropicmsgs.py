@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import asyncio
 import typing
 import json
 import platform
@@ -15,10 +16,20 @@ from ...tools import entities as tools_entities
 from ....utils import image
 
 
+PROMPT_CACHE_TARGETS = ('system', 'tools', 'history')
+"""可设置提示词缓存断点的位置：系统提示词、工具列表、对话历史"""
+
+CACHE_CONTROL = {'type': 'ephemeral'}
+
+
 class AnthropicMessages(requester.LLMAPIRequester):
     """Anthropic Messages API 请求器"""
 
     client: anthropic.AsyncAnthropic
+    """不含 api key 的客户端，各 key 的客户端由此复制，共用连接池"""
+
+    clients: dict[str, anthropic.AsyncAnthropic]
+    """api key -> 客户端"""
 
     default_config: dict[str, typing.Any] = {
         'base_url': 'https://api.anthropic.com/v1',
@@ -41,9 +52,74 @@ class AnthropicMessages(requester.LLMAPIRequester):
             trust_env=True,
         )
 
+        self.clients = {}
         self.client = anthropic.AsyncAnthropic(
             api_key='',
             http_client=httpx_client,
+            # 由 request_with_retry 按模型的重试策略重试
+            max_retries=0,
+        )
+
+    def _get_client(self) -> anthropic.AsyncAnthropic:
+        """获取使用此次调用的 api key 的客户端"""
+        api_key = self.get_api_key()
+
+        client = self.clients.get(api_key)
+        if client is None:
+            client = self.client.with_options(api_key=api_key)
+            self.clients[api_key] = client
+
+        return client
+
+    async def _create_message(self, model: requester.RuntimeLLMModel, args: dict) -> anthropic.types.message.Message:
+        """发送请求并记录用量，流式调用时逐段产出回复文本"""
+        if not self.is_streaming():
+            resp = await self._get_client().messages.create(**args)
+            self._record_usage(model, resp)
+            return resp
+
+        async with self._get_client().messages.stream(**args) as stream:
+            async for event in stream:
+                # 思考过程与非流式调用时一样包裹在 think 标签中
+                if event.type == 'content_block_start' and event.content_block.type == 'thinking':
+                    self.emit_delta('<think>')
+                elif event.type == 'thinking':
+                    self.emit_delta(event.thinking)
+                elif event.type == 'content_block_stop' and event.content_block.type == 'thinking':
+                    self.emit_delta('</think>\n')
+                elif event.type == 'text':
+                    self.emit_delta(event.text)
+
+            resp = await stream.get_final_message()
+            self._record_usage(model, resp)
+            return resp
+
+    def _get_prompt_cache_targets(self, policy: typing.Any) -> set[str]:
+        """解析模型额外参数中的 prompt_cache 提示词缓存策略
+
+        为 true 时在系统提示词、工具列表和对话历史的末尾均设置缓存断点，
+        也可以为 PROMPT_CACHE_TARGETS 中若干项组成的列表，未设置时不使用缓存。
+        """
+        if policy is True:
+            return set(PROMPT_CACHE_TARGETS)
+
+        if isinstance(policy, list):
+            return {target for target in policy if target in PROMPT_CACHE_TARGETS}
+
+        return set()
+
+    def _record_usage(self, model: requester.RuntimeLLMModel, resp: anthropic.types.message.Message):
+        usage = resp.usage
+
+        cached_tokens = usage.cache_read_input_tokens or 0
+        cache_write_tokens = usage.cache_creation_input_tokens or 0
+
+        model.usage.record(
+            # input_tokens 不包含读取和写入缓存的部分
+            input_tokens=usage.input_tokens + cached_tokens + cache_write_tokens,
+            output_tokens=usage.output_tokens,
+            cached_tokens=cached_tokens,
+            cache_write_tokens=cache_write_tokens,
         )
 
     async def invoke_llm(
@@ -54,27 +130,24 @@ class AnthropicMessages(requester.LLMAPIRequester):
         funcs: typing.List[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
     ) -> llm_entities.Message:
-        self.client.api_key = model.token_mgr.get_token()
-
         args = extra_args.copy()
         args['model'] = model.model_entity.name
 
-        # 处理消息
-
-        # system
-        system_role_message = None
+        cache_targets = self._get_prompt_cache_targets(args.pop('prompt_cache', None))
 
-        for i, m in enumerate(messages):
-            if m.role == 'system':
-                system_role_message = m
+        # 处理消息
 
-                break
+        # system，提示词之外还可能有对话压缩生成的摘要等 system 消息，合并后作为 system 参数
+        system_texts = [m.content for m in messages if m.role == 'system' and isinstance(m.content, str)]
+        messages = [m for m in messages if m.role != 'system']
 
-        if system_role_message:
-            messages.pop(i)
+        if system_texts:
+            system_content = '\n\n'.join(system_texts)
 
-        if isinstance(system_role_message, llm_entities.Message) and isinstance(system_role_message.content, str):
-            args['system'] = system_role_message.content
+            if 'system' in cache_targets:
+                args['system'] = [{'type': 'text', 'text': system_content, 'cache_control': CACHE_CONTROL}]
+            else:
+                args['system'] = system_content
 
         req_messages = []
 
@@ -131,24 +204,33 @@ class AnthropicMessages(requester.LLMAPIRequester):
 
             req_messages.append(msg_dict)
 
+        # 缓存到最后一条消息为止的全部内容，下一轮请求以此为前缀，可以命中缓存
+        if 'history' in cache_targets and req_messages and isinstance(req_messages[-1]['content'], list):
+            last_content = req_messages[-1]['content']
+            if last_content:
+                last_content[-1] = {**last_content[-1], 'cache_control': CACHE_CONTROL}
+
         args['messages'] = req_messages
 
         if funcs:
             tools = await self.ap.tool_mgr.generate_tools_for_anthropic(funcs)
 
             if tools:
+                if 'tools' in cache_targets:
+                    tools[-1] = {**tools[-1], 'cache_control': CACHE_CONTROL}
+
                 args['tools'] = tools
 
         try:
             # print(json.dumps(args, indent=4, ensure_ascii=False))
-            resp = await self.client.messages.create(**args)
+            resp = await self.request_with_retry(query, model, lambda: self._create_message(model, args))
 
             args = {
                 'content': '',
                 'role': resp.role,
             }
 
-            assert type(resp) is anthropic.types.message.Message
+            assert isinstance(resp, anthropic.types.message.Message)
 
             for block in resp.content:
                 if block.type == 'thinking':
@@ -167,6 +249,8 @@ class AnthropicMessages(requester.LLMAPIRequester):
                     args['tool_calls'].append(tool_call)
 
             return llm_entities.Message(**args)
+        except asyncio.TimeoutError:
+            raise errors.RequesterError('请求超时')
         except anthropic.AuthenticationError as e:
             raise errors.RequesterError(f'api-key 无效: {e.message}')
         except anthropic.BadRequestError as e:
@@ -17,6 +17,13 @@ class OpenAIChatCompletions(requester.LLMAPIRequester):
     """OpenAI ChatCompletion API 请求器"""
 
     client: openai.AsyncClient
+    """不含 api key 的客户端，各 key 的客户端由此复制，共用连接池"""
+
+    clients: dict[str, openai.AsyncClient]
+    """api key -> 客户端"""
+
+    stream_usage_supported: bool
+    """接口是否支持流式请求的 stream_options，不支持时无法在流式请求中获取用量"""
 
     default_config: dict[str, typing.Any] = {
         'base_url': 'https://api.openai.com/v1',
@@ -24,19 +31,150 @@ class OpenAIChatCompletions(requester.LLMAPIRequester):
     }
 
     async def initialize(self):
+        self.clients = {}
+        self.stream_usage_supported = True
         self.client = openai.AsyncClient(
             api_key='',
             base_url=self.requester_cfg['base_url'].replace(' ', ''),
             timeout=self.requester_cfg['timeout'],
+            # 由 request_with_retry 按模型的重试策略重试
+            max_retries=0,
             http_client=httpx.AsyncClient(trust_env=True, timeout=self.requester_cfg['timeout']),
         )
 
+    def _get_client(self) -> openai.AsyncClient:
+        """获取使用此次调用的 api key 的客户端"""
+        api_key = self.get_api_key()
+
+        client = self.clients.get(api_key)
+        if client is None:
+            client = self.client.with_options(api_key=api_key)
+            self.clients[api_key] = client
+
+        return client
+
     async def _req(
         self,
         args: dict,
         extra_body: dict = {},
     ) -> chat_completion.ChatCompletion:
-        return await self.client.chat.completions.create(**args, extra_body=extra_body)
+        if self.is_streaming():
+            return await self._req_stream(args, extra_body=extra_body)
+
+        return await self._get_client().chat.completions.create(**args, extra_body=extra_body)
+
+    async def _req_stream(
+        self,
+        args: dict,
+        extra_body: dict = {},
+    ) -> chat_completion.ChatCompletion:
+        """以流式请求接口，逐段产出回复文本，并将各段合并为与非流式请求相同的结果"""
+        client = self._get_client()
+
+        if self.stream_usage_supported:
+            try:
+                # 要求在最后一段中返回用量，与非流式请求一样计入用量统计
+                stream = await client.chat.completions.create(
+                    **args,
+                    stream=True,
+                    stream_options={'include_usage': True},
+                    extra_body=extra_body,
+                )
+            except openai.BadRequestError:
+                # 部分兼容接口不接受 stream_options，去掉后重试，成功则之后不再发送
+                stream = await client.chat.completions.create(**args, stream=True, extra_body=extra_body)
+                self.stream_usage_supported = False
+                self.ap.logger.info(
+                    f'{self.requester_cfg["base_url"]} rejected stream_options, streaming requests will not report usage'
+                )
+        else:
+            stream = await client.chat.completions.create(**args, stream=True, extra_body=extra_body)
+
+        completion = {'id': '', 'object': 'chat.completion', 'created': 0, 'model': args['model']}
+        finish_reason = None
+        content = None
+        reasoning_content = None
+        tool_calls: dict[int, dict] = {}
+
+        async for chunk in stream:
+            if chunk.id:
+                completion.update(id=chunk.id, created=chunk.created, model=chunk.model)
+
+            # 用量在最后一段中返回，该段的 choices 为空
+            if chunk.usage is not None:
+                completion['usage'] = chunk.usage.model_dump()
+
+            if not chunk.choices:
+                continue
+
+            choice = chunk.choices[0]
+            finish_reason = choice.finish_reason or finish_reason
+
+            if choice.delta is None:
+                continue
+
+            # deepseek 等推理模型的思考过程，与 _make_msg 一样包裹在 think 标签中输出
+            reasoning_delta = getattr(choice.delta, 'reasoning_content', None)
+            if reasoning_delta:
+                if reasoning_content is None:
+                    reasoning_content = ''
+                    self.emit_delta('<think>\n')
+                reasoning_content += reasoning_delta
+                self.emit_delta(reasoning_delta)
+
+            if choice.delta.content:
+                if content is None:
+                    content = ''
+                    if reasoning_content is not None:
+                        self.emit_delta('\n</think>\n')
+                content += choice.delta.content
+                self.emit_delta(choice.delta.content)
+
+            for tool_call_delta in choice.delta.tool_calls or []:
+                tool_call = tool_calls.setdefault(
+                    tool_call_delta.index,
+                    {'id': '', 'type': 'function', 'function': {'name': '', 'arguments': ''}},
+                )
+                if tool_call_delta.id:
+                    tool_call['id'] = tool_call_delta.id
+                if tool_call_delta.function is not None:
+                    tool_call['function']['name'] += tool_call_delta.function.name or ''
+                    tool_call['function']['arguments'] += tool_call_delta.function.arguments or ''
+
+        message = {'role': 'assistant', 'content': content}
+        if reasoning_content is not None:
+            message['content'] = content or ''
+            message['reasoning_content'] = reasoning_content
+        if tool_calls:
+            message['tool_calls'] = [tool_calls[index] for index in sorted(tool_calls)]
+
+        completion['choices'] = [{'index': 0, 'finish_reason': finish_reason or 'stop', 'message': message}]
+
+        return chat_completion.ChatCompletion.model_validate(completion)
+
+    def _record_usage(
+        self,
+        model: requester.RuntimeLLMModel,
+        chat_completion: chat_completion.ChatCompletion,
+    ):
+        """记录用量
+
+        兼容 OpenAI 接口的提供商会自动缓存与此前请求相同的提示词前缀，
+        命中缓存的 token 数在 prompt_tokens_details.cached_tokens 中返回，DeepSeek 则为 prompt_cache_hit_tokens。
+        """
+        usage = chat_completion.usage
+        if usage is None:
+            return
+
+        cached_tokens = getattr(usage, 'prompt_cache_hit_tokens', None)
+        if cached_tokens is None and usage.prompt_tokens_details is not None:
+            cached_tokens = usage.prompt_tokens_details.cached_tokens
+
+        model.usage.record(
+            input_tokens=usage.prompt_tokens or 0,
+            output_tokens=usage.completion_tokens or 0,
+            cached_tokens=cached_tokens or 0,
+        )
 
     async def _make_msg(
         self,
@@ -66,8 +204,6 @@ class OpenAIChatCompletions(requester.LLMAPIRequester):
         use_funcs: list[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
     ) -> llm_entities.Message:
-        self.client.api_key = use_model.token_mgr.get_token()
-
         args = {}
         args['model'] = use_model.model_entity.name
 
@@ -94,6 +230,8 @@ class OpenAIChatCompletions(requester.LLMAPIRequester):
         # 发送请求
         resp = await self._req(args, extra_body=extra_args)
 
+        self._record_usage(use_model, resp)
+
         # 处理请求结果
         message = await self._make_msg(resp)
 
@@ -119,12 +257,16 @@ class OpenAIChatCompletions(requester.LLMAPIRequester):
             req_messages.append(msg_dict)
 
         try:
-            return await self._closure(
-                query=query,
-                req_messages=req_messages,
-                use_model=model,
-                use_funcs=funcs,
-                extra_args=extra_args,
+            return await self.request_with_retry(
+                query,
+                model,
+                lambda: self._closure(
+                    query=query,
+                    req_messages=req_messages,
+                    use_model=model,
+                    use_funcs=funcs,
+                    extra_args=extra_args,
+                ),
             )
         except asyncio.TimeoutError:
             raise errors.RequesterError('请求超时')
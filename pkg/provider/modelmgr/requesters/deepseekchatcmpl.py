@@ -25,8 +25,6 @@ class DeepseekChatCompletions(chatcmpl.OpenAIChatCompletions):
         use_funcs: list[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
     ) -> llm_entities.Message:
-        self.client.api_key = use_model.token_mgr.get_token()
-
         args = {}
         args['model'] = use_model.model_entity.name
 
@@ -52,6 +50,8 @@ class DeepseekChatCompletions(chatcmpl.OpenAIChatCompletions):
         if resp is None:
             raise errors.RequesterError('接口返回为空，请确定模型提供商服务是否正常')
 
+        self._record_usage(use_model, resp)
+
         # 处理请求结果
         message = await self._make_msg(resp)
 
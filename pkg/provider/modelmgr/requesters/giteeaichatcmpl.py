@@ -26,8 +26,6 @@ class GiteeAIChatCompletions(chatcmpl.OpenAIChatCompletions):
         use_funcs: list[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
     ) -> llm_entities.Message:
-        self.client.api_key = use_model.token_mgr.get_token()
-
         args = {}
         args['model'] = use_model.model_entity.name
 
@@ -46,6 +44,8 @@ class GiteeAIChatCompletions(chatcmpl.OpenAIChatCompletions):
 
         resp = await self._req(args, extra_body=extra_args)
 
+        self._record_usage(use_model, resp)
+
         message = await self._make_msg(resp)
 
         return message
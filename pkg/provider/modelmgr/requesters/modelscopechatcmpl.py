@@ -18,6 +18,10 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
     """ModelScope ChatCompletion API 请求器"""
 
     client: openai.AsyncClient
+    """不含 api key 的客户端，各 key 的客户端由此复制，共用连接池"""
+
+    clients: dict[str, openai.AsyncClient]
+    """api key -> 客户端"""
 
     default_config: dict[str, typing.Any] = {
         'base_url': 'https://api-inference.modelscope.cn/v1',
@@ -25,13 +29,27 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
     }
 
     async def initialize(self):
+        self.clients = {}
         self.client = openai.AsyncClient(
             api_key='',
             base_url=self.requester_cfg['base_url'],
             timeout=self.requester_cfg['timeout'],
+            # 由 request_with_retry 按模型的重试策略重试
+            max_retries=0,
             http_client=httpx.AsyncClient(trust_env=True, timeout=self.requester_cfg['timeout']),
         )
 
+    def _get_client(self) -> openai.AsyncClient:
+        """获取使用此次调用的 api key 的客户端"""
+        api_key = self.get_api_key()
+
+        client = self.clients.get(api_key)
+        if client is None:
+            client = self.client.with_options(api_key=api_key)
+            self.clients[api_key] = client
+
+        return client
+
     async def _req(
         self,
         args: dict,
@@ -45,7 +63,7 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
 
         tool_calls = []
 
-        resp_gen: openai.AsyncStream = await self.client.chat.completions.create(**args, extra_body=extra_body)
+        resp_gen: openai.AsyncStream = await self._get_client().chat.completions.create(**args, extra_body=extra_body)
 
         async for chunk in resp_gen:
             # print(chunk)
@@ -54,6 +72,7 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
 
             if chunk.choices[0].delta.content is not None:
                 pending_content += chunk.choices[0].delta.content
+                self.emit_delta(chunk.choices[0].delta.content)
 
             if chunk.choices[0].delta.tool_calls is not None:
                 for tool_call in chunk.choices[0].delta.tool_calls:
@@ -131,8 +150,6 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
         use_funcs: list[tools_entities.LLMFunction] = None,
         extra_args: dict[str, typing.Any] = {},
     ) -> llm_entities.Message:
-        self.client.api_key = use_model.token_mgr.get_token()
-
         args = {}
         args['model'] = use_model.model_entity.name
 
@@ -184,8 +201,12 @@ class ModelScopeChatCompletions(requester.LLMAPIRequester):
             req_messages.append(msg_dict)
 
         try:
-            return await self._closure(
-                query=query, req_messages=req_messages, use_model=model, use_funcs=funcs, extra_args=extra_args
+            return await self.request_with_retry(
+                query,
+                model,
+                lambda: self._closure(
+                    query=query, req_messages=req_messages, use_model=model, use_funcs=funcs, extra_args=extra_args
+                ),
             )
         except asyncio.TimeoutError:
             raise errors.RequesterError('请求超时')
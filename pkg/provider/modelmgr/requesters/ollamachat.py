@@ -73,6 +73,7 @@ class OllamaChatCompletions(requester.LLMAPIRequester):
                 args['tools'] = tools
 
         resp = await self._req(args)
+        use_model.usage.record(input_tokens=resp.prompt_eval_count or 0, output_tokens=resp.eval_count or 0)
         message: llm_entities.Message = await self._make_msg(resp)
         return message
 
@@ -120,12 +121,16 @@ class OllamaChatCompletions(requester.LLMAPIRequester):
                     msg_dict['content'] = '\n'.join(part['text'] for part in content)
             req_messages.append(msg_dict)
         try:
-            return await self._closure(
-                query=query,
-                req_messages=req_messages,
-                use_model=model,
-                use_funcs=funcs,
-                extra_args=extra_args,
+            return await self.request_with_retry(
+                query,
+                model,
+                lambda: self._closure(
+                    query=query,
+                    req_messages=req_messages,
+                    use_model=model,
+                    use_funcs=funcs,
+                    extra_args=extra_args,
+                ),
             )
         except asyncio.TimeoutError:
             raise errors.RequesterError('请求超时')
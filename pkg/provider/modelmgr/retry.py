@@ -0,0 +1,103 @@
+from __future__ import annotations
+
+import random
+import typing
+
+
+RETRYABLE_STATUS_CODES = (408, 409, 429)
+"""可重试的 HTTP 状态码，此外 5xx 也会重试"""
+
+
+class RetryPolicy:
+    """模型调用的重试策略
+
+    请求超时、连接失败、返回 5xx 或 429 时按指数退避加随机抖动（full jitter）等待后重试，
+    有 Retry-After 时至少等待该时长，等待时长超过 max-retry-after 或处理截止时间时不再重试。
+    重试预算限制重试次数占请求次数的比例：每次调用存入 budget-ratio 次重试额度，每次重试消耗一次，
+    额度最多累积 budget-max-retries 次，避免提供商故障时重试成倍放大请求量。
+    """
+
+    max_attempts: int
+    """每次调用的最大请求次数（含首次请求），为 1 时不重试"""
+
+    base_delay: float
+    """首次重试前退避时长的上界（秒），之后每次翻倍"""
+
+    max_delay: float
+    """退避时长的上界（秒）"""
+
+    max_retry_after: float
+    """按 Retry-After 等待的最长时长（秒），需要等待更久时不再重试"""
+
+    budget_ratio: float
+    """每次调用存入的重试额度"""
+
+    budget_max_retries: float
+    """重试额度的上限，即连续失败时最多可连续重试的次数，初始额度也为此值"""
+
+    budget: float
+    """当前的重试额度"""
+
+    retry_count: int
+
+    budget_exhausted_count: int
+    """因重试额度用尽而放弃重试的次数"""
+
+    def __init__(self, config: dict[str, typing.Any]):
+        self.max_attempts = max(1, config.get('max-attempts', 3))
+        self.base_delay = config.get('base-delay', 0.5)
+        self.max_delay = config.get('max-delay', 8)
+        self.max_retry_after = config.get('max-retry-after', 30)
+        self.budget_ratio = config.get('budget-ratio', 0.1)
+        self.budget_max_retries = config.get('budget-max-retries', 10)
+        self.budget = self.budget_max_retries
+        self.retry_count = 0
+        self.budget_exhausted_count = 0
+
+    def record_call(self):
+        """记录一次调用，存入重试额度"""
+        self.budget = min(self.budget + self.budget_ratio, self.budget_max_retries)
+
+    def get_retry_delay(
+        self,
+        attempt: int,
+        retry_after: float | None = None,
+        remaining_time: float | None = None,
+    ) -> float | None:
+        """计算第 attempt 次请求失败后重试前的等待时长，不应重试时返回 None
+
+        Args:
+            attempt (int): 已请求的次数
+            retry_after (float | None): 响应要求等待的时长（秒）
+            remaining_time (float | None): 距处理截止时间的剩余秒数
+        """
+        if attempt >= self.max_attempts:
+            return None
+
+        if retry_after is not None and retry_after > self.max_retry_after:
+            return None
+
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** (attempt - 1)))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+
+        if remaining_time is not None and delay >= remaining_time:
+            return None
+
+        if self.budget < 1:
+            self.budget_exhausted_count += 1
+            return None
+
+        self.budget -= 1
+        self.retry_count += 1
+
+        return delay
+
+    def get_stats(self) -> dict:
+        return {
+            'max_attempts': self.max_attempts,
+            'retry_count': self.retry_count,
+            'budget': round(self.budget, 2),
+            'budget_max_retries': self.budget_max_retries,
+            'budget_exhausted_count': self.budget_exhausted_count,
+        }
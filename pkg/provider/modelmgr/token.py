@@ -1,24 +1,206 @@
 from __future__ import annotations
 
+import contextlib
+import email.utils
+import time
 import typing
 
 
+QUOTA_ERROR_STATUS_CODES = (401, 402, 403)
+"""key 无效、余额不足或无权限时的 HTTP 状态码，此类错误短时间内不会恢复"""
+
+QUOTA_ERROR_CODES = ('insufficient_quota', 'invalid_api_key')
+"""OpenAI 等提供商在错误信息中返回的额度不足、key 无效的错误码，额度不足时状态码也为 429"""
+
+
+def parse_retry_after(headers: typing.Mapping[str, str] | None) -> float | None:
+    """解析响应头中的 Retry-After（秒数或 HTTP 日期）及 OpenAI 的 retry-after-ms，无法解析时返回 None"""
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get('retry-after-ms')
+    if retry_after_ms is not None:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get('retry-after')
+    if retry_after is None:
+        return None
+
+    try:
+        return float(retry_after)
+    except ValueError:
+        pass
+
+    try:
+        retry_at = email.utils.parsedate_to_datetime(retry_after)
+    except (TypeError, ValueError):
+        return None
+
+    return max(retry_at.timestamp() - time.time(), 0)
+
+
+def mask_token(token: str) -> str:
+    """隐藏 key 的中间部分，用于统计和日志"""
+    if len(token) <= 8:
+        return '*' * len(token)
+    return token[:3] + '...' + token[-4:]
+
+
+class TokenState:
+    """单个 key 的使用状态"""
+
+    token: str
+
+    in_flight: int
+    """进行中的请求数"""
+
+    request_count: int
+
+    error_count: int
+    """接口返回错误的次数"""
+
+    cooldown_count: int
+    """因限流、额度不足等原因暂停使用的次数"""
+
+    cooldown_until: float
+    """暂停使用至此时间戳"""
+
+    def __init__(self, token: str):
+        self.token = token
+        self.in_flight = 0
+        self.request_count = 0
+        self.error_count = 0
+        self.cooldown_count = 0
+        self.cooldown_until = 0
+
+    def to_dict(self) -> dict:
+        return {
+            'key': mask_token(self.token),
+            'in_flight': self.in_flight,
+            'request_count': self.request_count,
+            'error_count': self.error_count,
+            'cooldown_count': self.cooldown_count,
+            'cooldown_remaining': max(self.cooldown_until - time.time(), 0),
+        }
+
+
 class TokenManager:
-    """鉴权 Token 管理器"""
+    """鉴权 Token 管理器
+
+    管理一个模型的多个 api key，每次调用从未暂停使用的 key 中选择一个：
+    least-loaded 选择进行中请求最少的 key，round-robin 依次轮流使用。
+    key 被限流或额度不足时暂停使用一段时间，所有 key 都暂停使用时选择最早恢复的 key。
+    """
 
     name: str
 
     tokens: list[str]
 
     using_token_index: typing.Optional[int] = 0
+    """轮询的起始位置"""
+
+    strategy: str
+    """选择 key 的策略，least-loaded 或 round-robin"""
+
+    cooldown: float
+    """被限流且响应中没有 Retry-After 时的暂停时长（秒）"""
 
-    def __init__(self, name: str, tokens: list[str]):
+    quota_cooldown: float
+    """额度不足或 key 无效时的暂停时长（秒）"""
+
+    states: dict[str, TokenState]
+
+    def __init__(
+        self,
+        name: str,
+        tokens: list[str],
+        strategy: str = 'least-loaded',
+        cooldown: float = 60,
+        quota_cooldown: float = 600,
+    ):
         self.name = name
         self.tokens = tokens
         self.using_token_index = 0
+        self.strategy = strategy
+        self.cooldown = cooldown
+        self.quota_cooldown = quota_cooldown
+        self.states = {token: TokenState(token) for token in tokens}
+
+    def _select(self) -> TokenState:
+        if not self.tokens:
+            # 无需 key 的模型（如本地部署的模型）
+            return self.states.setdefault('', TokenState(''))
+
+        # 从轮询位置开始排列，负载相同时轮流使用
+        ordered = [
+            self.states[self.tokens[(self.using_token_index + i) % len(self.tokens)]] for i in range(len(self.tokens))
+        ]
+
+        now = time.time()
+        available = [state for state in ordered if state.cooldown_until <= now]
+
+        if not available:
+            return min(ordered, key=lambda state: state.cooldown_until)
+
+        if self.strategy == 'round-robin':
+            return available[0]
+
+        return min(available, key=lambda state: state.in_flight)
 
     def get_token(self) -> str:
-        return self.tokens[self.using_token_index]
+        return self._select().token
 
     def next_token(self):
         self.using_token_index = (self.using_token_index + 1) % len(self.tokens)
+
+    @contextlib.contextmanager
+    def acquire(self) -> typing.Iterator[str]:
+        """取得一个 key 供一次调用使用，调用期间计为该 key 的进行中请求"""
+        state = self._select()
+
+        if self.tokens:
+            self.using_token_index = (self.tokens.index(state.token) + 1) % len(self.tokens)
+
+        state.in_flight += 1
+        state.request_count += 1
+        try:
+            yield state.token
+        finally:
+            state.in_flight -= 1
+
+    def get_cooldown_remaining(self) -> float:
+        """距有 key 可以使用的秒数，有未暂停使用的 key 时为 0"""
+        if not self.tokens:
+            return 0
+
+        return max(min(self.states[token].cooldown_until for token in self.tokens) - time.time(), 0)
+
+    def report_error(
+        self,
+        token: str,
+        status_code: int,
+        retry_after: float | None = None,
+        error_code: str | None = None,
+    ):
+        """记录接口返回的错误，被限流时按 Retry-After 暂停使用该 key，额度不足或 key 无效时暂停更长时间"""
+        state = self.states.get(token)
+        if state is None:
+            return
+
+        state.error_count += 1
+
+        if status_code in QUOTA_ERROR_STATUS_CODES or error_code in QUOTA_ERROR_CODES:
+            duration = self.quota_cooldown
+        elif status_code == 429:
+            duration = retry_after if retry_after is not None else self.cooldown
+        else:
+            return
+
+        state.cooldown_until = max(state.cooldown_until, time.time() + duration)
+        state.cooldown_count += 1
+
+    def get_stats(self) -> list[dict]:
+        return [self.states[token].to_dict() for token in self.tokens]
@@ -33,9 +33,14 @@ class DifyServiceAPIRunner(runner.RequestRunner):
 
         api_key = self.pipeline_config['ai']['dify-service-api']['api-key']
 
+        base_url = self.pipeline_config['ai']['dify-service-api']['base-url']
+
         self.dify_client = client.AsyncDifyServiceClient(
             api_key=api_key,
-            base_url=self.pipeline_config['ai']['dify-service-api']['base-url'],
+            base_url=base_url,
+            http_client=self.ap.http_client_mgr.get_client(
+                base_url=base_url, scope=core_entities.LifecycleControlScope.PROVIDER
+            ),
         )
 
     def _try_convert_thinking(self, resp_text: str) -> str:
@@ -122,7 +127,7 @@ class DifyServiceAPIRunner(runner.RequestRunner):
             user=f'{query.session.launcher_type.value}_{query.session.launcher_id}',
             conversation_id=cov_id,
             files=files,
-            timeout=120,
+            timeout=query.get_timeout(120),
         ):
             self.ap.logger.debug('dify-chat-chunk: ' + str(chunk))
 
@@ -186,7 +191,7 @@ class DifyServiceAPIRunner(runner.RequestRunner):
             response_mode='streaming',
             conversation_id=cov_id,
             files=files,
-            timeout=120,
+            timeout=query.get_timeout(120),
         ):
             self.ap.logger.debug('dify-agent-chunk: ' + str(chunk))
 
@@ -278,7 +283,7 @@ class DifyServiceAPIRunner(runner.RequestRunner):
             inputs=inputs,
             user=f'{query.session.launcher_type.value}_{query.session.launcher_id}',
             files=files,
-            timeout=120,
+            timeout=query.get_timeout(120),
         ):
             self.ap.logger.debug('dify-workflow-chunk: ' + str(chunk))
             if chunk['event'] in ignored_events:
@@ -1,75 +1,372 @@
 from __future__ import annotations
 
+import asyncio
 import json
+import time
 import typing
 
 from .. import runner
 from ...core import entities as core_entities
 from .. import entities as llm_entities
+from ..modelmgr import requester, ratelimit
 
 
 @runner.runner_class('local-agent')
 class LocalAgentRunner(runner.RequestRunner):
     """本地Agent请求运行器"""
 
-    async def run(self, query: core_entities.Query) -> typing.AsyncGenerator[llm_entities.Message, None]:
+    async def _wait_rate_limit(
+        self,
+        query: core_entities.Query | None,
+        model: requester.RuntimeLLMModel,
+        req_messages: list[llm_entities.Message],
+        funcs: list | None,
+        priority: int = ratelimit.PRIORITY_INTERACTIVE,
+    ):
+        """等待模型的 RPM/TPM 额度"""
+        if model.rate_limiter.enabled:
+            tokens = ratelimit.estimate_tokens(
+                self.ap.sess_mgr.tokenizer, req_messages, funcs, model.model_entity.extra_args
+            )
+            await model.rate_limiter.acquire(tokens, priority)
+
+    def _get_candidate_models(self, model: requester.RuntimeLLMModel) -> list[requester.RuntimeLLMModel]:
+        """首选模型及流水线配置的备用模型，按配置顺序排列，找不到的备用模型被忽略"""
+        candidates = [model]
+
+        for model_uuid in self.pipeline_config['ai']['local-agent'].get('fallback-models', []):
+            for model in self.ap.model_mgr.llm_models:
+                if model.model_entity.uuid == model_uuid and model not in candidates:
+                    candidates.append(model)
+                    break
+
+        return candidates
+
+    def _iter_available_models(
+        self, candidates: list[requester.RuntimeLLMModel]
+    ) -> typing.Iterator[requester.RuntimeLLMModel]:
+        """依次产出未被熔断的模型，所有模型都被熔断时仍使用首选模型"""
+        available = False
+
+        for model in candidates:
+            if model.breaker.allow():
+                available = True
+                yield model
+            else:
+                self.ap.logger.debug(f'Skipping model {model.model_entity.name}: circuit breaker open')
+
+        if not available:
+            yield candidates[0]
+
+    @staticmethod
+    def _get_funcs(query: core_entities.Query | None, model: requester.RuntimeLLMModel) -> list | None:
+        """不支持工具调用的备用模型不传入工具"""
+        if query is None or 'func_call' not in model.model_entity.abilities:
+            return None
+        return query.use_funcs
+
+    async def _invoke_model(
+        self,
+        query: core_entities.Query | None,
+        model: requester.RuntimeLLMModel,
+        req_messages: list[llm_entities.Message],
+        priority: int = ratelimit.PRIORITY_INTERACTIVE,
+    ) -> llm_entities.Message:
+        """非流式调用一个模型，调用结果计入模型的熔断器"""
+        started_at = time.monotonic()
+        funcs = self._get_funcs(query, model)
+
+        try:
+            await self._wait_rate_limit(query, model, req_messages, funcs, priority)
+
+            msg = await model.requester.invoke_llm(
+                query,
+                model,
+                req_messages,
+                funcs,
+                extra_args=model.model_entity.extra_args,
+            )
+        except Exception as e:
+            # 本地的截止时间或排队超时不说明模型不可用，不计入熔断
+            if requester.is_provider_error(e):
+                model.breaker.record_failure()
+            raise
+
+        model.breaker.record_success()
+
+        if msg.content:
+            model.ttft.record(time.monotonic() - started_at)
+
+        return msg
+
+    async def _invoke_with_fallback(
+        self,
+        query: core_entities.Query | None,
+        candidates: list[requester.RuntimeLLMModel],
+        req_messages: list[llm_entities.Message],
+        priority: int = ratelimit.PRIORITY_INTERACTIVE,
+    ) -> llm_entities.Message:
+        """依次调用候选模型直到成功
+
+        开启对冲请求时，模型超过其 p95 耗时仍未返回则同时调用下一个模型，采用先成功的回复并取消其余调用。
+        每次调用最多对冲一次。
+        """
+        hedging = self.pipeline_config['ai']['local-agent'].get('hedging', False)
+
+        models = self._iter_available_models(candidates)
+        pending: dict[asyncio.Task, requester.RuntimeLLMModel] = {}
+        hedged = False
+
+        def start_next() -> float | None:
+            """调用下一个可用的模型，返回对冲前等待的时长，不对冲时返回 None"""
+            model = next(models, None)
+            if model is None:
+                return None
+
+            pending[asyncio.create_task(self._invoke_model(query, model, req_messages, priority))] = model
+
+            # 耗时记录过少时 p95 不可靠，不对冲
+            if hedging and not hedged and model.ttft.count >= 20:
+                return model.ttft.percentile(0.95)
+            return None
+
+        hedge_delay = start_next()
+        last_error: Exception | None = None
+
+        try:
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=hedge_delay, return_when=asyncio.FIRST_COMPLETED)
+
+                if not done:
+                    hedged = True
+                    hedge_delay = None
+                    model = next(iter(pending.values()))
+                    self.ap.logger.debug(f'Model {model.model_entity.name} exceeded its p95 latency, hedging')
+                    start_next()
+                    continue
+
+                result: llm_entities.Message | None = None
+
+                for task in done:
+                    model = pending.pop(task)
+
+                    if task.exception() is None:
+                        result = result or task.result()
+                    else:
+                        last_error = task.exception()
+                        self.ap.logger.warning(f'Model {model.model_entity.name} failed: {last_error}')
+
+                if result is not None:
+                    return result
+
+                if not pending:
+                    hedge_delay = start_next()
+        finally:
+            # 取消其余仍在进行的调用，并等待其结束，使其释放并发名额等资源
+            for task in pending:
+                task.cancel()
+            await asyncio.gather(*pending, return_exceptions=True)
+
+        raise last_error
+
+    async def invoke_background(
+        self,
+        model: requester.RuntimeLLMModel,
+        req_messages: list[llm_entities.Message],
+    ) -> llm_entities.Message:
+        """在后台任务（如压缩对话）中调用模型，与用户请求一样经过限流、熔断和备用模型，额度不足时让用户请求先执行"""
+        return await self._invoke_with_fallback(
+            None, self._get_candidate_models(model), req_messages, ratelimit.PRIORITY_BACKGROUND
+        )
+
+    async def _invoke_llm(
+        self,
+        query: core_entities.Query,
+        req_messages: list[llm_entities.Message],
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
+        """调用模型，开启流式回复时先逐段产出增量文本，最后产出完整消息
+
+        首选模型失败或被熔断时依次改用流水线配置的备用模型，缓存及合并请求均以首选模型为准。
+        """
+        model = query.use_llm_model
+        candidates = self._get_candidate_models(model)
+
+        request_key = requester.make_request_key(model, req_messages, query.use_funcs, model.model_entity.extra_args)
+
+        use_cache = self.pipeline_config['ai']['local-agent'].get('response-cache', False)
+        if use_cache:
+            msg = await self.ap.llm_cache.get(request_key)
+            if msg is not None:
+                yield msg
+                return
+
+        if not self.pipeline_config['output'].get('streaming', {}).get('enable', False):
+
+            async def invoke() -> llm_entities.Message:
+                return await self._invoke_with_fallback(query, candidates, req_messages)
+
+            # 合并相同请求默认随流水线的回复缓存开启，可通过 llm-cache.single-flight 单独配置
+            single_flight = self.ap.instance_config.data.get('llm-cache', {}).get('single-flight')
+            if single_flight is None:
+                single_flight = use_cache
+
+            if single_flight:
+                # 相同请求的并发调用共用一次调用，各自取得结果的副本；
+                # 每个调用方按自己的处理截止时间等待，超时只取消自己的等待，不影响共用的调用
+                msg = await asyncio.wait_for(model.inflight.do(request_key, invoke), query.get_remaining_time())
+                msg = msg.copy(deep=True)
+            else:
+                msg = await invoke()
+
+            if use_cache:
+                await self.ap.llm_cache.set(request_key, msg)
+
+            yield msg
+            return
+
+        models = self._iter_available_models(candidates)
+        model = next(models)
+
+        while True:
+            started_at = time.monotonic()
+            funcs = self._get_funcs(query, model)
+            first_token = True
+            yielded = False
+
+            try:
+                await self._wait_rate_limit(query, model, req_messages, funcs)
+
+                async for resp in model.requester.invoke_llm_stream(
+                    query,
+                    model,
+                    req_messages,
+                    funcs,
+                    extra_args=model.model_entity.extra_args,
+                ):
+                    if first_token and resp.content:
+                        model.ttft.record(time.monotonic() - started_at)
+                        first_token = False
+
+                    yielded = True
+                    yield resp
+            except Exception as e:
+                if requester.is_provider_error(e):
+                    model.breaker.record_failure()
+
+                # 已输出部分回复时无法再改用其他模型
+                next_model = None if yielded else next(models, None)
+                if next_model is None:
+                    raise
+
+                self.ap.logger.warning(f'Model {model.model_entity.name} failed: {e}, falling back')
+                model = next_model
+                continue
+
+            model.breaker.record_success()
+            break
+
+        if use_cache:
+            await self.ap.llm_cache.set(request_key, resp)
+
+    async def _execute_tool_call(
+        self,
+        query: core_entities.Query,
+        tool_call: llm_entities.ToolCall,
+        semaphore: asyncio.Semaphore,
+        timeout: float | None,
+    ) -> llm_entities.Message:
+        """执行一个工具调用，返回工具结果消息，出错时返回报错信息"""
+        async with semaphore:
+            try:
+                func = tool_call.function
+
+                parameters = json.loads(func.arguments)
+
+                func_ret = await self.ap.tool_mgr.execute_func_call(query, func.name, parameters, timeout=timeout)
+
+                return llm_entities.Message(
+                    role='tool',
+                    content=json.dumps(func_ret, ensure_ascii=False),
+                    tool_call_id=tool_call.id,
+                )
+            except asyncio.TimeoutError:
+                return llm_entities.Message(role='tool', content='err: tool call timed out', tool_call_id=tool_call.id)
+            except Exception as e:
+                # 工具调用出错，返回报错信息
+                return llm_entities.Message(role='tool', content=f'err: {e}', tool_call_id=tool_call.id)
+
+    async def run(
+        self, query: core_entities.Query
+    ) -> typing.AsyncGenerator[llm_entities.MessageChunk | llm_entities.Message, None]:
         """运行请求"""
         pending_tool_calls = []
 
         req_messages = query.prompt.messages.copy() + query.messages.copy() + [query.user_message]
 
         # 首次请求
-        msg = await query.use_llm_model.requester.invoke_llm(
-            query,
-            query.use_llm_model,
-            req_messages,
-            query.use_funcs,
-            extra_args=query.use_llm_model.model_entity.extra_args,
-        )
-
-        yield msg
+        async for msg in self._invoke_llm(query, req_messages):
+            yield msg
 
         pending_tool_calls = msg.tool_calls
 
         req_messages.append(msg)
 
+        local_agent_cfg = self.pipeline_config['ai']['local-agent']
+        max_tool_rounds = local_agent_cfg.get('max-tool-rounds', 10)
+        tool_timeout = local_agent_cfg.get('tool-timeout', 60) or None
+        # 同一请求中并发执行的工具调用数上限
+        tool_semaphore = asyncio.Semaphore(max(1, local_agent_cfg.get('tool-concurrency', 4)))
+
+        tool_rounds = 0
+
         # 持续请求，只要还有待处理的工具调用就继续处理调用
         while pending_tool_calls:
-            for tool_call in pending_tool_calls:
-                try:
-                    func = tool_call.function
+            if 0 < max_tool_rounds < tool_rounds:
+                # 已告知模型达到上限后仍要求调用工具，以配置的提示结束处理；
+                # 未执行的调用不保留在会话记录中，否则之后的请求会因缺少工具结果被拒绝
+                self.ap.logger.warning(
+                    f'Query {query.query_id} reached the tool call rounds limit ({max_tool_rounds}), stopping'
+                )
 
-                    parameters = json.loads(func.arguments)
+                msg.tool_calls = None
 
-                    func_ret = await self.ap.tool_mgr.execute_func_call(query, func.name, parameters)
+                yield llm_entities.Message(
+                    role='assistant',
+                    content=local_agent_cfg.get('max-tool-rounds-notice', '工具调用轮数已达上限，已停止处理。'),
+                )
+                break
 
-                    msg = llm_entities.Message(
+            if max_tool_rounds == tool_rounds > 0:
+                # 不再执行工具，告知模型后请求一次最终回复
+                for tool_call in pending_tool_calls:
+                    err_msg = llm_entities.Message(
                         role='tool',
-                        content=json.dumps(func_ret, ensure_ascii=False),
+                        content=f'err: tool call rounds limit ({max_tool_rounds}) reached, not executed',
                         tool_call_id=tool_call.id,
                     )
 
+                    yield err_msg
+
+                    req_messages.append(err_msg)
+            else:
+                # 同一轮中的工具调用相互独立，并发执行，结果按调用顺序返回
+                results = await asyncio.gather(
+                    *[
+                        self._execute_tool_call(query, tool_call, tool_semaphore, tool_timeout)
+                        for tool_call in pending_tool_calls
+                    ]
+                )
+
+                for msg in results:
                     yield msg
 
                     req_messages.append(msg)
-                except Exception as e:
-                    # 工具调用出错，添加一个报错信息到 req_messages
-                    err_msg = llm_entities.Message(role='tool', content=f'err: {e}', tool_call_id=tool_call.id)
 
-                    yield err_msg
-
-                    req_messages.append(err_msg)
+            tool_rounds += 1
 
             # 处理完所有调用，再次请求
-            msg = await query.use_llm_model.requester.invoke_llm(
-                query,
-                query.use_llm_model,
-                req_messages,
-                query.use_funcs,
-                extra_args=query.use_llm_model.model_entity.extra_args,
-            )
-
-            yield msg
+            async for msg in self._invoke_llm(query, req_messages):
+                yield msg
 
             pending_tool_calls = msg.tool_calls
 
@@ -124,31 +124,31 @@ class N8nServiceAPIRunner(runner.RequestRunner):
                 self.ap.logger.debug('no auth')
 
             # 调用webhook
-            async with aiohttp.ClientSession() as session:
-                async with session.post(
-                    self.webhook_url, json=payload, headers=headers, auth=auth, timeout=self.timeout
-                ) as response:
-                    if response.status != 200:
-                        error_text = await response.text()
-                        self.ap.logger.error(f'n8n webhook call failed: {response.status}, {error_text}')
-                        raise Exception(f'n8n webhook call failed: {response.status}, {error_text}')
-
-                    # 解析响应
-                    response_data = await response.json()
-                    self.ap.logger.debug(f'n8n webhook response: {response_data}')
-
-                    # 从响应中提取输出
-                    if self.output_key in response_data:
-                        output_content = response_data[self.output_key]
-                    else:
-                        # 如果没有指定的输出键，则使用整个响应
-                        output_content = json.dumps(response_data, ensure_ascii=False)
-
-                    # 返回消息
-                    yield llm_entities.Message(
-                        role='assistant',
-                        content=output_content,
-                    )
+            session = self.ap.http_client_mgr.get_session(scope=core_entities.LifecycleControlScope.PROVIDER)
+            async with session.post(
+                self.webhook_url, json=payload, headers=headers, auth=auth, timeout=query.get_timeout(self.timeout)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    self.ap.logger.error(f'n8n webhook call failed: {response.status}, {error_text}')
+                    raise Exception(f'n8n webhook call failed: {response.status}, {error_text}')
+
+                # 解析响应
+                response_data = await response.json()
+                self.ap.logger.debug(f'n8n webhook response: {response_data}')
+
+                # 从响应中提取输出
+                if self.output_key in response_data:
+                    output_content = response_data[self.output_key]
+                else:
+                    # 如果没有指定的输出键，则使用整个响应
+                    output_content = json.dumps(response_data, ensure_ascii=False)
+
+                # 返回消息
+                yield llm_entities.Message(
+                    role='assistant',
+                    content=output_content,
+                )
         except Exception as e:
             self.ap.logger.error(f'n8n webhook call exception: {str(e)}')
             raise N8nAPIError(f'n8n webhook call exception: {str(e)}')
@@ -1,30 +1,148 @@
 from __future__ import annotations
 
 import asyncio
+import collections
+import datetime
 
 from ...core import app, entities as core_entities
 from ...provider import entities as provider_entities
+from ...provider.modelmgr import requester
+from ...provider.runners import localagent
+from ...utils import tokenizer
+
+
+COMPACTION_PROMPT = (
+    'Summarize the earlier part of the conversation below so that it can replace those messages as context. '
+    'Keep facts, decisions, names, numbers and open questions, drop small talk, '
+    'and write the summary in the language the conversation uses.'
+)
+"""压缩对话时要求模型生成摘要的提示词"""
+
+SUMMARY_PREFIX = '[Summary of the earlier conversation]\n'
+"""摘要消息的前缀，再次压缩时据此识别上一次的摘要"""
+
+EVICT_INTERVAL = 60
+"""定期淘汰空闲超时会话的间隔（秒）"""
 
 
 class SessionManager:
-    """会话管理器"""
+    """会话管理器
+
+    会话以 (launcher_type, launcher_id) 为键保存在按最近使用排序的字典中，查找为 O(1)。
+    长时间未使用或超出数量上限的会话会被淘汰。
+    """
 
     ap: app.Application
 
-    session_list: list[core_entities.Session]
+    sessions: collections.OrderedDict[tuple[core_entities.LauncherTypes, str], core_entities.Session]
+    """(launcher_type, launcher_id) -> 会话，越靠后越近被使用"""
+
+    max_sessions: int
+    """最多保留的会话数，0 表示不限制"""
+
+    session_idle_timeout: int
+    """会话空闲多少秒后被淘汰，0 表示不淘汰"""
+
+    max_conversations: int
+    """每个会话最多保留的对话数，0 表示不限制"""
+
+    evicted_session_count: int
+    """已淘汰的会话数"""
+
+    evicted_conversation_count: int
+    """已淘汰的对话数"""
+
+    tokenizer: tokenizer.Tokenizer
+    """计算对话 token 数的分词器"""
+
+    compacting: set[int]
+    """正在后台压缩的对话（对象 id），对话的 uuid 由外部服务使用，不能用于标识"""
+
+    compacted_count: int
+    """已完成的对话压缩次数"""
 
     def __init__(self, ap: app.Application):
         self.ap = ap
-        self.session_list = []
+        self.sessions = collections.OrderedDict()
+        self.max_sessions = 0
+        self.session_idle_timeout = 0
+        self.max_conversations = 0
+        self.evicted_session_count = 0
+        self.evicted_conversation_count = 0
+        self.compacting = set()
+        self.compacted_count = 0
 
     async def initialize(self):
-        pass
+        session_cfg = self.ap.instance_config.data.get('session', {})
+
+        # 已有部署的配置中没有此项，不做限制以保持原有行为，新部署的上限由配置模板给出
+        self.max_sessions = session_cfg.get('max-sessions', 0)
+        self.session_idle_timeout = session_cfg.get('idle-timeout', 0)
+        self.max_conversations = session_cfg.get('max-conversations', 0)
+
+        self.tokenizer = await tokenizer.load_tokenizer(self.ap)
+
+        if self.session_idle_timeout > 0:
+            # 没有新会话时也要淘汰空闲超时的会话
+            self.ap.task_mgr.create_task(
+                self._evict_periodically(),
+                kind='session-eviction',
+                name='session-eviction',
+                scopes=[core_entities.LifecycleControlScope.APPLICATION, core_entities.LifecycleControlScope.PROVIDER],
+            )
+
+    @property
+    def session_list(self) -> list[core_entities.Session]:
+        """所有会话"""
+        return list(self.sessions.values())
+
+    def _is_session_busy(self, session_key: str) -> bool:
+        """会话是否还有正在处理或等待处理的请求，这类会话不会被淘汰"""
+        query_pool = self.ap.query_pool
+        if query_pool is None:
+            return False
+        return query_pool.is_session_busy(session_key)
+
+    def _evict_sessions(self):
+        """淘汰空闲超时的会话，以及超出数量上限的最久未使用的会话"""
+        deadline = None
+        if self.session_idle_timeout > 0:
+            deadline = datetime.datetime.now() - datetime.timedelta(seconds=self.session_idle_timeout)
+
+        overflow = len(self.sessions) - self.max_sessions if self.max_sessions > 0 else 0
+
+        evict_keys = []
+
+        # 按最近使用排序，从最久未使用的开始检查，遇到既未超时也无需为数量上限腾位置的会话即可停止
+        for key, session in self.sessions.items():
+            expired = deadline is not None and session.update_time <= deadline
+            if not expired and len(evict_keys) >= overflow:
+                break
+            if self._is_session_busy(f'{key[0].value}_{key[1]}'):
+                continue
+            evict_keys.append(key)
+
+        for key in evict_keys:
+            del self.sessions[key]
+
+        self.evicted_session_count += len(evict_keys)
+
+    async def _evict_periodically(self):
+        # 重新加载后由新的会话管理器接管
+        while self.ap.sess_mgr in (None, self):
+            await asyncio.sleep(EVICT_INTERVAL)
+            self._evict_sessions()
 
     async def get_session(self, query: core_entities.Query) -> core_entities.Session:
         """获取会话"""
-        for session in self.session_list:
-            if query.launcher_type == session.launcher_type and query.launcher_id == session.launcher_id:
-                return session
+        key = (query.launcher_type, str(query.launcher_id))
+
+        session = self.sessions.get(key)
+
+        if session is not None:
+            self.sessions.move_to_end(key)
+            session.update_time = datetime.datetime.now()
+            return session
 
         session_concurrency = self.ap.instance_config.data['concurrency']['session']
 
@@ -33,7 +151,10 @@ class SessionManager:
             launcher_id=query.launcher_id,
             semaphore=asyncio.Semaphore(session_concurrency),
         )
-        self.session_list.append(session)
+        self.sessions[key] = session
+
+        self._evict_sessions()
+
         return session
 
     async def get_conversation(
@@ -73,4 +194,112 @@ class SessionManager:
             session.conversations.append(conversation)
             session.using_conversation = conversation
 
+            if self.max_conversations > 0 and len(session.conversations) > self.max_conversations:
+                evict_count = len(session.conversations) - self.max_conversations
+                del session.conversations[:evict_count]
+                self.evicted_conversation_count += evict_count
+
         return session.using_conversation
+
+    def schedule_compaction(self, query: core_entities.Query, conversation: core_entities.Conversation):
+        """对话加入新消息后调用，开启压缩且对话超过 token 阈值时，在后台将较早的消息替换为摘要
+
+        摘要由后台任务生成，不阻塞回复。
+        """
+        compaction_cfg = query.pipeline_config['ai'].get('compaction', {})
+        if not compaction_cfg.get('enable', False):
+            return
+
+        # 其他运行器的对话由外部服务管理，本地保存的消息不会发给模型
+        if query.pipeline_config['ai']['runner']['runner'] != localagent.LocalAgentRunner.name:
+            return
+
+        if id(conversation) in self.compacting:
+            return
+
+        threshold = compaction_cfg.get('threshold', 8000)
+        if sum(self.tokenizer.count_message(msg) for msg in conversation.messages) <= threshold:
+            return
+
+        model = query.use_llm_model
+        if compaction_cfg.get('model'):
+            for llm_model in self.ap.model_mgr.llm_models:
+                if llm_model.model_entity.uuid == compaction_cfg['model']:
+                    model = llm_model
+                    break
+            else:
+                self.ap.logger.warning(
+                    f'Compaction model {compaction_cfg["model"]} not found, using the pipeline model'
+                )
+
+        if model is None:
+            return
+
+        self.compacting.add(id(conversation))
+
+        runner = localagent.LocalAgentRunner(self.ap, query.pipeline_config)
+
+        self.ap.task_mgr.create_task(
+            self._compact(runner, query.session, conversation, model, compaction_cfg.get('keep-rounds', 4)),
+            kind='conversation-compaction',
+            name=f'compaction-{query.launcher_type.value}_{query.launcher_id}',
+            scopes=[core_entities.LifecycleControlScope.PROVIDER],
+        )
+
+    async def _compact(
+        self,
+        runner: localagent.LocalAgentRunner,
+        session: core_entities.Session,
+        conversation: core_entities.Conversation,
+        model: requester.RuntimeLLMModel,
+        keep_rounds: int,
+    ):
+        try:
+            # 保留最近 keep_rounds 轮对话，从一条用户消息处切分，不拆开工具调用及其结果
+            split = len(conversation.messages)
+            rounds = 0
+            while split > 0 and rounds < keep_rounds:
+                split -= 1
+                if conversation.messages[split].role == 'user':
+                    rounds += 1
+
+            older = conversation.messages[:split]
+            if not older:
+                return
+
+            transcript = []
+            for msg in older:
+                if msg.role == 'system' and isinstance(msg.content, str) and msg.content.startswith(SUMMARY_PREFIX):
+                    transcript.append(f'(previous summary) {msg.content[len(SUMMARY_PREFIX) :]}')
+                elif msg.content is not None:
+                    transcript.append(f'{msg.role}: {msg.get_content_platform_message_chain()}')
+                elif msg.tool_calls:
+                    transcript.append(f'{msg.role}: called {", ".join(tc.function.name for tc in msg.tool_calls)}')
+
+            req_messages = [
+                provider_entities.Message(role='system', content=COMPACTION_PROMPT),
+                provider_entities.Message(role='user', content='\n'.join(transcript)),
+            ]
+
+            resp = await runner.invoke_background(model, req_messages)
+
+            if not isinstance(resp.content, str) or not resp.content.strip():
+                return
+
+            async with session.lock:
+                # 生成摘要期间对话可能已被重置或截断，只有较早的消息仍原样保留时才替换
+                if len(conversation.messages) < len(older) or any(
+                    a is not b for a, b in zip(conversation.messages, older)
+                ):
+                    return
+
+                conversation.messages[: len(older)] = [
+                    provider_entities.Message(role='system', content=SUMMARY_PREFIX + resp.content.strip())
+                ]
+                self.compacted_count += 1
+
+            self.ap.logger.info(f'Compacted {len(older)} earlier messages of a conversation into a summary')
+        except Exception as e:
+            self.ap.logger.warning(f'Failed to compact conversation: {type(e).__name__} {e}')
+        finally:
+            self.compacting.discard(id(conversation))
@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+import collections
+import copy
+import json
+import time
+import typing
+
+from ...core import app
+
+
+class ToolResultCache:
+    """工具结果缓存
+
+    只缓存声明了缓存有效期的工具（插件内容函数的 cache_ttl 参数，或标注为只读的 MCP 工具），
+    对工具名和参数完全相同的调用直接返回此前的结果。结果默认按会话和发送者分别缓存，
+    工具声明为共享（cache_shared）时所有会话共用。执行失败的结果不缓存。
+    """
+
+    ap: app.Application
+
+    enable: bool
+
+    max_entries: int
+    """最大条目数，为 0 时不限制，超出时淘汰最久未使用的条目"""
+
+    entries: collections.OrderedDict[str, tuple[typing.Any, float]]
+    """key -> (工具结果, 过期时间)，按最近使用的顺序排列"""
+
+    hit_count: int
+
+    miss_count: int
+
+    tool_hit_counts: dict[str, int]
+    """工具名 -> 命中次数"""
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        self.enable = True
+        self.max_entries = 1000
+        self.entries = collections.OrderedDict()
+        self.hit_count = 0
+        self.miss_count = 0
+        self.tool_hit_counts = {}
+
+    async def initialize(self):
+        cache_cfg = self.ap.instance_config.data.get('tool-cache', {})
+
+        self.enable = cache_cfg.get('enable', True)
+        self.max_entries = cache_cfg.get('max-entries', 1000)
+
+    @staticmethod
+    def make_key(name: str, parameters: dict, scope: str = '') -> str | None:
+        """生成缓存 key，参数无法序列化为 JSON 时返回 None
+
+        Args:
+            scope (str): 缓存的作用范围，不同范围的结果互不共用，为空时所有调用共用
+        """
+        try:
+            arguments = json.dumps(parameters, sort_keys=True, ensure_ascii=False, separators=(',', ':'))
+        except (TypeError, ValueError):
+            return None
+
+        return f'{scope}|{name}:{arguments}'
+
+    def get(self, name: str, key: str) -> tuple[bool, typing.Any]:
+        """获取未过期的工具结果
+
+        Returns:
+            tuple[bool, typing.Any]: (是否命中, 工具结果)
+        """
+        entry = self.entries.get(key)
+
+        if entry is not None and entry[1] <= time.time():
+            del self.entries[key]
+            entry = None
+
+        if entry is None:
+            self.miss_count += 1
+            return False, None
+
+        self.entries.move_to_end(key)
+        self.hit_count += 1
+        self.tool_hit_counts[name] = self.tool_hit_counts.get(name, 0) + 1
+
+        # 复制一份，避免调用方修改缓存中的结果
+        return True, copy.deepcopy(entry[0])
+
+    def set(self, key: str, result: typing.Any, ttl: float):
+        """缓存工具结果，以 'error' 开头的字符串结果视为执行失败，不缓存"""
+        if isinstance(result, str) and result.startswith('error'):
+            return
+
+        self.entries[key] = (copy.deepcopy(result), time.time() + ttl)
+        self.entries.move_to_end(key)
+
+        while self.max_entries and len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def get_stats(self) -> dict:
+        return {
+            'enable': self.enable,
+            'size': len(self.entries),
+            'hit_count': self.hit_count,
+            'miss_count': self.miss_count,
+            'tool_hit_counts': self.tool_hit_counts,
+        }
@@ -18,6 +18,18 @@ class LLMFunction(pydantic.BaseModel):
 
     parameters: dict
 
+    cache_ttl: float = 0
+    """结果缓存有效期（秒），为 0 时不缓存
+
+    只应为结果仅取决于参数、且没有副作用的工具设置，相同参数的调用在有效期内直接返回缓存的结果。
+    """
+
+    cache_shared: bool = False
+    """缓存的结果是否在所有会话和用户间共享
+
+    为 False 时按会话和发送者分别缓存，避免工具按调用者身份返回的结果被其他用户取得。
+    """
+
     func: typing.Callable
     """供调用的python异步方法
     
@@ -27,5 +39,8 @@ class LLMFunction(pydantic.BaseModel):
     对插件的内容函数进行封装并存到这里来。
     """
 
+    _provider_schemas: dict[str, dict] = pydantic.PrivateAttr(default_factory=dict)
+    """提供商格式 -> 生成的工具定义，由 ToolManager 生成并缓存"""
+
     class Config:
         arbitrary_types_allowed = True
@@ -44,6 +44,13 @@ class ToolLoader(abc.ABC):
         """检查工具是否存在"""
         pass
 
+    def get_version(self) -> typing.Hashable:
+        """获取工具列表的版本号，启用的工具变化时应返回不同的值，ToolManager 据此重建工具索引
+
+        工具列表在初始化后不再变化的加载器无需重写。
+        """
+        return 0
+
     @abc.abstractmethod
     async def invoke_tool(self, query: core_entities.Query, name: str, parameters: dict) -> typing.Any:
         """执行工具调用"""
@@ -80,6 +80,13 @@ class RuntimeMCPSession:
 
         self.ap.logger.debug(f'获取 MCP 工具: {tools}')
 
+        # 标注为只读的工具视为结果可缓存，cache-ttl 为 0 时不缓存（默认）
+        # 结果与调用者无关的服务器可设置 cache-shared，使缓存在所有会话间共享
+        cache_ttl = self.server_config.get(
+            'cache-ttl', self.ap.instance_config.data.get('tool-cache', {}).get('mcp-ttl', 0)
+        )
+        cache_shared = self.server_config.get('cache-shared', False)
+
         for tool in tools.tools:
 
             async def func(query: core_entities.Query, *, _tool=tool, **kwargs):
@@ -90,6 +97,8 @@ class RuntimeMCPSession:
 
             func.__name__ = tool.name
 
+            read_only = tool.annotations is not None and tool.annotations.readOnlyHint is True
+
             self.functions.append(
                 tools_entities.LLMFunction(
                     name=tool.name,
@@ -97,6 +106,8 @@ class RuntimeMCPSession:
                     description=tool.description,
                     parameters=tool.inputSchema,
                     func=func,
+                    cache_ttl=cache_ttl if read_only else 0,
+                    cache_shared=cache_shared,
                 )
             )
 
@@ -114,12 +125,13 @@ class MCPLoader(loader.ToolLoader):
 
     sessions: dict[str, RuntimeMCPSession] = {}
 
-    _last_listed_functions: list[tools_entities.LLMFunction] = []
+    _functions_by_name: dict[str, tools_entities.LLMFunction] = {}
+    """工具名 -> 工具"""
 
     def __init__(self, ap: app.Application):
         super().__init__(ap)
         self.sessions = {}
-        self._last_listed_functions = []
+        self._functions_by_name = {}
 
     async def initialize(self):
         for server_config in self.ap.instance_config.data.get('mcp', {}).get('servers', []):
@@ -130,26 +142,26 @@ class MCPLoader(loader.ToolLoader):
             # self.ap.event_loop.create_task(session.initialize())
             self.sessions[server_config['name']] = session
 
+            for function in session.functions:
+                self._functions_by_name.setdefault(function.name, function)
+
     async def get_tools(self, enabled: bool = True) -> list[tools_entities.LLMFunction]:
         all_functions = []
 
         for session in self.sessions.values():
             all_functions.extend(session.functions)
 
-        self._last_listed_functions = all_functions
-
         return all_functions
 
     async def has_tool(self, name: str) -> bool:
-        return name in [f.name for f in self._last_listed_functions]
+        return name in self._functions_by_name
 
     async def invoke_tool(self, query: core_entities.Query, name: str, parameters: dict) -> typing.Any:
-        for server_name, session in self.sessions.items():
-            for function in session.functions:
-                if function.name == name:
-                    return await function.func(query, **parameters)
+        function = self._functions_by_name.get(name)
+        if function is None:
+            raise ValueError(f'未找到工具: {name}')
 
-        raise ValueError(f'未找到工具: {name}')
+        return await function.func(query, **parameters)
 
     async def shutdown(self):
         """关闭工具"""
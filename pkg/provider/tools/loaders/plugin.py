@@ -4,7 +4,7 @@ import typing
 import traceback
 
 from .. import loader, entities as tools_entities
-from ....core import entities as core_entities
+from ....core import app, entities as core_entities
 from ....plugin import context as plugin_context
 
 
@@ -13,8 +13,40 @@ class PluginToolLoader(loader.ToolLoader):
     """插件工具加载器。
 
     本加载器中不存储工具信息，仅负责从插件系统中获取工具信息。
+    查找工具时使用的索引在插件变化后重建。
     """
 
+    _index: dict[str, typing.Tuple[tools_entities.LLMFunction, plugin_context.BasePlugin]] = {}
+    """工具名 -> (工具, 插件实例)"""
+
+    _index_version: typing.Hashable = None
+
+    def __init__(self, ap: app.Application):
+        super().__init__(ap)
+        self._index = {}
+        self._index_version = None
+
+    def get_version(self) -> typing.Hashable:
+        # 插件重载时会创建新的插件管理器，故版本号包含插件管理器本身
+        return (self.ap.plugin_mgr, self.ap.plugin_mgr.tools_version)
+
+    def _get_index(self) -> dict[str, typing.Tuple[tools_entities.LLMFunction, plugin_context.BasePlugin]]:
+        version = self.get_version()
+
+        if version != self._index_version:
+            index = {}
+
+            for plugin in self.ap.plugin_mgr.plugins(
+                enabled=True, status=plugin_context.RuntimeContainerStatus.INITIALIZED
+            ):
+                for function in plugin.tools:
+                    index.setdefault(function.name, (function, plugin.plugin_inst))
+
+            self._index = index
+            self._index_version = version
+
+        return self._index
+
     async def get_tools(self, enabled: bool = True) -> list[tools_entities.LLMFunction]:
         # 从插件系统获取工具（内容函数）
         all_functions: list[tools_entities.LLMFunction] = []
@@ -28,25 +60,13 @@ class PluginToolLoader(loader.ToolLoader):
 
     async def has_tool(self, name: str) -> bool:
         """检查工具是否存在"""
-        for plugin in self.ap.plugin_mgr.plugins(
-            enabled=True, status=plugin_context.RuntimeContainerStatus.INITIALIZED
-        ):
-            for function in plugin.tools:
-                if function.name == name:
-                    return True
-        return False
+        return name in self._get_index()
 
     async def _get_function_and_plugin(
         self, name: str
     ) -> typing.Tuple[tools_entities.LLMFunction, plugin_context.BasePlugin]:
         """获取函数和插件实例"""
-        for plugin in self.ap.plugin_mgr.plugins(
-            enabled=True, status=plugin_context.RuntimeContainerStatus.INITIALIZED
-        ):
-            for function in plugin.tools:
-                if function.name == name:
-                    return function, plugin.plugin_inst
-        return None, None
+        return self._get_index().get(name, (None, None))
 
     async def invoke_tool(self, query: core_entities.Query, name: str, parameters: dict) -> typing.Any:
         try:
@@ -63,15 +83,6 @@ class PluginToolLoader(loader.ToolLoader):
             self.ap.logger.error(f'执行函数 {name} 时发生错误: {e}')
             traceback.print_exc()
             return f'error occurred when executing function {name}: {e}'
-        finally:
-            plugin = None
-
-            for p in self.ap.plugin_mgr.plugins():
-                if function in p.tools:
-                    plugin = p
-                    break
-
-            # TODO statistics
 
     async def shutdown(self):
         """关闭工具"""
@@ -1,9 +1,11 @@
 from __future__ import annotations
 
+import asyncio
 import typing
 
 from ...core import app, entities as core_entities
-from . import entities, loader as tools_loader
+from . import entities, loader as tools_loader, cache as tools_cache
+from ...pipeline import broker
 from ...utils import importutil
 from . import loaders
 
@@ -17,12 +19,29 @@ class ToolManager:
 
     loaders: list[tools_loader.ToolLoader]
 
+    result_cache: tools_cache.ToolResultCache
+
+    version: int
+    """工具索引版本号，启用的工具变化后重建索引时递增"""
+
+    index: dict[str, tuple[tools_loader.ToolLoader, entities.LLMFunction]]
+    """工具名 -> (加载器, 工具)，同名工具以先注册的加载器为准"""
+
+    _loader_versions: tuple | None
+    """构建索引时各加载器的版本号"""
+
     def __init__(self, ap: app.Application):
         self.ap = ap
         self.all_functions = []
         self.loaders = []
+        self.result_cache = tools_cache.ToolResultCache(ap)
+        self.version = 0
+        self.index = {}
+        self._loader_versions = None
 
     async def initialize(self):
+        await self.result_cache.initialize()
+
         for loader_cls in tools_loader.preregistered_loaders:
             loader_inst = loader_cls(self.ap)
             await loader_inst.initialize()
@@ -37,12 +56,32 @@ class ToolManager:
 
         return all_functions
 
-    async def generate_tools_for_openai(self, use_funcs: list[entities.LLMFunction]) -> list:
-        """生成函数列表"""
-        tools = []
+    async def get_index(self) -> dict[str, tuple[tools_loader.ToolLoader, entities.LLMFunction]]:
+        """获取工具索引，加载器的版本号变化（插件启停、重载等）时重建"""
+        loader_versions = tuple(loader.get_version() for loader in self.loaders)
+
+        if loader_versions != self._loader_versions:
+            index = {}
+
+            for loader in self.loaders:
+                for function in await loader.get_tools():
+                    index.setdefault(function.name, (loader, function))
 
-        for function in use_funcs:
-            function_schema = {
+                    # 预先生成各提供商格式的工具定义
+                    self._get_openai_schema(function)
+                    self._get_anthropic_schema(function)
+
+            self.index = index
+            self._loader_versions = loader_versions
+            self.version += 1
+
+        return self.index
+
+    @staticmethod
+    def _get_openai_schema(function: entities.LLMFunction) -> dict:
+        schema = function._provider_schemas.get('openai')
+        if schema is None:
+            schema = {
                 'type': 'function',
                 'function': {
                     'name': function.name,
@@ -50,9 +89,29 @@ class ToolManager:
                     'parameters': function.parameters,
                 },
             }
-            tools.append(function_schema)
+            function._provider_schemas['openai'] = schema
+        return schema
+
+    @staticmethod
+    def _get_anthropic_schema(function: entities.LLMFunction) -> dict:
+        schema = function._provider_schemas.get('anthropic')
+        if schema is None:
+            schema = {
+                'name': function.name,
+                'description': function.description,
+                'input_schema': function.parameters,
+            }
+            function._provider_schemas['anthropic'] = schema
+        return schema
+
+    async def generate_tools_for_openai(self, use_funcs: list[entities.LLMFunction]) -> list:
+        """生成函数列表
 
-        return tools
+        工具定义缓存在各工具对象上，会话中保存的工具列表（Conversation.use_funcs）在插件重载后仍使用其中工具自身的定义。
+        返回的工具定义被多个请求共用，调用方不应修改。
+        """
+        # 按名称排序，使工具列表不随加载顺序变化，请求的前缀保持不变才能命中提供商的提示词缓存
+        return [self._get_openai_schema(function) for function in sorted(use_funcs, key=lambda f: f.name)]
 
     async def generate_tools_for_anthropic(self, use_funcs: list[entities.LLMFunction]) -> list:
         """为anthropic生成函数列表
@@ -77,27 +136,54 @@ class ToolManager:
         ]
         """
 
-        tools = []
-
-        for function in use_funcs:
-            function_schema = {
-                'name': function.name,
-                'description': function.description,
-                'input_schema': function.parameters,
-            }
-            tools.append(function_schema)
+        # 与 generate_tools_for_openai 相同，按名称排序，返回的工具定义不应修改
+        return [self._get_anthropic_schema(function) for function in sorted(use_funcs, key=lambda f: f.name)]
 
-        return tools
+    async def execute_func_call(
+        self,
+        query: core_entities.Query,
+        name: str,
+        parameters: dict,
+        timeout: float | None = None,
+    ) -> typing.Any:
+        """执行函数调用，声明了缓存有效期的工具优先使用缓存的结果
 
-    async def execute_func_call(self, query: core_entities.Query, name: str, parameters: dict) -> typing.Any:
-        """执行函数调用"""
+        Args:
+            timeout (float | None): 工具执行的超时时间（秒），请求剩余的处理时间更短时以剩余时间为准
+        """
+        # 按请求的剩余处理时间限制工具执行时长
+        remaining_time = query.get_remaining_time() if query is not None else None
+        if remaining_time is not None:
+            timeout = remaining_time if timeout is None else min(timeout, remaining_time)
 
-        for loader in self.loaders:
-            if await loader.has_tool(name):
-                return await loader.invoke_tool(query, name, parameters)
-        else:
+        index = await self.get_index()
+        if name not in index:
             raise ValueError(f'未找到工具: {name}')
 
+        loader, function = index[name]
+
+        cache_ttl = function.cache_ttl if self.result_cache.enable else 0
+        cache_key = None
+
+        # 未声明共享的工具结果可能取决于调用者身份，按会话和发送者分别缓存，没有请求时不缓存
+        if cache_ttl > 0 and function.cache_shared:
+            cache_key = self.result_cache.make_key(name, parameters)
+        elif cache_ttl > 0 and query is not None:
+            scope = f'{query.bot_uuid}/{broker.get_session_key(query)}/{query.sender_id}'
+            cache_key = self.result_cache.make_key(name, parameters, scope)
+
+        if cache_key is not None:
+            hit, result = self.result_cache.get(name, cache_key)
+            if hit:
+                return result
+
+        result = await asyncio.wait_for(loader.invoke_tool(query, name, parameters), timeout)
+
+        if cache_key is not None:
+            self.result_cache.set(cache_key, result, cache_ttl)
+
+        return result
+
     async def shutdown(self):
         """关闭所有工具"""
         for loader in self.loaders:
@@ -0,0 +1,80 @@
+from __future__ import annotations
+
+import bisect
+import math
+
+
+BUCKET_START = 0.00001
+"""第一个桶的上界（秒）"""
+
+BUCKET_FACTOR = 1.25
+"""相邻桶上界的比例，决定分位数估计的精度"""
+
+BUCKET_COUNT = 80
+"""桶数量，最后一个桶的上界约为 450 秒，更大的值计入溢出桶"""
+
+BUCKET_BOUNDS = [BUCKET_START * BUCKET_FACTOR**i for i in range(BUCKET_COUNT)]
+
+
+class LatencyHistogram:
+    """延迟直方图
+
+    按指数增长的桶计数，内存占用固定，记录一次耗时为 O(log 桶数)。
+    分位数在所在桶内线性插值估计，用于观察延迟分布，不适合精确计量。
+    """
+
+    counts: list[int]
+    """各桶的计数，最后一项为溢出桶"""
+
+    count: int
+    """记录总数"""
+
+    total: float
+    """耗时总和（秒）"""
+
+    max: float
+    """最大耗时（秒）"""
+
+    def __init__(self):
+        self.counts = [0] * (BUCKET_COUNT + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value: float):
+        """记录一次耗时（秒）"""
+        self.counts[bisect.bisect_left(BUCKET_BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q: float) -> float:
+        """估计分位数，q 取值 0~1，无记录时返回 0"""
+        if self.count == 0:
+            return 0.0
+
+        rank = max(1, math.ceil(q * self.count))
+        seen = 0
+        for i, bucket_count in enumerate(self.counts):
+            if seen + bucket_count >= rank:
+                if i >= BUCKET_COUNT:
+                    return self.max
+
+                # 在桶内按排名线性插值
+                lower = BUCKET_BOUNDS[i - 1] if i > 0 else 0.0
+                upper = min(BUCKET_BOUNDS[i], self.max)
+                return lower + (upper - lower) * (rank - seen) / bucket_count
+            seen += bucket_count
+
+        return self.max
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'avg': self.total / self.count if self.count else 0.0,
+            'p50': self.percentile(0.5),
+            'p95': self.percentile(0.95),
+            'p99': self.percentile(0.99),
+            'max': self.max,
+        }
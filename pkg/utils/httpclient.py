@@ -0,0 +1,173 @@
+from __future__ import annotations
+
+import asyncio
+import typing
+
+import aiohttp
+import httpx
+
+from ..core import app, entities as core_entities
+
+
+RELOAD_CLOSE_DELAY = 60
+"""热重载后旧客户端的保留时长（秒），使重载前发出的请求能够完成"""
+
+_default_mgr: HTTPClientManager | None = None
+
+
+def get_default() -> HTTPClientManager:
+    """获取应用的 HTTP 客户端管理器，供无法取得应用对象的工具函数（如消息转换器中调用的图片下载）使用"""
+    if _default_mgr is None:
+        raise RuntimeError('HTTP client manager is not initialized')
+    return _default_mgr
+
+
+class HTTPClientManager:
+    """出站 HTTP 客户端管理器
+
+    按 base_url、代理等参数复用长期存在的 httpx 客户端和 aiohttp 会话，
+    使出站请求能复用连接，不必每次重新建立连接和 TLS 握手。
+    客户端按所属组件的生命周期范围分组，热重载该范围时关闭；应用退出时全部关闭。
+    取得的客户端由管理器关闭，调用方不应自行关闭，超时时间应在每次请求时指定。
+    """
+
+    ap: app.Application
+
+    http2: bool
+    """httpx 客户端是否启用 HTTP/2，需安装 h2"""
+
+    limits: httpx.Limits
+    """连接池限制"""
+
+    httpx_clients: dict[tuple, httpx.AsyncClient]
+    """(生命周期范围, base_url, 代理, trust_env) -> httpx 客户端"""
+
+    aiohttp_sessions: dict[tuple, aiohttp.ClientSession]
+    """(生命周期范围, trust_env) -> aiohttp 会话"""
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        self.http2 = False
+        self.limits = httpx.Limits()
+        self.httpx_clients = {}
+        self.aiohttp_sessions = {}
+
+    async def initialize(self):
+        global _default_mgr
+
+        client_cfg = self.ap.instance_config.data.get('http-client', {})
+
+        self.http2 = client_cfg.get('http2', False)
+        if self.http2:
+            try:
+                import h2  # noqa: F401
+            except ImportError:
+                self.ap.logger.warning('HTTP/2 is enabled but h2 is not installed, falling back to HTTP/1.1')
+                self.http2 = False
+
+        self.limits = httpx.Limits(
+            max_connections=client_cfg.get('max-connections', 100),
+            max_keepalive_connections=client_cfg.get('max-keepalive-connections', 20),
+            keepalive_expiry=client_cfg.get('keepalive-expiry', 30),
+        )
+
+        _default_mgr = self
+
+    def get_client(
+        self,
+        base_url: str = '',
+        proxy: str | None = None,
+        trust_env: bool = True,
+        scope: core_entities.LifecycleControlScope = core_entities.LifecycleControlScope.APPLICATION,
+    ) -> httpx.AsyncClient:
+        """获取 httpx 客户端
+
+        Args:
+            base_url (str): 基础地址，请求时可使用相对路径
+            proxy (str | None): 代理地址，为 None 时按 trust_env 使用环境变量中的代理
+            trust_env (bool): 是否读取环境变量中的代理等设置
+            scope (LifecycleControlScope): 使用者所属的生命周期范围
+        """
+        key = (scope, base_url, proxy, trust_env)
+
+        client = self.httpx_clients.get(key)
+        if client is None or client.is_closed:
+            client = httpx.AsyncClient(
+                base_url=base_url,
+                proxy=proxy,
+                trust_env=trust_env,
+                http2=self.http2,
+                limits=self.limits,
+            )
+            self.httpx_clients[key] = client
+
+        return client
+
+    def get_session(
+        self,
+        trust_env: bool = False,
+        scope: core_entities.LifecycleControlScope = core_entities.LifecycleControlScope.APPLICATION,
+    ) -> aiohttp.ClientSession:
+        """获取 aiohttp 会话，只能在事件循环中调用
+
+        Args:
+            trust_env (bool): 是否读取环境变量中的代理等设置，与 aiohttp 的默认值一致默认不读取
+            scope (LifecycleControlScope): 使用者所属的生命周期范围
+        """
+        key = (scope, trust_env)
+
+        session = self.aiohttp_sessions.get(key)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                trust_env=trust_env,
+                connector=aiohttp.TCPConnector(
+                    limit=self.limits.max_connections or 0,
+                    keepalive_timeout=self.limits.keepalive_expiry,
+                ),
+            )
+            self.aiohttp_sessions[key] = session
+
+        return session
+
+    def _pop_clients(
+        self, scope: core_entities.LifecycleControlScope | None
+    ) -> list[httpx.AsyncClient | aiohttp.ClientSession]:
+        clients = []
+
+        for registry in (self.httpx_clients, self.aiohttp_sessions):
+            for key in list(registry):
+                if scope is None or key[0] == scope:
+                    clients.append(registry.pop(key))
+
+        return clients
+
+    async def _close_clients(self, clients: typing.Iterable[httpx.AsyncClient | aiohttp.ClientSession]):
+        for client in clients:
+            try:
+                if isinstance(client, httpx.AsyncClient):
+                    await client.aclose()
+                else:
+                    await client.close()
+            except Exception as e:
+                self.ap.logger.warning(f'Failed to close HTTP client: {e}')
+
+    async def release_scope(self, scope: core_entities.LifecycleControlScope):
+        """热重载某一范围时调用，之后的请求使用新的客户端，旧客户端在一段时间后关闭"""
+        clients = self._pop_clients(scope)
+        if not clients:
+            return
+
+        async def close_later():
+            await asyncio.sleep(RELOAD_CLOSE_DELAY)
+            await self._close_clients(clients)
+
+        self.ap.task_mgr.create_task(
+            close_later(),
+            kind='http-client',
+            name=f'http-client-close-{scope.value}',
+            scopes=[core_entities.LifecycleControlScope.APPLICATION],
+        )
+
+    async def close(self):
+        """关闭所有客户端"""
+        await self._close_clients(self._pop_clients(None))
@@ -0,0 +1,128 @@
+"""Redis 序列化协议（RESP2）的最小异步客户端
+
+仅实现网络请求代理所需的命令收发，不依赖第三方库，可连接 Redis 及兼容该协议的服务。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import typing
+
+
+class RESPError(Exception):
+    """服务端返回的错误"""
+
+    pass
+
+
+class RESPConnection:
+    """单个 RESP 连接
+
+    同一连接上的命令按顺序执行。执行中被取消或出错时连接会被关闭，下次执行命令时自动重连，
+    因此阻塞命令（如 BLPOP）应使用单独的连接。
+    """
+
+    host: str
+
+    port: int
+
+    password: str
+
+    db: int
+
+    reader: asyncio.StreamReader | None
+
+    writer: asyncio.StreamWriter | None
+
+    lock: asyncio.Lock
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 6379, password: str = '', db: int = 0):
+        self.host = host
+        self.port = port
+        self.password = password
+        self.db = db
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def _connect(self):
+        self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        if self.password:
+            await self._request('AUTH', self.password)
+        if self.db:
+            await self._request('SELECT', self.db)
+
+    async def close(self):
+        writer, self.reader, self.writer = self.writer, None, None
+        if writer is not None:
+            writer.close()
+            try:
+                await writer.wait_closed()
+            except Exception:
+                pass
+
+    async def execute(self, *args: typing.Any) -> typing.Any:
+        """执行命令并返回结果，bulk string 以 bytes 返回"""
+        async with self.lock:
+            try:
+                if self.writer is None:
+                    await self._connect()
+                return await self._request(*args)
+            except RESPError:
+                raise
+            except BaseException:
+                # 连接中可能残留未读取的响应，直接丢弃
+                await self.close()
+                raise
+
+    async def _request(self, *args: typing.Any) -> typing.Any:
+        self.writer.write(encode_command(*args))
+        await self.writer.drain()
+        return await self._read_reply()
+
+    async def _read_reply(self) -> typing.Any:
+        line = await self.reader.readline()
+        if not line:
+            raise ConnectionError('RESP connection closed by server')
+
+        prefix, payload = line[:1], line[1:-2]
+
+        if prefix == b'+':
+            return payload.decode()
+        if prefix == b'-':
+            raise RESPError(payload.decode())
+        if prefix == b':':
+            return int(payload)
+        if prefix == b'$':
+            length = int(payload)
+            if length < 0:
+                return None
+            data = await self.reader.readexactly(length + 2)
+            return data[:-2]
+        if prefix == b'*':
+            length = int(payload)
+            if length < 0:
+                return None
+            return [await self._read_reply() for _ in range(length)]
+
+        raise ConnectionError(f'Invalid RESP reply: {line!r}')
+
+
+def encode_command(*args: typing.Any) -> bytes:
+    """将命令编码为 RESP 数组"""
+    parts = [f'*{len(args)}\r\n'.encode()]
+    for arg in args:
+        if isinstance(arg, bytes):
+            data = arg
+        else:
+            data = str(arg).encode()
+        parts.append(f'${len(data)}\r\n'.encode())
+        parts.append(data)
+        parts.append(b'\r\n')
+    return b''.join(parts)
+
+
+def to_str(value: bytes | str) -> str:
+    """将回复转为字符串，部分兼容服务以 simple string 返回 bulk string"""
+    return value.decode() if isinstance(value, bytes) else value
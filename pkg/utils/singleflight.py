@@ -0,0 +1,65 @@
+from __future__ import annotations
+
+import asyncio
+import typing
+
+
+T = typing.TypeVar('T')
+
+
+class _Call:
+    task: asyncio.Task
+
+    waiters: int
+    """等待此次调用结果的调用方数量"""
+
+    def __init__(self, task: asyncio.Task):
+        self.task = task
+        self.waiters = 0
+
+
+class SingleFlight:
+    """合并相同的并发调用
+
+    相同 key 的调用在执行期间只执行一次，结果（或异常）返回给所有等待的调用方。
+    调用在单独的任务中执行，单个调用方被取消不会影响其他调用方，所有调用方都被取消时才取消调用。
+    """
+
+    calls: dict[str, _Call]
+    """key -> 执行中的调用"""
+
+    shared_count: int
+    """直接使用了其他调用结果的次数"""
+
+    def __init__(self):
+        self.calls = {}
+        self.shared_count = 0
+
+    def _forget(self, key: str, call: _Call):
+        if self.calls.get(key) is call:
+            del self.calls[key]
+
+    async def do(self, key: str, func: typing.Callable[[], typing.Awaitable[T]]) -> T:
+        """执行调用，已有相同 key 的调用正在执行时等待其结果
+
+        Args:
+            key (str): 调用的唯一标识
+            func (typing.Callable[[], typing.Awaitable[T]]): 执行调用的函数，只会被第一个调用方执行
+        """
+        call = self.calls.get(key)
+
+        if call is None:
+            call = _Call(asyncio.ensure_future(func()))
+            self.calls[key] = call
+            call.task.add_done_callback(lambda _: self._forget(key, call))
+        else:
+            self.shared_count += 1
+
+        call.waiters += 1
+        try:
+            return await asyncio.shield(call.task)
+        finally:
+            call.waiters -= 1
+            if call.waiters == 0 and not call.task.done():
+                self._forget(key, call)
+                call.task.cancel()
@@ -0,0 +1,145 @@
+"""长文本转图片
+
+仅依赖 PIL，不引用 pkg 中的其他模块，以便在工作进程中以较小的开销导入执行。
+"""
+
+from __future__ import annotations
+
+import io
+import re
+import functools
+
+from PIL import Image, ImageDraw, ImageFont
+
+
+@functools.lru_cache(maxsize=16)
+def get_font(font_path: str):
+    return ImageFont.truetype(
+        font_path,
+        32,
+        encoding='utf-8',
+    )
+
+
+def index_number(path=''):
+    """
+    查找字符串中数字所在串中的位置
+    :param path:目标字符串
+    :return:<class 'list'>: <class 'list'>: [['1', 16], ['2', 35], ['1', 51]]
+    """
+    kv = []
+    nums = []
+    beforeDatas = re.findall('[\\d]+', path)
+    for num in beforeDatas:
+        indexV = []
+        times = path.count(num)
+        if times > 1:
+            if num not in nums:
+                indexs = re.finditer(num, path)
+                for index in indexs:
+                    iV = []
+                    i = index.span()[0]
+                    iV.append(num)
+                    iV.append(i)
+                    kv.append(iV)
+            nums.append(num)
+        else:
+            index = path.find(num)
+            indexV.append(num)
+            indexV.append(index)
+            kv.append(indexV)
+    # 根据数字位置排序
+    indexSort = []
+    resultIndex = []
+    for vi in kv:
+        indexSort.append(vi[1])
+    indexSort.sort()
+    for i in indexSort:
+        for v in kv:
+            if i == v[1]:
+                resultIndex.append(v)
+    return resultIndex
+
+
+def compress_image(image_bytes: bytes, kb=100, step=20, quality=90) -> bytes:
+    """不改变图片尺寸压缩到指定大小
+    :param image_bytes: 压缩源图片
+    :param kb: 压缩目标,KB
+    :param step: 每次调整的压缩比率
+    :param quality: 初始压缩比率
+    :return: 压缩后的图片
+    """
+    if len(image_bytes) / 1024 <= kb:
+        return image_bytes
+    while len(image_bytes) / 1024 > kb:
+        im = Image.open(io.BytesIO(image_bytes))
+        out = io.BytesIO()
+        im.save(out, format='PNG', quality=quality)
+        image_bytes = out.getvalue()
+        if quality - step < 0:
+            break
+        quality -= step
+    return image_bytes
+
+
+def text_to_image(text_str: str, font_path: str, width=800) -> bytes:
+    """将文本绘制为 PNG 图片，返回压缩后的图片内容"""
+    font = get_font(font_path)
+
+    text_str = text_str.replace('\t', '    ')
+
+    # 分行
+    lines = text_str.split('\n')
+
+    # 计算并分割
+    final_lines = []
+
+    text_width = width - 80
+
+    for line in lines:
+        # 如果长了就分割
+        line_width = font.getlength(line)
+        if line_width < text_width:
+            final_lines.append(line)
+            continue
+        else:
+            rest_text = line
+            while True:
+                # 分割最前面的一行
+                point = int(len(rest_text) * (text_width / line_width))
+
+                # 检查断点是否在数字中间
+                numbers = index_number(rest_text)
+
+                for number in numbers:
+                    if number[1] < point < number[1] + len(number[0]) and number[1] != 0:
+                        point = number[1]
+                        break
+
+                final_lines.append(rest_text[:point])
+                rest_text = rest_text[point:]
+                line_width = font.getlength(rest_text)
+                if line_width < text_width:
+                    final_lines.append(rest_text)
+                    break
+                else:
+                    continue
+    # 准备画布
+    img = Image.new('RGBA', (width, max(280, len(final_lines) * 35 + 65)), (255, 255, 255, 255))
+    draw = ImageDraw.Draw(img, mode='RGBA')
+
+    # 绘制正文
+    offset_x = 20
+    offset_y = 30
+    for line_number, final_line in enumerate(final_lines):
+        draw.text(
+            (offset_x, offset_y + 35 * line_number),
+            final_line,
+            fill=(0, 0, 0),
+            font=font,
+        )
+
+    out = io.BytesIO()
+    img.save(out, format='PNG')
+
+    return compress_image(out.getvalue())
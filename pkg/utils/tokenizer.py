@@ -0,0 +1,129 @@
+from __future__ import annotations
+
+import abc
+import asyncio
+import math
+import re
+import typing
+
+from ..core import app
+from ..provider import entities as llm_entities
+
+
+MESSAGE_OVERHEAD = 4
+"""每条消息的角色、分隔符等额外占用的 token 数"""
+
+IMAGE_TOKENS = 512
+"""每张图片按此 token 数估计"""
+
+preregistered_tokenizers: list[typing.Type[Tokenizer]] = []
+
+
+def tokenizer_class(name: str):
+    def decorator(cls: typing.Type[Tokenizer]) -> typing.Type[Tokenizer]:
+        cls.name = name
+        preregistered_tokenizers.append(cls)
+        return cls
+
+    return decorator
+
+
+class Tokenizer(metaclass=abc.ABCMeta):
+    """分词器，用于估计文本的 token 数
+
+    不同模型的分词方式不同，此处的结果只用于控制上下文长度，不用于计费。
+    """
+
+    name: str = None
+
+    @abc.abstractmethod
+    def count(self, text: str) -> int:
+        """计算文本的 token 数"""
+        raise NotImplementedError
+
+    def count_message(self, message: llm_entities.Message) -> int:
+        """计算模型消息的 token 数，结果缓存在消息上，重复计算会话历史时只需计算新增的消息"""
+        count = message._token_counts.get(self.name)
+        if count is not None:
+            return count
+
+        count = MESSAGE_OVERHEAD
+
+        if isinstance(message.content, str):
+            count += self.count(message.content)
+        elif isinstance(message.content, list):
+            for ce in message.content:
+                if ce.type == 'text':
+                    count += self.count(ce.text or '')
+                else:
+                    count += IMAGE_TOKENS
+
+        for tool_call in message.tool_calls or []:
+            count += self.count(tool_call.function.name) + self.count(tool_call.function.arguments)
+
+        message._token_counts[self.name] = count
+        return count
+
+
+WIDE_CHAR = re.compile(r'[\u2e80-\u9fff\uac00-\ud7af\uf900-\ufaff\uff00-\uffef]')
+"""中日韩文字及全角符号"""
+
+
+@tokenizer_class('heuristic')
+class HeuristicTokenizer(Tokenizer):
+    """按字符估计 token 数，无需下载词表
+
+    中日韩文字每字约 1 个 token，其他文字约 4 个字符 1 个 token，与常见模型的分词结果相比略偏多。
+    """
+
+    def count(self, text: str) -> int:
+        wide_chars = len(WIDE_CHAR.findall(text))
+        return wide_chars + math.ceil((len(text) - wide_chars) / 4)
+
+
+@tokenizer_class('tiktoken')
+class TiktokenTokenizer(Tokenizer):
+    """使用 tiktoken 的 o200k_base 编码计算 token 数
+
+    首次使用时 tiktoken 会下载词表并缓存到本地，无法联网时需预先缓存词表（见 TIKTOKEN_CACHE_DIR）。
+    """
+
+    def __init__(self):
+        import tiktoken
+
+        self.encoding = tiktoken.get_encoding('o200k_base')
+
+    def count(self, text: str) -> int:
+        return len(self.encoding.encode(text, disallowed_special=()))
+
+
+_tokenizers: dict[str, Tokenizer] = {}
+
+
+def get_tokenizer(name: str) -> Tokenizer:
+    """获取分词器，同名分词器只创建一次
+
+    创建 tiktoken 分词器时可能需要读取或下载词表，应在线程中调用。
+    """
+    if name not in _tokenizers:
+        for tokenizer_cls in preregistered_tokenizers:
+            if tokenizer_cls.name == name:
+                break
+        else:
+            raise ValueError(f'未知的分词器: {name}')
+
+        _tokenizers[name] = tokenizer_cls()
+
+    return _tokenizers[name]
+
+
+async def load_tokenizer(ap: app.Application) -> Tokenizer:
+    """加载实例配置中指定的分词器，加载失败时使用 heuristic"""
+    tokenizer_name = ap.instance_config.data.get('tokenizer', HeuristicTokenizer.name)
+
+    try:
+        # 加载词表可能需要读取文件或下载，在线程中进行
+        return await asyncio.to_thread(get_tokenizer, tokenizer_name)
+    except Exception as e:
+        ap.logger.warning(f'Failed to load tokenizer {tokenizer_name}, falling back to heuristic: {e}')
+        return get_tokenizer(HeuristicTokenizer.name)
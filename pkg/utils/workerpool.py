@@ -0,0 +1,58 @@
+from __future__ import annotations
+
+import asyncio
+import concurrent.futures
+import functools
+import multiprocessing
+import typing
+
+from ..core import app
+
+
+class WorkerPoolManager:
+    """CPU 密集任务的工作池
+
+    用于将 CPU 密集且无状态的计算移出事件循环，目前只有长文本转图片（longtext 的 image 策略）的渲染在此执行，
+    Query 与消息链的校验、内容过滤和历史记录的编码等仍在事件循环中进行。
+    concurrency.cpu-workers 大于 0 时使用对应数量的工作进程，可利用多核；
+    为 0 时使用事件循环默认的线程池，仅避免阻塞事件循环。
+
+    提交的函数及其参数需可被 pickle，函数应定义在不依赖应用对象的模块中（如 pkg.utils.text2img）。
+
+    工作池只承担无状态的计算，流水线本身仍在主进程中处理，不按会话分片到工作进程：
+    请求对象持有平台适配器，插件通过进程内的接口访问适配器和会话，
+    HTTP API 也直接修改内存中的流水线、模型和机器人，分片到工作进程需要在每个进程中复制并同步这些状态。
+    需要用多个进程处理流水线时，可运行多个节点并使用 Redis 请求代理（broker.type 为 redis），
+    同一会话的请求由持有其租约的节点按顺序处理，会话亲和使会话记录尽量留在同一进程中。
+    """
+
+    ap: app.Application
+
+    executor: concurrent.futures.Executor | None
+    """工作进程池，未启用时为 None"""
+
+    def __init__(self, ap: app.Application):
+        self.ap = ap
+        self.executor = None
+
+    async def initialize(self):
+        workers = self.ap.instance_config.data['concurrency'].get('cpu-workers', 0)
+
+        if workers > 0:
+            # 使用 spawn，避免在已有线程和事件循环的进程中 fork
+            self.executor = concurrent.futures.ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+            )
+            self.ap.logger.info(f'CPU worker pool started with {workers} processes')
+
+    async def run(self, func: typing.Callable[..., typing.Any], *args, **kwargs) -> typing.Any:
+        """在工作池中执行函数并等待结果"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(func, *args, **kwargs))
+
+    async def shutdown(self):
+        """关闭工作进程池，取消尚未开始的任务"""
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+            self.executor = None
@@ -0,0 +1,191 @@
+"""流水线执行计划的性能对比
+
+在临时目录中以默认配置启动应用，模型调用替换为立即返回的桩函数，
+分别按编译后的执行计划和旧的执行方式（执行全部阶段）处理私聊和群聊请求，输出每个请求的流水线耗时。
+
+用法（在仓库根目录下执行）：
+
+    python tests/bench/bench_pipeline_plan.py --queries 500 --rounds 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import gc
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, ROOT)
+
+
+from pkg.core import app  # noqa: E402, F401  先导入应用模块，避免循环导入
+from pkg.core import boot, entities  # noqa: E402
+from pkg.core.bootutils import files  # noqa: E402
+from pkg.platform import adapter as msadapter  # noqa: E402
+from pkg.platform.types import entities as platform_entities  # noqa: E402
+from pkg.platform.types import events as platform_events  # noqa: E402
+from pkg.platform.types import message as platform_message  # noqa: E402
+from pkg.provider import entities as llm_entities  # noqa: E402
+
+
+class BenchAdapter(msadapter.MessagePlatformAdapter):
+    """丢弃所有回复的适配器，避免计入平台发送的耗时"""
+
+    bot_account_id = 'bench-bot'
+
+    reply_count: int = 0
+
+    async def reply_message(self, *args, **kwargs):
+        self.reply_count += 1
+
+    async def send_message(self, *args, **kwargs):
+        pass
+
+
+def make_query(query_id: int, group: bool, pipeline_uuid: str, adapter: BenchAdapter) -> entities.Query:
+    message_chain = platform_message.MessageChain(
+        [platform_message.Source(id=query_id, time=0), platform_message.Plain('ai hello' if group else 'hello')]
+    )
+
+    if group:
+        group_entity = platform_entities.Group(id='g1', name='bench', permission=platform_entities.Permission.Member)
+        event = platform_events.GroupMessage(
+            sender=platform_entities.GroupMember(
+                id='u1', member_name='user', group=group_entity, permission=platform_entities.Permission.Member
+            ),
+            message_chain=message_chain,
+            time=0,
+        )
+        launcher_type, launcher_id = entities.LauncherTypes.GROUP, f'g{query_id}'
+    else:
+        event = platform_events.FriendMessage(
+            sender=platform_entities.Friend(id='u1', nickname='user', remark=''),
+            message_chain=message_chain,
+            time=0,
+        )
+        launcher_type, launcher_id = entities.LauncherTypes.PERSON, f'u{query_id}'
+
+    return entities.Query(
+        bot_uuid='bench-bot',
+        query_id=query_id,
+        launcher_type=launcher_type,
+        launcher_id=launcher_id,
+        sender_id='u1',
+        message_event=event,
+        message_chain=message_chain,
+        resp_messages=[],
+        resp_message_chain=[],
+        adapter=adapter,
+        pipeline_uuid=pipeline_uuid,
+    )
+
+
+async def make_app():
+    await files.generate_files()
+
+    ap = await boot.make_app(asyncio.get_running_loop())
+    ap.logger.setLevel(logging.WARNING)
+
+    # 模型调用直接返回，结果只反映流水线本身的开销
+    ap.instance_config.data['llm-cache']['enable'] = False
+
+    await ap.model_service.create_llm_model(
+        {
+            'name': 'bench-model',
+            'description': '',
+            'requester': 'openai-chat-completions',
+            'requester_config': {'base_url': 'http://127.0.0.1:1/v1', 'timeout': 30},
+            'api_keys': ['bench'],
+            'abilities': [],
+            'extra_args': {},
+        }
+    )
+
+    return ap
+
+
+async def bench(queries: int, rounds: int):
+    ap = await make_app()
+
+    pipeline_uuid = (await ap.pipeline_service.get_pipelines())[0]['uuid']
+    pipeline = await ap.pipeline_mgr.get_pipeline_by_uuid(pipeline_uuid)
+
+    async def invoke_llm(*args, **kwargs):
+        return llm_entities.Message(role='assistant', content='ok')
+
+    for model in ap.model_mgr.llm_models:
+        model.requester.invoke_llm = invoke_llm
+
+    adapter = BenchAdapter({}, ap, None)
+
+    compiled = pipeline.execution_plans
+    full = {launcher_type: pipeline.stage_containers for launcher_type in entities.LauncherTypes}
+
+    for launcher_type, plan in compiled.items():
+        skipped = [c.inst_name for c in pipeline.stage_containers if c not in plan]
+        print(f'{launcher_type.value}: skipped {skipped}')
+
+    query_id = 0
+
+    async def run(plans: dict, group: bool, count: int) -> float:
+        nonlocal query_id
+        pipeline.execution_plans = plans
+        # 每次从空的会话表开始，避免累积的会话影响后面的测量
+        ap.sess_mgr.sessions.clear()
+        gc.collect()
+
+        start = time.perf_counter()
+        for _ in range(count):
+            query_id += 1
+            await pipeline.run(make_query(query_id, group, pipeline_uuid, adapter))
+        return (time.perf_counter() - start) / count * 1e6
+
+    # 预热，不计入结果
+    for group in (False, True):
+        await run(full, group, min(queries, 50))
+
+    adapter.reply_count = 0
+    results: dict[tuple[str, str], list[float]] = {}
+
+    for _ in range(rounds):
+        for name, plans in (('all stages', full), ('compiled plan', compiled)):
+            for group in (False, True):
+                results.setdefault((name, 'group' if group else 'person'), []).append(await run(plans, group, queries))
+
+    pipeline.execution_plans = compiled
+
+    # 每个请求都应得到回复，否则说明流水线提前中止，结果不可比较
+    expected_replies = rounds * 4 * queries
+    if adapter.reply_count != expected_replies:
+        print(f'warning: {adapter.reply_count} replies for {expected_replies} queries')
+
+    print(f'\n{"execution":<16}{"launcher":<10}{"us/query (median)":>20}{"us/query (min)":>18}')
+    for (name, launcher), samples in results.items():
+        print(f'{name:<16}{launcher:<10}{statistics.median(samples):>20.1f}{min(samples):>18.1f}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--queries', type=int, default=500, help='每轮每种会话的请求数')
+    parser.add_argument('--rounds', type=int, default=3, help='轮数，输出各轮结果的中位数和最小值')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # 组件清单等以相对路径读取，数据库和配置文件生成在临时目录中
+        for name in ('pkg', 'templates', 'components.yaml', 'libs', 'res'):
+            os.symlink(os.path.join(ROOT, name), os.path.join(workdir, name))
+
+        # 插件目录 plugins 作为包从工作目录导入
+        os.chdir(workdir)
+        sys.path.insert(0, workdir)
+        asyncio.run(bench(args.queries, args.rounds))
+
+
+if __name__ == '__main__':
+    main()
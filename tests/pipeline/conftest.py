@@ -0,0 +1,278 @@
+"""进程内的 RESP 服务，代替 Redis 运行 RedisBroker 的集成测试
+
+只实现 RedisBroker 用到的命令。EVAL 不执行 Lua，而是按脚本原文匹配 RedisBroker 中定义的脚本，
+以等价的 Python 函数执行；服务在单个事件循环中逐条处理命令，与 Redis 一样每条命令都是原子的。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import collections
+import fnmatch
+import time
+import typing
+
+import pytest_asyncio
+
+import pkg.core.app  # noqa: F401  先导入应用模块，避免循环导入
+from pkg.pipeline.brokers import redis as redis_broker
+
+
+class CommandError(Exception):
+    """以 RESP 错误回复给客户端"""
+
+    pass
+
+
+def encode_reply(value: typing.Any) -> bytes:
+    if value is None:
+        return b'$-1\r\n'
+    if isinstance(value, CommandError):
+        return f'-ERR {value}\r\n'.encode()
+    if isinstance(value, bool):
+        return f':{int(value)}\r\n'.encode()
+    if isinstance(value, int):
+        return f':{value}\r\n'.encode()
+    if isinstance(value, str):
+        return f'+{value}\r\n'.encode()
+    if isinstance(value, bytes):
+        return f'${len(value)}\r\n'.encode() + value + b'\r\n'
+    if isinstance(value, (list, tuple)):
+        return f'*{len(value)}\r\n'.encode() + b''.join(encode_reply(item) for item in value)
+    raise TypeError(f'cannot encode {value!r}')
+
+
+async def read_command(reader: asyncio.StreamReader) -> list[bytes] | None:
+    line = await reader.readline()
+    if not line:
+        return None
+    if not line.startswith(b'*'):
+        raise CommandError('protocol error')
+
+    args = []
+    for _ in range(int(line[1:-2])):
+        length = int((await reader.readline())[1:-2])
+        args.append((await reader.readexactly(length + 2))[:-2])
+    return args
+
+
+class FakeRESPServer:
+    """内存中的键空间，支持字符串、列表、集合与毫秒级过期"""
+
+    data: dict[bytes, typing.Any]
+
+    expires: dict[bytes, float]
+    """键 -> 过期时间（time.monotonic）"""
+
+    pushed: asyncio.Event
+    """有列表被写入时置位并换成新的事件，唤醒阻塞中的 BLPOP"""
+
+    writers: set[asyncio.StreamWriter]
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.pushed = asyncio.Event()
+        self.writers = set()
+        self.server = None
+        self.scripts = {
+            redis_broker.ENQUEUE_SCRIPT.encode(): self._script_enqueue,
+            redis_broker.RELEASE_LEASE_SCRIPT.encode(): self._script_release_lease,
+            redis_broker.RENEW_LEASE_SCRIPT.encode(): self._script_renew_lease,
+        }
+
+    async def start(self) -> tuple[str, int]:
+        self.server = await asyncio.start_server(self._handle, '127.0.0.1', 0)
+        return self.server.sockets[0].getsockname()[:2]
+
+    async def stop(self):
+        self.server.close()
+        for writer in list(self.writers):
+            writer.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        self.writers.add(writer)
+        try:
+            while (args := await read_command(reader)) is not None:
+                name = args[0].decode().upper()
+                try:
+                    if name == 'BLPOP':
+                        reply = await self._blpop(reader, args[1:])
+                    else:
+                        reply = self.execute(name, args[1:])
+                except CommandError as e:
+                    reply = e
+
+                writer.write(encode_reply(reply))
+                await writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            self.writers.discard(writer)
+            writer.close()
+
+    def _get(self, key: bytes, default: typing.Any = None) -> typing.Any:
+        expire_at = self.expires.get(key)
+        if expire_at is not None and expire_at <= time.monotonic():
+            del self.expires[key]
+            del self.data[key]
+        return self.data.get(key, default)
+
+    def _delete(self, key: bytes) -> bool:
+        self.expires.pop(key, None)
+        return self.data.pop(key, None) is not None
+
+    def _set_expire(self, key: bytes, ms: int):
+        self.expires[key] = time.monotonic() + ms / 1000
+
+    def _list(self, key: bytes) -> collections.deque:
+        value = self._get(key)
+        if value is None:
+            value = self.data[key] = collections.deque()
+        return value
+
+    def _lpop(self, key: bytes) -> bytes | None:
+        queue = self._get(key)
+        if not queue:
+            return None
+        value = queue.popleft()
+        if not queue:
+            self._delete(key)
+        return value
+
+    def _rpush(self, key: bytes, *values: bytes) -> int:
+        queue = self._list(key)
+        queue.extend(values)
+        self.pushed.set()
+        self.pushed = asyncio.Event()
+        return len(queue)
+
+    async def _blpop(self, reader: asyncio.StreamReader, args: list[bytes]) -> list[bytes] | None:
+        keys, timeout = args[:-1], float(args[-1])
+        deadline = time.monotonic() + timeout if timeout > 0 else None
+
+        # 客户端在等待期间断开时放弃等待，不取走列表中的元素
+        disconnected = asyncio.ensure_future(reader.read(1))
+        try:
+            while True:
+                for key in keys:
+                    value = self._lpop(key)
+                    if value is not None:
+                        return [key, value]
+
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    return None
+
+                pushed = asyncio.ensure_future(self.pushed.wait())
+                done, _ = await asyncio.wait(
+                    {pushed, disconnected}, timeout=remaining, return_when=asyncio.FIRST_COMPLETED
+                )
+                pushed.cancel()
+                if disconnected in done:
+                    raise ConnectionError('client disconnected')
+        finally:
+            # 等待读取真正结束，之后才能继续读取下一条命令
+            disconnected.cancel()
+            await asyncio.gather(disconnected, return_exceptions=True)
+
+    def execute(self, name: str, args: list[bytes]) -> typing.Any:
+        if name == 'PING':
+            return 'PONG'
+        if name == 'INCR':
+            value = int(self._get(args[0], b'0')) + 1
+            self.data[args[0]] = str(value).encode()
+            return value
+        if name == 'GET':
+            return self._get(args[0])
+        if name == 'SET':
+            return self._set(args)
+        if name == 'DEL':
+            return sum(self._delete(key) for key in args if self._get(key) is not None)
+        if name == 'EXISTS':
+            return sum(self._get(key) is not None for key in args)
+        if name == 'PEXPIRE':
+            if self._get(args[0]) is None:
+                return 0
+            self._set_expire(args[0], int(args[1]))
+            return 1
+        if name == 'PTTL':
+            if self._get(args[0]) is None:
+                return -2
+            if args[0] not in self.expires:
+                return -1
+            return int((self.expires[args[0]] - time.monotonic()) * 1000)
+        if name == 'KEYS':
+            pattern = args[0].decode()
+            return [
+                key
+                for key in list(self.data)
+                if self._get(key) is not None and fnmatch.fnmatchcase(key.decode(), pattern)
+            ]
+        if name == 'RPUSH':
+            return self._rpush(args[0], *args[1:])
+        if name == 'LPOP':
+            return self._lpop(args[0])
+        if name == 'LLEN':
+            return len(self._get(args[0], ()))
+        if name == 'SADD':
+            members = self._get(args[0])
+            if members is None:
+                members = self.data[args[0]] = set()
+            added = len(set(args[1:]) - members)
+            members.update(args[1:])
+            return added
+        if name == 'SREM':
+            members = self._get(args[0], set())
+            removed = len(members & set(args[1:]))
+            members.difference_update(args[1:])
+            if not members:
+                self._delete(args[0])
+            return removed
+        if name == 'SMEMBERS':
+            return list(self._get(args[0], ()))
+        if name == 'EVAL':
+            script = self.scripts.get(args[0])
+            if script is None:
+                raise CommandError('unknown script')
+            numkeys = int(args[1])
+            return script(args[2 : 2 + numkeys], args[2 + numkeys :])
+
+        raise CommandError(f"unknown command '{name}'")
+
+    def _set(self, args: list[bytes]) -> str | None:
+        key, value, options = args[0], args[1], [arg.decode().upper() for arg in args[2:]]
+
+        if 'NX' in options and self._get(key) is not None:
+            return None
+
+        self.data[key] = value
+        self.expires.pop(key, None)
+        if 'PX' in options:
+            self._set_expire(key, int(options[options.index('PX') + 1]))
+        return 'OK'
+
+    def _script_enqueue(self, keys: list[bytes], args: list[bytes]) -> int:
+        self._rpush(keys[0], args[0])
+        self._rpush(keys[1], args[1])
+        return 1
+
+    def _script_release_lease(self, keys: list[bytes], args: list[bytes]) -> int:
+        if self._get(keys[0]) == args[0]:
+            return int(self._delete(keys[0]))
+        return 0
+
+    def _script_renew_lease(self, keys: list[bytes], args: list[bytes]) -> int:
+        if self._get(keys[0]) == args[0]:
+            self._set_expire(keys[0], int(args[1]))
+            return 1
+        return 0
+
+
+@pytest_asyncio.fixture
+async def resp_server() -> typing.AsyncIterator[tuple[str, int]]:
+    server = FakeRESPServer()
+    address = await server.start()
+    yield address
+    await server.stop()
@@ -0,0 +1,255 @@
+"""RedisBroker 双节点集成测试
+
+默认连接 conftest 中的进程内 RESP 服务。设置环境变量 LANGBOT_TEST_REDIS_HOST 或 LANGBOT_TEST_REDIS_PORT 时
+改为连接该地址的 Redis（未设置的一项默认为 127.0.0.1、6379），测试使用随机的键名前缀，结束后删除所有测试键。
+"""
+
+from __future__ import annotations
+
+import asyncio
+import logging
+import os
+import time
+import types
+import uuid
+
+import pytest
+import pytest_asyncio
+
+import pkg.core.app  # noqa: F401  先导入应用模块，避免循环导入
+from pkg.core import entities
+from pkg.pipeline.brokers import redis as redis_broker
+from pkg.platform import adapter as msadapter
+from pkg.platform.types import entities as platform_entities
+from pkg.platform.types import events as platform_events
+from pkg.platform.types import message as platform_message
+from pkg.utils import resp
+
+
+USE_REDIS = 'LANGBOT_TEST_REDIS_HOST' in os.environ or 'LANGBOT_TEST_REDIS_PORT' in os.environ
+
+REDIS_HOST = os.environ.get('LANGBOT_TEST_REDIS_HOST', '127.0.0.1')
+REDIS_PORT = int(os.environ.get('LANGBOT_TEST_REDIS_PORT', '6379'))
+
+BOT_UUID = 'test-bot'
+
+
+class TaskManager:
+    """只记录创建的任务，供测试结束或模拟节点失效时取消"""
+
+    def __init__(self):
+        self.tasks: list[asyncio.Task] = []
+
+    def create_task(self, coro, **kwargs) -> asyncio.Task:
+        task = asyncio.get_running_loop().create_task(coro)
+        self.tasks.append(task)
+        return task
+
+
+def make_ap(
+    node_id: str, address: tuple[str, int], prefix: str, lease_ttl: float, affinity_ttl: float
+) -> types.SimpleNamespace:
+    bot = types.SimpleNamespace(adapter=msadapter.MessagePlatformAdapter({}, None, None))
+
+    async def get_bot_by_uuid(bot_uuid: str):
+        return bot if bot_uuid == BOT_UUID else None
+
+    return types.SimpleNamespace(
+        logger=logging.getLogger(f'test-broker-{node_id}'),
+        instance_config=types.SimpleNamespace(
+            data={
+                'concurrency': {'session': 1},
+                'broker': {
+                    'type': 'redis',
+                    'node-id': node_id,
+                    'redis': {
+                        'host': address[0],
+                        'port': address[1],
+                        'prefix': prefix,
+                        'lease-ttl': lease_ttl,
+                        'affinity-ttl': affinity_ttl,
+                    },
+                },
+            }
+        ),
+        task_mgr=TaskManager(),
+        platform_mgr=types.SimpleNamespace(
+            get_bot_by_uuid=get_bot_by_uuid,
+            webchat_proxy_bot=types.SimpleNamespace(bot_entity=types.SimpleNamespace(uuid='webchat-proxy-bot')),
+        ),
+    )
+
+
+class Node:
+    """模拟一个 LangBot 节点：按控制器的方式从代理取出请求，每个请求在单独的任务中处理"""
+
+    def __init__(self, broker: redis_broker.RedisBroker, handler):
+        self.broker = broker
+        self.handler = handler
+        self.tasks: list[asyncio.Task] = []
+
+    def start(self):
+        self.tasks.append(asyncio.create_task(self._run()))
+
+    async def _run(self):
+        while True:
+            query = await self.broker.next_query()
+            self.tasks.append(asyncio.create_task(self._process(query)))
+
+    async def _process(self, query: entities.Query):
+        await self.handler(self, query)
+        await self.broker.release_query(query)
+
+    async def kill(self):
+        """模拟节点失效：停止所有任务，不归还租约"""
+        tasks = self.tasks + self.broker.ap.task_mgr.tasks
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        await self.broker.conn.close()
+        await self.broker.blocking_conn.close()
+
+
+async def add_message(broker: redis_broker.RedisBroker, user_id: int, text: str):
+    message_chain = platform_message.MessageChain([platform_message.Plain(text)])
+    event = platform_events.FriendMessage(
+        sender=platform_entities.Friend(id=user_id, nickname=f'user{user_id}', remark=''),
+        message_chain=message_chain,
+    )
+    query = await broker.add_query(
+        BOT_UUID,
+        entities.LauncherTypes.PERSON,
+        user_id,
+        user_id,
+        event,
+        message_chain,
+        msadapter.MessagePlatformAdapter({}, None, None),
+        'test-pipeline',
+    )
+    assert query is not None
+
+
+async def wait_until(predicate, timeout: float):
+    deadline = time.monotonic() + timeout
+    while not predicate():
+        assert time.monotonic() < deadline, 'timed out'
+        await asyncio.sleep(0.05)
+
+
+@pytest_asyncio.fixture
+async def redis_address(resp_server) -> tuple[str, int]:
+    if not USE_REDIS:
+        return resp_server
+
+    conn = resp.RESPConnection(host=REDIS_HOST, port=REDIS_PORT)
+    try:
+        await conn.execute('PING')
+    except OSError as e:
+        pytest.fail(f'Redis is not available at {REDIS_HOST}:{REDIS_PORT}: {e}')
+    finally:
+        await conn.close()
+
+    return REDIS_HOST, REDIS_PORT
+
+
+@pytest_asyncio.fixture
+async def redis_prefix(redis_address):
+    prefix = f'langbot-test-{uuid.uuid4().hex[:8]}'
+    yield prefix
+
+    conn = resp.RESPConnection(host=redis_address[0], port=redis_address[1])
+    keys = await conn.execute('KEYS', f'{prefix}:*')
+    if keys:
+        await conn.execute('DEL', *keys)
+    await conn.close()
+
+
+@pytest_asyncio.fixture
+async def make_node(redis_address, redis_prefix):
+    nodes: list[Node] = []
+
+    async def factory(node_id: str, handler, lease_ttl: float = 30, affinity_ttl: float = 600) -> Node:
+        broker = redis_broker.RedisBroker(make_ap(node_id, redis_address, redis_prefix, lease_ttl, affinity_ttl))
+        await broker.initialize()
+        node = Node(broker, handler)
+        nodes.append(node)
+        return node
+
+    yield factory
+
+    for node in nodes:
+        await node.kill()
+
+
+@pytest.mark.asyncio
+async def test_two_nodes_keep_session_order_and_deliver_once(make_node):
+    processed: list[tuple[str, int, str]] = []
+    active: dict[int, str] = {}
+
+    async def handler(node: Node, query: entities.Query):
+        launcher_id = query.launcher_id
+        assert launcher_id not in active, f'session {launcher_id} processed on {active[launcher_id]} concurrently'
+        active[launcher_id] = node.broker.node_id
+        await asyncio.sleep(0.02)
+        del active[launcher_id]
+        processed.append((node.broker.node_id, launcher_id, str(query.message_chain)))
+
+    node_a = await make_node('a', handler)
+    node_b = await make_node('b', handler)
+    node_a.start()
+    node_b.start()
+
+    sessions, rounds = 6, 5
+    for i in range(rounds):
+        for user_id in range(sessions):
+            # 同一会话的消息交替由两个节点收到
+            await add_message(node_a.broker if (i + user_id) % 2 else node_b.broker, user_id, f'{user_id}-{i}')
+
+    await wait_until(lambda: len(processed) >= sessions * rounds, 15)
+    await asyncio.sleep(0.3)
+
+    texts = [text for _, _, text in processed]
+    assert sorted(texts) == sorted(f'{u}-{i}' for u in range(sessions) for i in range(rounds))
+
+    for user_id in range(sessions):
+        session_texts = [text for _, launcher_id, text in processed if launcher_id == user_id]
+        assert session_texts == [f'{user_id}-{i}' for i in range(rounds)]
+
+    # 两个节点都处理了请求
+    assert {node_id for node_id, _, _ in processed} == {'a', 'b'}
+
+
+@pytest.mark.asyncio
+async def test_lease_taken_over_after_node_dies(make_node):
+    processed: list[tuple[str, str]] = []
+    stuck = asyncio.Event()
+
+    async def handler(node: Node, query: entities.Query):
+        if node.broker.node_id == 'a':
+            # 节点 a 取到请求后失效，不再归还租约
+            stuck.set()
+            await asyncio.Event().wait()
+        processed.append((node.broker.node_id, str(query.message_chain)))
+
+    lease_ttl = 1
+    node_a = await make_node('a', handler, lease_ttl=lease_ttl, affinity_ttl=600)
+    node_b = await make_node('b', handler, lease_ttl=lease_ttl, affinity_ttl=600)
+    node_a.start()
+
+    await add_message(node_a.broker, 1, 'first')
+    await asyncio.wait_for(stuck.wait(), 5)
+
+    # 节点 a 持有会话租约时，节点 b 收到的后续请求会被转交给 a
+    node_b.start()
+    await add_message(node_b.broker, 1, 'second')
+    await add_message(node_b.broker, 1, 'third')
+    await asyncio.sleep(0.2)
+    assert processed == []
+
+    killed_at = time.monotonic()
+    await node_a.kill()
+
+    # 租约过期后即被接管，无需等待会话亲和过期
+    await wait_until(lambda: len(processed) >= 2, lease_ttl * 5)
+    assert time.monotonic() - killed_at < 10
+    assert processed == [('b', 'second'), ('b', 'third')]